@@ -0,0 +1,227 @@
+"""
+Набор бенчмарков горячих путей аутентификации и авторизации.
+
+Микробенчмарки вызывают функции напрямую, макробенчмарки проходят весь
+стек middleware и представлений через тестовый клиент Django с заданным
+числом параллельных потоков. Сеть не используется.
+
+Для каждого бенчмарка считаются задержки p50/p95/p99, операции в секунду
+и число запросов к базе на одну операцию. Результаты сравниваются с
+сохраненным JSON-baseline и с бюджетами запросов: QUERY_BUDGETS для
+микробенчмарков и query_budget представлений для макробенчмарков.
+"""
+import statistics
+import threading
+import time
+from types import SimpleNamespace
+
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import Resolver404, resolve
+
+from permissions.utils import check_permission, has_permission
+from users.models import User
+from users.utils import (
+    create_session,
+    decode_jwt_token,
+    get_user_from_session_token,
+    get_user_from_token,
+    issue_jwt_token,
+)
+
+BENCHMARK_USER_EMAIL = 'user@example.com'
+BENCHMARK_USER_PASSWORD = 'user123'
+
+# Максимум запросов к базе на одну операцию микробенчмарка
+QUERY_BUDGETS = {
+    'decode_jwt_token': 0,
+    'get_user_from_token': 1,
+    'get_user_from_session_token': 1,
+    'has_permission': 0,
+    'check_permission': 0,
+    'check_password': 0,
+}
+
+
+def get_query_budget(name):
+    """
+    Бюджет запросов бенчмарка. Для макробенчмарков ('GET /path/') - значение
+    @query_budget представления, которое обслуживает путь
+    """
+    if name in QUERY_BUDGETS:
+        return QUERY_BUDGETS[name]
+    _, _, path = name.partition(' ')
+    try:
+        view = resolve(path).func
+    except Resolver404:
+        return None
+    return getattr(view, 'query_budget', None)
+
+
+class BenchmarkResult:
+    """Задержки одной серии операций (в миллисекундах)"""
+
+    def __init__(self, name, latencies, elapsed, queries, concurrency=1, errors=0):
+        self.name = name
+        self.iterations = len(latencies)
+        self.concurrency = concurrency
+        self.errors = errors
+        self.queries = queries
+        self.ops_per_sec = self.iterations / elapsed if elapsed else 0.0
+        cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+        self.p50 = cuts[49] * 1000
+        self.p95 = cuts[94] * 1000
+        self.p99 = cuts[98] * 1000
+
+    def to_dict(self):
+        return {
+            'iterations': self.iterations,
+            'concurrency': self.concurrency,
+            'errors': self.errors,
+            'queries': self.queries,
+            'ops_per_sec': round(self.ops_per_sec, 1),
+            'p50_ms': round(self.p50, 4),
+            'p95_ms': round(self.p95, 4),
+            'p99_ms': round(self.p99, 4),
+        }
+
+
+def count_queries(func):
+    """Число запросов к базе за один вызов func"""
+    with CaptureQueriesContext(connection) as ctx:
+        func()
+    return len(ctx.captured_queries)
+
+
+def run_micro(name, func, iterations, warmup=10):
+    """Последовательно вызывает func и измеряет каждый вызов"""
+    for _ in range(warmup):
+        func()
+    queries = count_queries(func)
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - t0)
+    return BenchmarkResult(name, latencies, time.perf_counter() - started, queries)
+
+
+def run_macro(name, request, iterations, concurrency, warmup=5):
+    """
+    Выполняет iterations запросов в concurrency потоках, у каждого потока
+    свой клиент. request(client) возвращает ответ, ответы не 2xx считаются ошибками.
+    """
+    client = Client()
+    for _ in range(warmup):
+        request(client)
+    queries = count_queries(lambda: request(client))
+
+    remaining = iter(range(iterations))
+    lock = threading.Lock()
+    latencies = []
+    errors = []
+
+    def worker():
+        client = Client()
+        try:
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                t0 = time.perf_counter()
+                response = request(client)
+                latency = time.perf_counter() - t0
+                with lock:
+                    latencies.append(latency)
+                    if response.status_code >= 300:
+                        errors.append(response.status_code)
+        finally:
+            # У каждого потока свое соединение с базой
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return BenchmarkResult(name, latencies, elapsed, queries, concurrency, len(errors))
+
+
+def build_benchmarks(iterations, concurrency, email=BENCHMARK_USER_EMAIL, password=BENCHMARK_USER_PASSWORD):
+    """
+    Возвращает список (имя, функция запуска) для пользователя email
+    с паролем password. Пользователь должен существовать.
+    """
+    user = User.objects.get(email=email)
+    token = issue_jwt_token(user)
+    session_id = create_session(user)
+    auth = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+    login_data = {'email': email, 'password': password}
+
+    request = SimpleNamespace(user=user)
+    permission_view = check_permission('products', 'read')(lambda request: None)
+
+    # Хеширование пароля на порядки медленнее остальных операций
+    slow_iterations = max(iterations // 50, 10)
+
+    return [
+        ('decode_jwt_token', lambda: run_micro(
+            'decode_jwt_token', lambda: decode_jwt_token(token), iterations)),
+        ('get_user_from_token', lambda: run_micro(
+            'get_user_from_token', lambda: get_user_from_token(token), iterations)),
+        ('get_user_from_session_token', lambda: run_micro(
+            'get_user_from_session_token', lambda: get_user_from_session_token(session_id), iterations)),
+        ('has_permission', lambda: run_micro(
+            'has_permission', lambda: has_permission(user, 'products', 'read'), iterations)),
+        ('check_permission', lambda: run_micro(
+            'check_permission', lambda: permission_view(request), iterations)),
+        ('check_password', lambda: run_micro(
+            'check_password', lambda: user.check_password(password), slow_iterations, warmup=1)),
+        ('GET /api/auth/profile/', lambda: run_macro(
+            'GET /api/auth/profile/',
+            lambda client: client.get('/api/auth/profile/', **auth),
+            iterations, concurrency)),
+        ('GET /api/business/products/', lambda: run_macro(
+            'GET /api/business/products/',
+            lambda client: client.get('/api/business/products/', **auth),
+            iterations, concurrency)),
+        ('POST /api/auth/login/', lambda: run_macro(
+            'POST /api/auth/login/',
+            lambda client: client.post('/api/auth/login/', login_data, content_type='application/json'),
+            slow_iterations, concurrency, warmup=1)),
+    ]
+
+
+def find_regressions(results, baseline, tolerance):
+    """
+    Сравнивает результаты с baseline и бюджетами запросов.
+
+    Returns:
+        list: описания регрессий
+    """
+    problems = []
+    for name, result in results.items():
+        budget = get_query_budget(name)
+        if budget is not None and result['queries'] > budget:
+            problems.append(f'{name}: {result["queries"]} запросов к базе, бюджет {budget}')
+        if result['errors']:
+            problems.append(f'{name}: ошибочных ответов {result["errors"]}')
+
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result['queries'] > base['queries']:
+            problems.append(f'{name}: запросов к базе {result["queries"]}, в baseline {base["queries"]}')
+        for metric in ('p50_ms', 'p95_ms'):
+            limit = base[metric] * (1 + tolerance)
+            if result[metric] > limit:
+                problems.append(
+                    f'{name}: {metric} {result[metric]:.3f} > {limit:.3f} '
+                    f'(baseline {base[metric]:.3f} + {tolerance:.0%})'
+                )
+    return problems
@@ -0,0 +1,147 @@
+"""
+Бэкенд PostgreSQL с пулом соединений psycopg-pool (нужен psycopg 3).
+
+Подключается как ENGINE = 'auth_system.db'. Django берет соединение из пула
+вместо установки нового и возвращает его в пул при закрытии, поэтому
+CONN_MAX_AGE должен быть 0. Параметры пула задаются ключом POOL:
+min_size, max_size, timeout (ожидание свободного соединения, секунды),
+max_idle, max_lifetime и check (проверка соединения перед выдачей).
+"""
+import logging
+import threading
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgresDatabaseWrapper
+from django.db.backends.postgresql.psycopg_any import IsolationLevel, is_psycopg3
+from django.utils.asyncio import async_unsafe
+
+from auth_system.metrics import (
+    db_pool_connections,
+    db_pool_requests_waiting,
+    db_pool_timeouts,
+    db_pool_wait_seconds,
+)
+
+try:
+    from psycopg_pool import ConnectionPool, PoolTimeout
+except ImportError:
+    ConnectionPool = None
+
+
+logger = logging.getLogger(__name__)
+
+
+class PoolWaitStats:
+    """Время ожидания соединения из пула, дублируется в /metrics"""
+
+    def __init__(self, slow_threshold):
+        self.slow_threshold = slow_threshold
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, alias, wait):
+        with self._lock:
+            self.acquired += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        db_pool_wait_seconds.labels(alias=alias).observe(wait)
+        if wait >= self.slow_threshold:
+            logger.warning('Ожидание соединения из пула %s: %.3f с', alias, wait)
+
+    def record_timeout(self, alias):
+        with self._lock:
+            self.timeouts += 1
+        db_pool_timeouts.labels(alias=alias).inc()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'acquired': self.acquired,
+                'timeouts': self.timeouts,
+                'avg_wait_seconds': self.total_wait / self.acquired if self.acquired else 0.0,
+                'max_wait_seconds': self.max_wait,
+            }
+
+
+_pools_lock = threading.Lock()
+_pools = {}
+_wait_stats = {}
+
+
+def get_pool_stats():
+    """Состояние пулов процесса: ожидание соединений и счетчики psycopg-pool"""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {
+        alias: {**_wait_stats[alias].snapshot(), **pool.get_stats()}
+        for alias, pool in pools.items()
+    }
+
+
+def _publish_pool_state(alias, pool):
+    # Размер пула меняется при выдаче и возврате соединений, тогда и обновляем gauge
+    stats = pool.get_stats()
+    db_pool_connections.labels(alias=alias, state='size').set(stats.get('pool_size', 0))
+    db_pool_connections.labels(alias=alias, state='available').set(stats.get('pool_available', 0))
+    db_pool_requests_waiting.labels(alias=alias).set(stats.get('requests_waiting', 0))
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+
+    def _get_pool(self, conn_params):
+        # Пул создается лениво, чтобы его потоки появлялись уже после fork воркера
+        pool = _pools.get(self.alias)
+        if pool is not None:
+            return pool
+        with _pools_lock:
+            if self.alias not in _pools:
+                options = self.settings_dict.get('POOL', {})
+                _pools[self.alias] = ConnectionPool(
+                    kwargs=conn_params,
+                    min_size=options.get('min_size', 2),
+                    max_size=options.get('max_size', 10),
+                    timeout=options.get('timeout', 5),
+                    max_idle=options.get('max_idle', 300),
+                    max_lifetime=options.get('max_lifetime', 3600),
+                    check=ConnectionPool.check_connection if options.get('check', True) else None,
+                    name=self.alias,
+                    open=True,
+                )
+                _wait_stats[self.alias] = PoolWaitStats(options.get('slow_wait', 0.1))
+            return _pools[self.alias]
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        if not is_psycopg3 or ConnectionPool is None:
+            raise ImproperlyConfigured('Для пула соединений установите пакеты psycopg и psycopg-pool')
+        if self.settings_dict['CONN_MAX_AGE']:
+            raise ImproperlyConfigured('С пулом соединений CONN_MAX_AGE должен быть 0')
+
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        self.isolation_level = IsolationLevel(isolation_level or IsolationLevel.READ_COMMITTED)
+
+        pool = self._get_pool(conn_params)
+        started = time.perf_counter()
+        try:
+            connection = pool.getconn()
+        except PoolTimeout:
+            _wait_stats[self.alias].record_timeout(self.alias)
+            raise
+        _wait_stats[self.alias].record(self.alias, time.perf_counter() - started)
+        _publish_pool_state(self.alias, pool)
+
+        if isolation_level is not None:
+            connection.isolation_level = self.isolation_level
+        return connection
+
+    def _close(self):
+        # Соединение возвращается в пул, пул откатывает незавершенную транзакцию
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                pool = _pools[self.alias]
+                pool.putconn(self.connection)
+                _publish_pool_state(self.alias, pool)
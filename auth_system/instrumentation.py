@@ -0,0 +1,141 @@
+"""
+Измерение времени и запросов к базе в пределах одного запроса.
+
+RequestInstrumentationMiddleware создает RequestTimings и кладет его в
+contextvar, код запроса отмечает свои фазы через phase('auth') и
+phase('authz'). Запросы к базе считает обертка execute_wrapper, которая
+ставится на каждое новое соединение. Вне инструментируемого запроса все
+это сводится к одной проверке contextvar.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_current = ContextVar('request_timings', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Представление выполнило больше запросов к базе, чем объявлено в query_budget"""
+
+
+class RequestTimings:
+    """Время фаз запроса (в секундах) и запросы к базе"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        # Запросы блоков budget_exempt() (входят в db_queries)
+        self.exempt_queries = 0
+        self.exempt_depth = 0
+        self.phases = {}
+        self.query_budget = None
+
+    def add_phase(self, name, duration):
+        self.phases[name] = self.phases.get(name, 0.0) + duration
+
+    @property
+    def total(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def budgeted_queries(self):
+        return self.db_queries - self.exempt_queries
+
+    def over_budget(self):
+        return self.query_budget is not None and self.budgeted_queries > self.query_budget
+
+
+def start_request():
+    """Начинает измерение запроса, возвращает токен для finish_request()"""
+    return _current.set(RequestTimings())
+
+
+def finish_request(token):
+    timings = _current.get()
+    _current.reset(token)
+    return timings
+
+
+def get_current_timings():
+    return _current.get()
+
+
+@contextmanager
+def phase(name):
+    """Добавляет время выполнения блока к фазе name текущего запроса"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add_phase(name, time.perf_counter() - started)
+
+
+@contextmanager
+def budget_exempt():
+    """
+    Запросы блока не учитываются в query_budget: например, пересборка
+    кэша процесса, которая выпадает на первый запрос после изменения данных
+    """
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    timings.exempt_depth += 1
+    try:
+        yield
+    finally:
+        timings.exempt_depth -= 1
+
+
+def query_budget(max_queries):
+    """
+    Объявляет, сколько запросов к базе может выполнить представление.
+    Превышение пишется в лог, при QUERY_BUDGET_RAISE=True - вызывает
+    QueryBudgetExceeded. Должен быть внешним декоратором (над @api_view).
+    """
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+def _record_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db_queries += 1
+        timings.db_time += time.perf_counter() - started
+        if timings.exempt_depth:
+            timings.exempt_queries += 1
+
+
+def _install_query_recorder(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def install_query_recorder():
+    """Считает запросы всех соединений: уже открытых и будущих"""
+    connection_created.connect(_install_query_recorder, dispatch_uid='auth_system.instrumentation')
+    for connection in connections.all(initialized_only=True):
+        _install_query_recorder(None, connection)
+
+
+def format_server_timing(timings):
+    """Значение заголовка Server-Timing (длительности в миллисекундах)"""
+    metrics = [f'db;dur={timings.db_time * 1000:.2f};desc="{timings.db_queries} queries"']
+    metrics.extend(f'{name};dur={duration * 1000:.2f}' for name, duration in timings.phases.items())
+    metrics.append(f'total;dur={timings.total * 1000:.2f}')
+    return ', '.join(metrics)
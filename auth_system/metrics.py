@@ -0,0 +1,454 @@
+"""
+Метрики в текстовом формате Prometheus без внешних зависимостей.
+
+Значения хранятся в файле процесса <METRICS_DIR>/metrics_<pid>.db,
+отображенном в память (mmap): увеличение счетчика - запись 8 байт без
+системных вызовов. /metrics читает файлы всех процессов и суммирует
+значения, поэтому счетчики верны при нескольких воркерах gunicorn или
+uwsgi. Gauge тоже суммируется: каждый процесс хранит свое значение
+(например, свою очередь хеширования), /metrics показывает общее.
+Файлы завершившихся воркеров остаются и продолжают учитываться,
+каталог очищается перед запуском сервера. Без METRICS_DIR значения
+хранятся в памяти процесса (runserver, тесты).
+"""
+import bisect
+import glob
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Заголовок файла: занятый объем (uint32) и выравнивание до 8 байт
+_HEADER = struct.Struct('<I4x')
+_KEY_LENGTH = struct.Struct('<I')
+_VALUE = struct.Struct('<d')
+_INITIAL_SIZE = 64 * 1024
+
+# Длительность bcrypt - от миллисекунд до секунд в зависимости от rounds
+PASSWORD_CHECK_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Ожидание соединения из пула - обычно доли миллисекунды, до DB_POOL_TIMEOUT при нехватке
+DB_POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+_families = []
+
+
+def _entry_size(key_length):
+    """Длина ключа, ключ и значение, выровненные до 8 байт"""
+    size = _KEY_LENGTH.size + key_length
+    return size + (-size % 8) + _VALUE.size
+
+
+def _read_entries(data):
+    """Пары (ключ, значение) из содержимого файла метрик"""
+    if len(data) < _HEADER.size:
+        return
+    used, = _HEADER.unpack_from(data, 0)
+    pos = _HEADER.size
+    while pos < min(used, len(data)):
+        key_length, = _KEY_LENGTH.unpack_from(data, pos)
+        key = bytes(data[pos + _KEY_LENGTH.size:pos + _KEY_LENGTH.size + key_length]).decode()
+        pos += _entry_size(key_length)
+        value, = _VALUE.unpack_from(data, pos - _VALUE.size)
+        yield key, value
+
+
+class FileStore:
+    """
+    Значения одного процесса в файле, отображенном в память.
+    Новая запись сначала целиком пишется в файл, затем увеличивается
+    занятый объем в заголовке: читатель не видит недописанных записей.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a+b')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < _INITIAL_SIZE:
+            self._file.truncate(_INITIAL_SIZE)
+            size = _INITIAL_SIZE
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        self._used, = _HEADER.unpack_from(self._mmap, 0)
+        if self._used == 0:
+            self._used = _HEADER.size
+            _HEADER.pack_into(self._mmap, 0, self._used)
+
+        # Файл мог остаться от процесса с тем же pid
+        self._positions = {}
+        pos = _HEADER.size
+        for key, _ in _read_entries(self._mmap):
+            pos += _entry_size(len(key.encode()))
+            self._positions[key] = pos - _VALUE.size
+
+    def _add(self, key):
+        encoded = key.encode()
+        size = _entry_size(len(encoded))
+        if self._used + size > len(self._mmap):
+            new_size = len(self._mmap)
+            while self._used + size > new_size:
+                new_size *= 2
+            self._mmap.close()
+            self._file.truncate(new_size)
+            self._mmap = mmap.mmap(self._file.fileno(), new_size)
+
+        pos = self._used
+        _KEY_LENGTH.pack_into(self._mmap, pos, len(encoded))
+        self._mmap[pos + _KEY_LENGTH.size:pos + _KEY_LENGTH.size + len(encoded)] = encoded
+        value_pos = pos + size - _VALUE.size
+        _VALUE.pack_into(self._mmap, value_pos, 0.0)
+        self._used += size
+        _HEADER.pack_into(self._mmap, 0, self._used)
+        self._positions[key] = value_pos
+        return value_pos
+
+    def inc(self, key, amount):
+        with self._lock:
+            pos = self._positions.get(key)
+            if pos is None:
+                pos = self._add(key)
+            value, = _VALUE.unpack_from(self._mmap, pos)
+            _VALUE.pack_into(self._mmap, pos, value + amount)
+
+    def set(self, key, value):
+        with self._lock:
+            pos = self._positions.get(key)
+            if pos is None:
+                pos = self._add(key)
+            _VALUE.pack_into(self._mmap, pos, value)
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+
+class MemoryStore:
+    """Значения в памяти процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, key, amount):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, key, value):
+        with self._lock:
+            self._values[key] = float(value)
+
+    def items(self):
+        with self._lock:
+            return list(self._values.items())
+
+    def close(self):
+        pass
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Хранилище текущего процесса, создается при первой записи"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if settings.METRICS_DIR:
+                    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+                    path = os.path.join(settings.METRICS_DIR, f'metrics_{os.getpid()}.db')
+                    _store = FileStore(path)
+                else:
+                    _store = MemoryStore()
+    return _store
+
+
+def _reset_store():
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+        _store = None
+
+
+def _reset_store_after_fork():
+    # У дочернего процесса свой файл, файл родителя он не трогает
+    global _store, _store_lock
+    _store = None
+    _store_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_store_after_fork)
+
+
+@receiver(setting_changed)
+def _reset_store_on_setting_change(setting, **kwargs):
+    if setting == 'METRICS_DIR':
+        _reset_store()
+
+
+def _sample_key(family, suffix, labels):
+    return json.dumps([family, suffix, labels], ensure_ascii=False, separators=(',', ':'))
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        _families.append(self)
+
+    def labels(self, *values, **labels):
+        """Значение метрики для набора меток: labels(result='success')"""
+        if labels:
+            values = tuple(labels[name] for name in self.labelnames)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f'{self.name}: ожидаются метки {self.labelnames}')
+            child = self._children.setdefault(values, self._make_child(
+                [[name, str(value)] for name, value in zip(self.labelnames, values)]
+            ))
+        return child
+
+
+class _CounterChild:
+    __slots__ = ('_key',)
+
+    def __init__(self, key):
+        self._key = key
+
+    def inc(self, amount=1):
+        get_store().inc(self._key, amount)
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def _make_child(self, labels):
+        return _CounterChild(_sample_key(self.name, '', labels))
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class _GaugeChild:
+    __slots__ = ('_key',)
+
+    def __init__(self, key):
+        self._key = key
+
+    def set(self, value):
+        get_store().set(self._key, value)
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def _make_child(self, labels):
+        return _GaugeChild(_sample_key(self.name, '', labels))
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class _HistogramChild:
+    __slots__ = ('_bounds', '_bucket_keys', '_sum_key', '_count_key')
+
+    def __init__(self, bounds, bucket_keys, sum_key, count_key):
+        self._bounds = bounds
+        self._bucket_keys = bucket_keys
+        self._sum_key = sum_key
+        self._count_key = count_key
+
+    def observe(self, value):
+        # В хранилище счетчики корзин не накопительные, суммируются при выводе
+        store = get_store()
+        store.inc(self._bucket_keys[bisect.bisect_left(self._bounds, value)], 1)
+        store.inc(self._sum_key, value)
+        store.inc(self._count_key, 1)
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=PASSWORD_CHECK_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def _make_child(self, labels):
+        bucket_keys = [
+            _sample_key(self.name, '_bucket', labels + [['le', _format_value(bound)]])
+            for bound in self.buckets
+        ]
+        return _HistogramChild(
+            self.buckets,
+            bucket_keys,
+            _sample_key(self.name, '_sum', labels),
+            _sample_key(self.name, '_count', labels),
+        )
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == int(value):
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def collect_values():
+    """Суммы значений по всем процессам: ключ -> значение"""
+    totals = {}
+    if settings.METRICS_DIR:
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, 'metrics_*.db')):
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                continue
+            for key, value in _read_entries(data):
+                totals[key] = totals.get(key, 0.0) + value
+    else:
+        for key, value in get_store().items():
+            totals[key] = value
+    return totals
+
+
+def generate_latest():
+    """Все метрики в текстовом формате Prometheus"""
+    samples = {}
+    for key, value in collect_values().items():
+        family, suffix, labels = json.loads(key)
+        samples.setdefault(family, []).append((suffix, labels, value))
+
+    lines = []
+    for metric in _families:
+        lines.append(f'# HELP {metric.name} {_escape(metric.documentation)}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        family_samples = sorted(samples.get(metric.name, []), key=lambda s: (s[1], s[0]))
+        if metric.type == 'histogram':
+            family_samples = _cumulate_buckets(metric, family_samples)
+        for suffix, labels, value in family_samples:
+            lines.append(f'{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _cumulate_buckets(metric, samples):
+    """Накопительные значения корзин гистограммы в порядке возрастания le"""
+    order = {_format_value(bound): index for index, bound in enumerate(metric.buckets)}
+    series = {}
+    for suffix, labels, value in samples:
+        if suffix == '_bucket':
+            base, le = labels[:-1], labels[-1][1]
+            series.setdefault(json.dumps(base), {})[le] = value
+        else:
+            series.setdefault(json.dumps(labels), {})[suffix] = value
+
+    result = []
+    for base_key in sorted(series):
+        base = json.loads(base_key)
+        values = series[base_key]
+        cumulative = 0.0
+        for le in sorted(order, key=order.get):
+            cumulative += values.get(le, 0.0)
+            result.append(('_bucket', base + [['le', le]], cumulative))
+        result.append(('_count', base, values.get('_count', 0.0)))
+        result.append(('_sum', base, values.get('_sum', 0.0)))
+    return result
+
+
+# Метрики сервиса
+
+login_attempts = Counter(
+    'auth_login_attempts_total',
+    'Попытки входа: success - успешный вход, failure - неверные данные или '
+    'деактивированный аккаунт, locked - отказ по лимиту попыток',
+    ['result'],
+)
+password_check_seconds = Histogram(
+    'auth_password_check_seconds',
+    'Время проверки пароля User.check_password (хеширование и ожидание в пуле)',
+)
+password_hash_queue_depth = Gauge(
+    'auth_password_hash_queue_depth',
+    'Задачи хеширования, ожидающие свободного потока пула',
+)
+password_hash_running = Gauge(
+    'auth_password_hash_running',
+    'Задачи хеширования, выполняющиеся в пуле',
+)
+password_hash_rejected = Counter(
+    'auth_password_hash_rejected_total',
+    'Задачи хеширования, отклоненные из-за переполненной очереди',
+)
+password_hash_seconds = Histogram(
+    'auth_password_hash_seconds',
+    'Задачи пула хеширования: wait - ожидание в очереди, run - хеширование',
+    ['stage'],
+)
+token_decode_failures = Counter(
+    'auth_token_decode_failures_total',
+    'JWT, не прошедшие проверку: expired - истек срок, invalid - подпись, формат или ключ',
+    ['reason'],
+)
+session_lookups = Counter(
+    'auth_session_lookups_total',
+    'Поиск пользователя по cookie session_id: hit - активная сессия найдена, miss - нет',
+    ['result'],
+)
+permission_checks = Counter(
+    'authz_permission_checks_total',
+    'Проверки check_permission по элементу и действию',
+    ['element', 'action', 'result'],
+)
+db_pool_wait_seconds = Histogram(
+    'db_pool_wait_seconds',
+    'Ожидание соединения из пула psycopg-pool',
+    ['alias'],
+    buckets=DB_POOL_WAIT_BUCKETS,
+)
+db_pool_timeouts = Counter(
+    'db_pool_timeouts_total',
+    'Запросы соединения, не дождавшиеся свободного соединения за DB_POOL_TIMEOUT',
+    ['alias'],
+)
+db_pool_connections = Gauge(
+    'db_pool_connections',
+    'Соединения пулов: size - открытые, available - свободные',
+    ['alias', 'state'],
+)
+db_pool_requests_waiting = Gauge(
+    'db_pool_requests_waiting',
+    'Запросы, ожидающие свободного соединения из пула',
+    ['alias'],
+)
+permission_matrix_lookups = Counter(
+    'authz_matrix_cache_total',
+    'Обращения к матрице прав: hit - актуальная матрица в памяти, miss - пересборка из базы',
+    ['result'],
+)
@@ -0,0 +1,231 @@
+import logging
+import os
+import random
+import threading
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.urls import Resolver404, resolve
+
+from auth_system import instrumentation, profiling, routers
+
+
+logger = logging.getLogger(__name__)
+
+
+class PrimaryPinningMiddleware:
+    """
+    Закрепляет запросы за основной базой после записи (read-your-writes).
+    Если в запросе была запись, ответ получает cookie db_pin, и следующие
+    запросы клиента в течение DB_REPLICA_PIN_SECONDS читают из основной базы.
+    Без реплик отключается.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not routers.replicas_enabled():
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        routers.start_request(pinned=routers.PIN_COOKIE in request.COOKIES)
+        response = self.get_response(request)
+        self.process_response(response)
+        return response
+
+    async def __acall__(self, request):
+        routers.start_request(pinned=routers.PIN_COOKIE in request.COOKIES)
+        response = await self.get_response(request)
+        self.process_response(response)
+        return response
+
+    def process_response(self, response):
+        if routers.finish_request():
+            response.set_cookie(
+                routers.PIN_COOKIE,
+                '1',
+                max_age=settings.DB_REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax'
+            )
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Измеряет запрос: число и время запросов к базе, время идентификации
+    пользователя (auth) и проверки прав (authz). Результат пишется строкой
+    в лог auth_system.middleware, а при SERVER_TIMING=True - в заголовок
+    Server-Timing. Представления с query_budget проверяются на превышение
+    числа запросов. Включается настройкой REQUEST_INSTRUMENTATION.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_INSTRUMENTATION:
+            raise MiddlewareNotUsed()
+        instrumentation.install_query_recorder()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = instrumentation.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            timings = instrumentation.finish_request(token)
+        self.process_response(request, response, timings)
+        return response
+
+    async def __acall__(self, request):
+        token = instrumentation.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            timings = instrumentation.finish_request(token)
+        self.process_response(request, response, timings)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = instrumentation.get_current_timings()
+        if timings is not None:
+            timings.query_budget = getattr(view_func, 'query_budget', None)
+        return None
+
+    def process_response(self, request, response, timings):
+        phases = timings.phases
+        log_data = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(timings.total * 1000, 2),
+            'db_queries': timings.db_queries,
+            'db_exempt_queries': timings.exempt_queries,
+            'db_ms': round(timings.db_time * 1000, 2),
+            'auth_ms': round(phases.get('auth', 0.0) * 1000, 2),
+            'authz_ms': round(phases.get('authz', 0.0) * 1000, 2),
+        }
+        logger.info(
+            ' '.join(f'{key}=%s' for key in log_data),
+            *log_data.values(),
+            extra={'request_timings': log_data}
+        )
+
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = instrumentation.format_server_timing(timings)
+
+        if timings.over_budget():
+            message = (
+                f'{request.method} {request.path}: {timings.budgeted_queries} запросов к базе, '
+                f'бюджет {timings.query_budget}'
+            )
+            if settings.QUERY_BUDGET_RAISE:
+                raise instrumentation.QueryBudgetExceeded(message)
+            logger.warning(message)
+
+
+class RequestProfilingMiddleware:
+    """
+    Профилирует запросы с подписанным заголовком X-Profile и долю
+    PROFILING_SAMPLE_RATE запросов к представлениям PROFILING_VIEWS,
+    профили пишутся в PROFILING_DIR. Без PROFILING_SIGNING_KEY и
+    PROFILING_SAMPLE_RATE не подключается.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_SIGNING_KEY and not settings.PROFILING_SAMPLE_RATE:
+            raise MiddlewareNotUsed()
+        if settings.PROFILING_MODE not in profiling.PROFILE_EXTENSIONS:
+            raise ImproperlyConfigured(
+                f'PROFILING_MODE должен быть одним из: {", ".join(profiling.PROFILE_EXTENSIONS)}'
+            )
+        self.get_response = get_response
+        # Одновременно профилируется один запрос процесса: профили не смешиваются
+        self._lock = threading.Lock()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        reason = self.should_profile(request)
+        if reason is None or not self._lock.acquire(blocking=False):
+            return self.get_response(request)
+        profiler = profiling.RequestProfiler(settings.PROFILING_MODE)
+        try:
+            profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+        finally:
+            self._lock.release()
+        self.save_profile(request, response, profiler, reason)
+        return response
+
+    async def __acall__(self, request):
+        reason = self.should_profile(request)
+        if reason is None or not self._lock.acquire(blocking=False):
+            return await self.get_response(request)
+        # Под ASGI в профиль попадают и другие корутины event loop,
+        # а потоки sync_to_async не попадают
+        profiler = profiling.RequestProfiler(settings.PROFILING_MODE)
+        try:
+            profiler.start()
+            try:
+                response = await self.get_response(request)
+            finally:
+                profiler.stop()
+        finally:
+            self._lock.release()
+        self.save_profile(request, response, profiler, reason)
+        return response
+
+    def should_profile(self, request):
+        """Причина профилирования запроса: 'header', 'sample' или None"""
+        header = request.META.get('HTTP_X_PROFILE')
+        if header is not None:
+            if settings.PROFILING_SIGNING_KEY and profiling.is_valid_profile_header(header, request.path):
+                return 'header'
+            return None
+        if not settings.PROFILING_SAMPLE_RATE or random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return None
+        if settings.PROFILING_VIEWS:
+            try:
+                match = resolve(request.path_info)
+            except Resolver404:
+                return None
+            if match.url_name not in settings.PROFILING_VIEWS:
+                return None
+        return 'sample'
+
+    def save_profile(self, request, response, profiler, reason):
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.url_name if match is not None and match.url_name else request.path
+        try:
+            path = profiler.save(view_name)
+        except OSError:
+            logger.exception('Не удалось сохранить профиль запроса %s %s', request.method, request.path)
+            return
+        if path is None:
+            logger.warning('Профиль %s %s не сохранен: в PROFILING_DIR уже %s файлов',
+                           request.method, request.path, settings.PROFILING_MAX_FILES)
+            return
+        logger.info('Профиль %s %s сохранен в %s', request.method, request.path, path)
+        # Имя файла видно только тому, кто запросил профиль подписанным заголовком
+        if reason == 'header':
+            response['X-Profile-File'] = os.path.basename(path)
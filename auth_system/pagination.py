@@ -0,0 +1,90 @@
+"""
+Постраничная выдача по ключу (keyset/cursor pagination).
+
+Страница запрашивается параметрами ?cursor=<id последнего объекта>&limit=N,
+следующая страница начинается с WHERE id > cursor ORDER BY id. В отличие
+от OFFSET, стоимость запроса не растет с номером страницы.
+
+Большие списки можно отдавать потоком NDJSON (stream_ndjson): строки
+читаются из базы пачками и сразу пишутся в ответ.
+"""
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+
+class InvalidPageParams(ValueError):
+    """Некорректные параметры cursor или limit"""
+
+
+def get_page_params(query_params):
+    """
+    Разбирает параметры страницы из query string.
+    
+    Returns:
+        tuple: (cursor или None, limit)
+    """
+    try:
+        cursor = query_params.get('cursor')
+        cursor = int(cursor) if cursor else None
+        limit = int(query_params.get('limit') or settings.PAGE_SIZE)
+    except ValueError:
+        raise InvalidPageParams('Параметры cursor и limit должны быть целыми числами')
+    if limit < 1:
+        raise InvalidPageParams('Параметр limit должен быть положительным')
+    return cursor, min(limit, settings.MAX_PAGE_SIZE)
+
+
+def _page_queryset(qs, cursor, limit, key):
+    if cursor is not None:
+        qs = qs.filter(**{f'{key}__gt': cursor})
+    # Лишний объект показывает, есть ли следующая страница
+    return qs.order_by(key)[:limit + 1]
+
+
+def _split_page(items, limit, key):
+    if len(items) > limit:
+        items = items[:limit]
+        return items, getattr(items[-1], key)
+    return items, None
+
+
+def paginate(qs, cursor, limit, key='id'):
+    """
+    Возвращает страницу объектов.
+    
+    Returns:
+        tuple: (список объектов, cursor следующей страницы или None)
+    """
+    return _split_page(list(_page_queryset(qs, cursor, limit, key)), limit, key)
+
+
+async def apaginate(qs, cursor, limit, key='id'):
+    """Асинхронный paginate()"""
+    items = [obj async for obj in _page_queryset(qs, cursor, limit, key)]
+    return _split_page(items, limit, key)
+
+
+def stream_ndjson(qs, serializer_class, cursor=None, key='id', chunk_size=None):
+    """
+    Потоковый ответ: по одному объекту JSON на строку, в порядке key.
+    
+    Queryset читается через iterator(chunk_size), поэтому память воркера
+    не зависит от размера таблицы.
+    
+    Args:
+        cursor: если задан, поток начинается с объектов после него
+    """
+    if cursor is not None:
+        qs = qs.filter(**{f'{key}__gt': cursor})
+    rows = qs.order_by(key).iterator(chunk_size=chunk_size or settings.STREAM_CHUNK_SIZE)
+    serializer = serializer_class()
+    encoder = JSONEncoder(ensure_ascii=False)
+
+    def lines():
+        for obj in rows:
+            yield encoder.encode(serializer.to_representation(obj)) + '\n'
+
+    return StreamingHttpResponse(lines(), content_type=NDJSON_CONTENT_TYPE)
@@ -0,0 +1,192 @@
+"""
+Профилирование отдельных запросов в рабочем окружении.
+
+RequestProfilingMiddleware профилирует запрос, если у него есть подписанный
+заголовок X-Profile или если он попал в выборку PROFILING_SAMPLE_RATE.
+Результат пишется в каталог PROFILING_DIR:
+- cprofile: файл .prof для pstats, snakeviz и команды profile_report;
+- sampling: стеки потока запроса, снятые с интервалом PROFILING_SAMPLE_INTERVAL,
+  в формате collapsed (flamegraph.pl, speedscope).
+
+Под ASGI поток запроса - это поток event loop: в профиль и снимки стека
+попадают все корутины, выполнявшиеся в нем, а код в потоках sync_to_async
+(синхронный ORM, хеширование паролей) не попадает.
+"""
+import cProfile
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+
+from django.conf import settings
+from django.core import signing
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_EXTENSIONS = {'cprofile': '.prof', 'sampling': '.collapsed'}
+
+_SIGNING_SALT = 'auth_system.profiling'
+_sequence = itertools.count(1)
+
+# Как часто (секунды) пересчитывать файлы в PROFILING_DIR
+SPOOL_RESCAN_INTERVAL = 60
+
+
+def _get_signer():
+    return signing.TimestampSigner(key=settings.PROFILING_SIGNING_KEY, salt=_SIGNING_SALT)
+
+
+def sign_profile_request(path):
+    """Значение заголовка X-Profile, разрешающее профилировать запросы к path"""
+    return _get_signer().sign(path)
+
+
+def is_valid_profile_header(value, path):
+    """Заголовок подписан PROFILING_SIGNING_KEY для этого пути и не устарел"""
+    try:
+        signed_path = _get_signer().unsign(value, max_age=settings.PROFILING_HEADER_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return signed_path == path
+
+
+@lru_cache(maxsize=4096)
+def short_filename(filename):
+    """Путь к модулю без каталога проекта или site-packages"""
+    base_dir = str(settings.BASE_DIR) + os.sep
+    if filename.startswith(base_dir):
+        return filename[len(base_dir):]
+    _, found, rest = filename.rpartition('site-packages' + os.sep)
+    return rest if found else filename
+
+
+def frame_label(code):
+    return f'{code.co_name} ({short_filename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SpoolCounter:
+    """
+    Число файлов в каталоге профилей без os.listdir при каждом сохранении.
+    Процесс считает свои файлы сам и пересчитывает каталог не чаще раза в
+    SPOOL_RESCAN_INTERVAL секунд, чтобы учесть удаленные файлы и файлы
+    других процессов. Поэтому лимит может ненадолго превышаться на число
+    профилей, записанных другими процессами за этот интервал.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._directory = None
+        self._count = 0
+        self._scanned_at = 0.0
+
+    def reserve(self, directory, limit):
+        """Учитывает новый файл, False - если каталог уже заполнен"""
+        with self._lock:
+            now = time.monotonic()
+            if directory != self._directory or now - self._scanned_at >= SPOOL_RESCAN_INTERVAL:
+                self._count = len(os.listdir(directory))
+                self._directory = directory
+                self._scanned_at = now
+            if self._count >= limit:
+                return False
+            self._count += 1
+            return True
+
+
+_spool = SpoolCounter()
+
+
+class StackSampler:
+    """
+    Статистический профилировщик: отдельный поток раз в interval секунд
+    снимает стек потока запроса через sys._current_frames().
+    Под ASGI это поток event loop, см. описание модуля.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiling-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+class RequestProfiler:
+    """Профилировщик одного запроса в режиме PROFILING_MODE"""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self._profile = None
+        self._sampler = None
+
+    def start(self):
+        if self.mode == 'sampling':
+            self._sampler = StackSampler(threading.get_ident(), settings.PROFILING_SAMPLE_INTERVAL)
+            self._sampler.start()
+        else:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self):
+        if self._sampler is not None:
+            self._sampler.stop()
+        else:
+            self._profile.disable()
+
+    def save(self, view_name):
+        """Записывает результат в PROFILING_DIR, возвращает путь или None"""
+        directory = settings.PROFILING_DIR
+        os.makedirs(directory, exist_ok=True)
+        # Не даем выборке заполнить диск
+        if not _spool.reserve(directory, settings.PROFILING_MAX_FILES):
+            return None
+
+        extension = PROFILE_EXTENSIONS[self.mode]
+        name = '{time}_{view}_{pid}-{seq}{ext}'.format(
+            time=datetime.now().strftime('%Y%m%dT%H%M%S'),
+            view=re.sub(r'[^\w.-]+', '-', view_name).strip('-') or 'unknown',
+            pid=os.getpid(),
+            seq=next(_sequence),
+            ext=extension,
+        )
+        path = os.path.join(directory, name)
+        # Запись во временный файл: profile_report не увидит недописанный профиль
+        tmp_path = path + '.tmp'
+        if self._sampler is not None:
+            self._sampler.write(tmp_path)
+        else:
+            self._profile.dump_stats(tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+
+def parse_profile_filename(filename):
+    """Имя представления из имени файла профиля"""
+    match = re.match(r'^\d{8}T\d{6}_(?P<view>.+)_\d+-\d+\.(prof|collapsed)$', filename)
+    return match.group('view') if match else None
@@ -0,0 +1,87 @@
+"""
+Маршрутизация запросов между основной базой и репликами для чтения.
+
+Чтение идет на случайную реплику из REPLICA_DATABASES, запись - в основную
+базу. После записи запрос до конца читает из основной базы. Кроме того,
+на DB_REPLICA_PIN_SECONDS закрепляются за основной базой следующие
+запросы того же клиента (cookie db_pin) и того же пользователя (метка
+в кэше), чтобы, например, только что созданная сессия была найдена
+несмотря на отставание реплики.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+PIN_COOKIE = 'db_pin'
+
+_pinned = ContextVar('db_pinned', default=False)
+_written = ContextVar('db_written', default=False)
+_user_id = ContextVar('db_user_id', default=None)
+
+
+def _user_pin_key(user_id):
+    return f'db:pinned_user:{user_id}'
+
+
+def replicas_enabled():
+    return bool(settings.REPLICA_DATABASES)
+
+
+def start_request(pinned):
+    """Сбрасывает состояние маршрутизации в начале запроса"""
+    _pinned.set(pinned)
+    _written.set(False)
+    _user_id.set(None)
+
+
+def finish_request():
+    """
+    Запоминает запись пользователя в кэше.
+
+    Returns:
+        bool: была ли в запросе запись в основную базу
+    """
+    written = _written.get()
+    user_id = _user_id.get()
+    if written and user_id is not None:
+        cache.set(_user_pin_key(user_id), True, settings.DB_REPLICA_PIN_SECONDS)
+    return written
+
+
+def set_current_user(user_id):
+    """Сообщает, от имени какого пользователя выполняется запрос"""
+    _user_id.set(user_id)
+
+
+def pin_if_user_wrote(user_id):
+    """Закрепляет запрос за основной базой, если пользователь недавно что-то записал"""
+    if replicas_enabled() and not _pinned.get() and cache.get(_user_pin_key(user_id)):
+        _pinned.set(True)
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if not settings.REPLICA_DATABASES:
+            return None
+        # Внутри транзакции (например, select_for_update) читаем из основной базы
+        if _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.REPLICA_DATABASES)
+
+    def db_for_write(self, model, **hints):
+        if settings.REPLICA_DATABASES:
+            _written.set(True)
+            _pinned.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
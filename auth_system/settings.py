@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import config, Csv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -23,7 +23,109 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = config('SECRET_KEY', default='django-insecure-dw@++v%4cehtu(r7=$)an#1=f%z5m_8@ed_tsni&g58je!!c&=')
 JWT_SECRET_KEY = config('JWT_SECRET_KEY', default='your-jwt-secret-key-change-in-production')
-JWT_ALGORITHM = 'HS256'
+# Алгоритм подписи JWT: HS256 (общий секрет) или EdDSA/RS256 (ключи из JWT_KEYRING_FILE)
+JWT_ALGORITHM = config('JWT_ALGORITHM', default='HS256')
+# Файл с ключами подписи, создается и обновляется командой rotate_jwt_keys
+JWT_KEYRING_FILE = config('JWT_KEYRING_FILE', default=str(BASE_DIR / 'jwt_keyring.json'))
+# Принимать старые токены HS256 после перехода на асимметричную подпись.
+# Пока включено, владелец общего секрета может выпускать принимаемые токены
+JWT_ACCEPT_LEGACY_HS256 = config('JWT_ACCEPT_LEGACY_HS256', default=False, cast=bool)
+# Время кэширования /api/auth/.well-known/jwks.json клиентами (секунды)
+JWKS_CACHE_MAX_AGE = config('JWKS_CACHE_MAX_AGE', default=300, cast=int)
+# Токены с claims (role_id, is_superuser, версия): пользователь определяется без запроса к БД
+JWT_CLAIMS_MODE = config('JWT_CLAIMS_MODE', default=False, cast=bool)
+# Время жизни закэшированной версии данных авторизации пользователя (секунды)
+JWT_CLAIMS_VERSION_TTL = config('JWT_CLAIMS_VERSION_TTL', default=300, cast=int)
+
+# Скользящий срок действия сессий и отложенная запись активности
+SESSION_ACTIVITY_TRACKING = config('SESSION_ACTIVITY_TRACKING', default=True, cast=bool)
+# Интервал сброса буфера активности в базу (секунды)
+SESSION_ACTIVITY_FLUSH_INTERVAL = config('SESSION_ACTIVITY_FLUSH_INTERVAL', default=10, cast=float)
+# Количество записей, при котором буфер сбрасывается досрочно
+SESSION_ACTIVITY_FLUSH_SIZE = config('SESSION_ACTIVITY_FLUSH_SIZE', default=500, cast=int)
+# Максимальный размер буфера, записи сверх него отбрасываются
+SESSION_ACTIVITY_MAX_PENDING = config('SESSION_ACTIVITY_MAX_PENDING', default=10000, cast=int)
+
+# Периодическая очистка истекших сессий в процессе сервера (секунды, 0 - выключена)
+SESSION_REAPER_INTERVAL = config('SESSION_REAPER_INTERVAL', default=0, cast=float)
+SESSION_REAPER_BATCH_SIZE = config('SESSION_REAPER_BATCH_SIZE', default=1000, cast=int)
+# Максимум пачек за один проход, чтобы не создавать всплесков WAL
+SESSION_REAPER_MAX_BATCHES = config('SESSION_REAPER_MAX_BATCHES', default=50, cast=int)
+# Секционирование user_sessions по expires_at (PostgreSQL, команда partition_sessions)
+SESSION_PARTITION_INTERVAL_DAYS = config('SESSION_PARTITION_INTERVAL_DAYS', default=7, cast=int)
+SESSION_PARTITION_PERIODS_AHEAD = config('SESSION_PARTITION_PERIODS_AHEAD', default=4, cast=int)
+
+# Пул хеширования паролей: число потоков и размер очереди ожидания
+PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', default=4, cast=int)
+PASSWORD_HASH_QUEUE_SIZE = config('PASSWORD_HASH_QUEUE_SIZE', default=16, cast=int)
+# Значение Retry-After (секунды) для ответа 503 при переполненной очереди
+PASSWORD_HASH_RETRY_AFTER = config('PASSWORD_HASH_RETRY_AFTER', default=1, cast=int)
+# Алгоритм хеширования паролей: bcrypt, argon2id (нужен argon2-cffi) или fast (только для тестов)
+PASSWORD_HASHER = config('PASSWORD_HASHER', default='bcrypt')
+BCRYPT_ROUNDS = config('BCRYPT_ROUNDS', default=12, cast=int)
+ARGON2_TIME_COST = config('ARGON2_TIME_COST', default=3, cast=int)
+ARGON2_MEMORY_COST = config('ARGON2_MEMORY_COST', default=65536, cast=int)  # КиБ
+ARGON2_PARALLELISM = config('ARGON2_PARALLELISM', default=4, cast=int)
+
+# Ограничение попыток входа (проверяется до хеширования пароля)
+LOGIN_THROTTLE_ENABLED = config('LOGIN_THROTTLE_ENABLED', default=True, cast=bool)
+LOGIN_THROTTLE_PERIOD = config('LOGIN_THROTTLE_PERIOD', default=60, cast=int)  # секунды
+LOGIN_THROTTLE_EMAIL_LIMIT = config('LOGIN_THROTTLE_EMAIL_LIMIT', default=5, cast=int)
+LOGIN_THROTTLE_IP_LIMIT = config('LOGIN_THROTTLE_IP_LIMIT', default=20, cast=int)
+LOGIN_THROTTLE_MAX_KEYS = config('LOGIN_THROTTLE_MAX_KEYS', default=100000, cast=int)
+# Алиас общего кэша из CACHES для лимита на все процессы (пусто - память процесса)
+LOGIN_THROTTLE_CACHE = config('LOGIN_THROTTLE_CACHE', default='')
+LOGIN_THROTTLE_TRUST_X_FORWARDED_FOR = config('LOGIN_THROTTLE_TRUST_X_FORWARDED_FOR', default=False, cast=bool)
+# Сколько доверенных прокси перед приложением дописывают X-Forwarded-For (адрес клиента - N-й справа)
+LOGIN_THROTTLE_TRUSTED_PROXY_COUNT = config('LOGIN_THROTTLE_TRUSTED_PROXY_COUNT', default=1, cast=int)
+
+# Асинхронные представления users и business (для запуска под ASGI)
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
+# Постраничная выдача списков: размер страницы по умолчанию и максимальный
+PAGE_SIZE = config('PAGE_SIZE', default=50, cast=int)
+MAX_PAGE_SIZE = config('MAX_PAGE_SIZE', default=500, cast=int)
+# Сколько строк читать из базы за раз при потоковой выдаче (?stream=ndjson)
+STREAM_CHUNK_SIZE = config('STREAM_CHUNK_SIZE', default=2000, cast=int)
+
+# Массовая загрузка правил доступа: максимум правил за раз и размер пачки INSERT
+ACCESS_RULES_BULK_MAX = config('ACCESS_RULES_BULK_MAX', default=10000, cast=int)
+ACCESS_RULES_BULK_BATCH_SIZE = config('ACCESS_RULES_BULK_BATCH_SIZE', default=1000, cast=int)
+
+# Измерение запросов: время и число запросов к базе, фазы auth/authz в логе
+REQUEST_INSTRUMENTATION = config('REQUEST_INSTRUMENTATION', default=False, cast=bool)
+# Отдавать измерения клиенту в заголовке Server-Timing
+SERVER_TIMING = config('SERVER_TIMING', default=False, cast=bool)
+# Превышение query_budget представления вызывает исключение (для тестов), иначе только лог
+QUERY_BUDGET_RAISE = config('QUERY_BUDGET_RAISE', default=False, cast=bool)
+
+# Каталог файлов метрик воркеров (общий для всех процессов), пусто - метрики в памяти процесса
+METRICS_DIR = config('METRICS_DIR', default='')
+# Токен для доступа к /metrics (Authorization: Bearer <токен>), пусто - без проверки
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Профилирование запросов: ключ подписи заголовка X-Profile, пусто - заголовок не принимается
+PROFILING_SIGNING_KEY = config('PROFILING_SIGNING_KEY', default='')
+# Срок действия подписанного заголовка X-Profile (секунды)
+PROFILING_HEADER_MAX_AGE = config('PROFILING_HEADER_MAX_AGE', default=600, cast=int)
+# Доля профилируемых запросов (0.0 - 1.0) к представлениям PROFILING_VIEWS (имена URL, пусто - ко всем)
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PROFILING_VIEWS = config('PROFILING_VIEWS', default='', cast=Csv())
+# cprofile - файлы .prof (pstats), sampling - снимки стека в формате collapsed для flame graph
+PROFILING_MODE = config('PROFILING_MODE', default='cprofile')
+# Интервал снимков стека в режиме sampling (секунды)
+PROFILING_SAMPLE_INTERVAL = config('PROFILING_SAMPLE_INTERVAL', default=0.001, cast=float)
+PROFILING_DIR = config('PROFILING_DIR', default=str(BASE_DIR / 'profiles'))
+PROFILING_MAX_FILES = config('PROFILING_MAX_FILES', default=1000, cast=int)
+
+# Как часто процесс сверяет версию матрицы прав с кэшем (миллисекунды), 0 - при каждой
+# проверке. Изменение правил в другом процессе становится видно не позже чем через интервал
+PERMISSION_MATRIX_CHECK_INTERVAL_MS = config('PERMISSION_MATRIX_CHECK_INTERVAL_MS', default=1000, cast=int)
+
+# Хранилище бизнес-объектов: db - база данных, memory - память процесса (демо-стенды)
+BUSINESS_STORAGE = config('BUSINESS_STORAGE', default='db')
+# Фикстура dumpdata для начального наполнения хранилища memory, пусто - хранилище пустое
+BUSINESS_MEMORY_FIXTURE = config('BUSINESS_MEMORY_FIXTURE', default='')
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
@@ -49,11 +151,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'auth_system.middleware.RequestInstrumentationMiddleware',  # При REQUEST_INSTRUMENTATION=True
+    'auth_system.middleware.RequestProfilingMiddleware',  # При PROFILING_SIGNING_KEY или PROFILING_SAMPLE_RATE
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'auth_system.middleware.PrimaryPinningMiddleware',  # Только при наличии реплик
     'users.middleware.UserIdentificationMiddleware',  # Наш кастомный middleware
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -82,17 +187,50 @@ WSGI_APPLICATION = 'auth_system.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# Пул соединений (auth_system/db, psycopg-pool). Без пула соединения
+# переиспользуются в течение DB_CONN_MAX_AGE секунд
+DB_POOL = config('DB_POOL', default=True, cast=bool)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'auth_system.db' if DB_POOL else 'django.db.backends.postgresql',
         'NAME': config('DB_NAME', default='auth_system'),
         'USER': config('DB_USER', default='aliceglass'),
         'PASSWORD': config('DB_PASSWORD', default='postgres'),
         'HOST': config('DB_HOST', default='localhost'),
         'PORT': config('DB_PORT', default='5432'),
+        # С пулом соединение возвращается в пул в конце каждого запроса
+        'CONN_MAX_AGE': 0 if DB_POOL else config('DB_CONN_MAX_AGE', default=60, cast=int),
+        # Проверять переиспользуемое соединение перед первым запросом. Имеет смысл
+        # только без пула: при CONN_MAX_AGE=0 соединение не переиспользуется,
+        # а соединения пула проверяет сам пул (POOL['check'])
+        'CONN_HEALTH_CHECKS': not DB_POOL,
+        'POOL': {
+            'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+            # Максимальное ожидание свободного соединения (секунды)
+            'timeout': config('DB_POOL_TIMEOUT', default=5, cast=float),
+            'max_idle': config('DB_POOL_MAX_IDLE', default=300, cast=float),
+            # Ожидание дольше этого значения (секунды) записывается в лог
+            'slow_wait': config('DB_POOL_SLOW_WAIT', default=0.1, cast=float),
+        },
     }
 }
 
+# Реплики для чтения: хосты через запятую (имя базы и учетные данные как у основной)
+DB_REPLICA_HOSTS = config('DB_REPLICA_HOSTS', default='', cast=Csv())
+for _index, _host in enumerate(DB_REPLICA_HOSTS, start=1):
+    DATABASES[f'replica{_index}'] = {
+        **DATABASES['default'],
+        'HOST': _host,
+        'TEST': {'MIRROR': 'default'},
+    }
+# Алиасы баз, на которые PrimaryReplicaRouter направляет чтение
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['auth_system.routers.PrimaryReplicaRouter']
+# Сколько секунд после записи клиент и пользователь читают из основной базы
+DB_REPLICA_PIN_SECONDS = config('DB_REPLICA_PIN_SECONDS', default=5, cast=int)
+
 # Используем кастомную модель пользователя
 AUTH_USER_MODEL = 'users.User'
 
@@ -135,8 +273,11 @@ STATIC_URL = 'static/'
 
 # REST Framework settings
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'users.authentication.UserIdentificationAuthentication',
+    ],
     'DEFAULT_PERMISSION_CLASSES': [],
+    'UNAUTHENTICATED_USER': None,
 }
 
 # CORS settings
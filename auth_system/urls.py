@@ -17,9 +17,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from auth_system.views import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('users.urls')),
     path('api/permissions/', include('permissions.urls')),
     path('api/business/', include('business.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -0,0 +1,19 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+from auth_system import metrics
+from users.utils import skip_user_identification
+
+
+@skip_user_identification
+@require_GET
+def metrics_view(request):
+    """Метрики всех процессов в текстовом формате Prometheus"""
+    if settings.METRICS_TOKEN:
+        expected = f'Bearer {settings.METRICS_TOKEN}'
+        if not hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), expected):
+            return HttpResponse('Необходим токен метрик\n', status=401, content_type=metrics.CONTENT_TYPE)
+    return HttpResponse(metrics.generate_latest(), content_type=metrics.CONTENT_TYPE)
@@ -1,3 +1,22 @@
 from django.contrib import admin
+from business.models import Product, Order, Shop
 
-# Register your models here.
+
+@admin.register(Product)
+class ProductAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'price', 'owner', 'created_at']
+    search_fields = ['name']
+    raw_id_fields = ['owner']
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ['id', 'product', 'quantity', 'owner', 'created_at']
+    raw_id_fields = ['product', 'owner']
+
+
+@admin.register(Shop)
+class ShopAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'address', 'owner', 'created_at']
+    search_fields = ['name']
+    raw_id_fields = ['owner']
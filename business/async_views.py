@@ -0,0 +1,153 @@
+"""
+Асинхронные версии представлений business.views для запуска под ASGI.
+Подключаются вместо синхронных при ASYNC_VIEWS=True.
+"""
+from rest_framework import status
+
+from auth_system.instrumentation import query_budget
+from auth_system.pagination import InvalidPageParams, get_page_params
+from business import repository
+from business.serializers import ProductSerializer, OrderSerializer, ShopSerializer
+from permissions.utils import check_permission
+from users.utils import async_api_view, json_response
+
+
+async def aget_product_owner_from_request(request, *args, **kwargs):
+    product_id = kwargs.get('product_id')
+    if product_id:
+        return await repository.products.aget_owner_id(product_id)
+    return None
+
+
+async def aload_owner(request, repo, object_id):
+    """Асинхронный load_owner()"""
+    obj = await repo.aget(object_id)
+    request.loaded_object = obj
+    return obj.owner_id if obj else None
+
+
+async def aget_loaded_object(request, repo, object_id):
+    """Асинхронный get_loaded_object()"""
+    obj = getattr(request, 'loaded_object', None)
+    if obj is not None and obj.pk == object_id:
+        return obj
+    return await repo.aget(object_id)
+
+
+async def aload_product_owner_from_request(request, *args, **kwargs):
+    product_id = kwargs.get('product_id')
+    if product_id:
+        return await aload_owner(request, repository.products, product_id)
+    return None
+
+
+async def aload_order_owner_from_request(request, *args, **kwargs):
+    order_id = kwargs.get('order_id')
+    if order_id:
+        return await aload_owner(request, repository.orders, order_id)
+    return None
+
+
+async def paginated_response(request, repo, serializer_class, name):
+    """Страница доступных пользователю объектов: {name: [...], 'next_cursor': id или None}"""
+    try:
+        cursor, limit = get_page_params(request.GET)
+    except InvalidPageParams as e:
+        return json_response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    items, next_cursor = await repo.alist_for_user(request.user, cursor, limit)
+    return json_response({
+        name: serializer_class(items, many=True).data,
+        'next_cursor': next_cursor,
+    }, status=status.HTTP_200_OK)
+
+
+@query_budget(2)
+@async_api_view(['GET'])
+@check_permission('products', 'read')
+async def list_products(request):
+    """Список продуктов (только свои, если нет read_all)"""
+    return await paginated_response(request, repository.products, ProductSerializer, 'products')
+
+
+@async_api_view(['GET'])
+@check_permission('products', 'read', check_owner=True, owner_getter=aload_product_owner_from_request)
+async def get_product(request, product_id):
+    """Получение продукта по ID"""
+    product = await aget_loaded_object(request, repository.products, product_id)
+    if not product:
+        return json_response({'error': 'Продукт не найден'}, status=status.HTTP_404_NOT_FOUND)
+
+    return json_response({'product': ProductSerializer(product).data}, status=status.HTTP_200_OK)
+
+
+@async_api_view(['POST'])
+@check_permission('products', 'create')
+async def create_product(request):
+    """Создание нового продукта"""
+    serializer = ProductSerializer(data=request.data)
+    if not serializer.is_valid():
+        return json_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    product = await repository.products.acreate(request.user.id, **serializer.validated_data)
+    return json_response(
+        {'product': ProductSerializer(product).data, 'message': 'Продукт создан'},
+        status=status.HTTP_201_CREATED
+    )
+
+
+@async_api_view(['PUT', 'PATCH'])
+@check_permission('products', 'update', check_owner=True, owner_getter=aload_product_owner_from_request)
+async def update_product(request, product_id):
+    """Обновление продукта"""
+    product = await aget_loaded_object(request, repository.products, product_id)
+    if not product:
+        return json_response({'error': 'Продукт не найден'}, status=status.HTTP_404_NOT_FOUND)
+
+    serializer = ProductSerializer(product, data=request.data, partial=True)
+    if not serializer.is_valid():
+        return json_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    product = await repository.products.aupdate(product, **serializer.validated_data)
+    if not product:
+        return json_response({'error': 'Продукт не найден'}, status=status.HTTP_404_NOT_FOUND)
+
+    return json_response(
+        {'product': ProductSerializer(product).data, 'message': 'Продукт обновлен'},
+        status=status.HTTP_200_OK
+    )
+
+
+@async_api_view(['DELETE'])
+@check_permission('products', 'delete', check_owner=True, owner_getter=aget_product_owner_from_request)
+async def delete_product(request, product_id):
+    """Удаление продукта"""
+    if not await repository.products.adelete(product_id):
+        return json_response({'error': 'Продукт не найден'}, status=status.HTTP_404_NOT_FOUND)
+
+    return json_response({'message': 'Продукт удален'}, status=status.HTTP_200_OK)
+
+
+@async_api_view(['GET'])
+@check_permission('orders', 'read')
+async def list_orders(request):
+    """Список заказов"""
+    return await paginated_response(request, repository.orders, OrderSerializer, 'orders')
+
+
+@async_api_view(['GET'])
+@check_permission('orders', 'read', check_owner=True, owner_getter=aload_order_owner_from_request)
+async def get_order(request, order_id):
+    """Получение заказа по ID"""
+    order = await aget_loaded_object(request, repository.orders, order_id)
+    if not order:
+        return json_response({'error': 'Заказ не найден'}, status=status.HTTP_404_NOT_FOUND)
+
+    return json_response({'order': OrderSerializer(order).data}, status=status.HTTP_200_OK)
+
+
+@async_api_view(['GET'])
+@check_permission('shops', 'read')
+async def list_shops(request):
+    """Список магазинов"""
+    return await paginated_response(request, repository.shops, ShopSerializer, 'shops')
@@ -1,3 +1,74 @@
 from django.db import models
 
-# Create your models here.
+from users.models import User
+
+
+class Product(models.Model):
+    """Продукты/Товары"""
+    name = models.CharField(max_length=255)
+    price = models.DecimalField(max_digits=12, decimal_places=2)
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='products'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'products'
+        indexes = [
+            # Постраничный список своих объектов: WHERE owner_id = ? AND id > ? ORDER BY id
+            models.Index(fields=['owner', 'id']),
+        ]
+    
+    def __str__(self):
+        return self.name
+
+
+class Order(models.Model):
+    """Заказы"""
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='orders'
+    )
+    quantity = models.PositiveIntegerField(default=1)
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='orders'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'orders'
+        indexes = [
+            models.Index(fields=['owner', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"Order #{self.pk}"
+
+
+class Shop(models.Model):
+    """Магазины"""
+    name = models.CharField(max_length=255)
+    address = models.CharField(max_length=500, blank=True)
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shops'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'shops'
+        indexes = [
+            models.Index(fields=['owner', 'id']),
+        ]
+    
+    def __str__(self):
+        return self.name
@@ -0,0 +1,263 @@
+"""
+Хранилища бизнес-объектов.
+
+DatabaseRepository работает через ORM, MemoryRepository держит объекты в
+памяти процесса (демо-стенды и edge-кэши без базы). Хранилище выбирается
+настройкой BUSINESS_STORAGE, представления используют только общий
+интерфейс: get, get_owner_id, list_for_user, create, update, delete и их
+асинхронные версии с префиксом a.
+
+MemoryRepository наполняется при импорте из фикстуры BUSINESS_MEMORY_FIXTURE
+(формат dumpdata), без нее хранилища в памяти пустые.
+"""
+import copy
+import itertools
+import threading
+from bisect import bisect_right
+from collections import namedtuple
+
+from django.conf import settings
+from django.core import serializers
+from django.utils import timezone
+
+from auth_system.pagination import paginate, apaginate
+from business.models import Product, Order, Shop
+from permissions.matrix import aget_matrix
+from permissions.utils import SCOPE_ALL, SCOPE_NONE, get_access_scope, scoped_queryset
+
+
+class DatabaseRepository:
+    """Объекты в базе данных"""
+
+    def __init__(self, model, element_name):
+        self.model = model
+        self.element_name = element_name
+
+    def _filter(self, object_id):
+        return self.model.objects.filter(pk=object_id)
+
+    def _visible(self, user, matrix=None):
+        return scoped_queryset(user, self.element_name, 'read', self.model.objects.all(), matrix=matrix)
+
+    def get(self, object_id):
+        return self._filter(object_id).first()
+
+    def get_owner_id(self, object_id):
+        """Получает ID владельца объекта одним запросом по первичному ключу"""
+        return self._filter(object_id).values_list('owner_id', flat=True).first()
+
+    def list_for_user(self, user, cursor, limit, matrix=None):
+        """Страница объектов, доступных пользователю на чтение: (объекты, next_cursor)"""
+        return paginate(self._visible(user, matrix), cursor, limit)
+
+    def create(self, owner_id, **fields):
+        return self.model.objects.create(owner_id=owner_id, **fields)
+
+    def _update_fields(self, fields):
+        # QuerySet.update() не заполняет auto_now, время обновления задаем явно
+        return {**fields, 'updated_at': timezone.now()}
+
+    def _apply(self, obj, fields):
+        for field, value in fields.items():
+            setattr(obj, field, value)
+        return obj
+
+    def update(self, obj, **fields):
+        """
+        Обновляет поля объекта одним UPDATE по первичному ключу, возвращает
+        объект или None, если он удален. В отличие от save(), удаленный
+        объект не создается заново.
+        """
+        fields = self._update_fields(fields)
+        if not self._filter(obj.id).update(**fields):
+            return None
+        return self._apply(obj, fields)
+
+    def delete(self, object_id):
+        """Удаляет объект, возвращает True, если он существовал"""
+        deleted, _ = self._filter(object_id).delete()
+        return deleted > 0
+
+    async def aget(self, object_id):
+        return await self._filter(object_id).afirst()
+
+    async def aget_owner_id(self, object_id):
+        return await self._filter(object_id).values_list('owner_id', flat=True).afirst()
+
+    async def alist_for_user(self, user, cursor, limit):
+        return await apaginate(self._visible(user, await aget_matrix()), cursor, limit)
+
+    async def acreate(self, owner_id, **fields):
+        return await self.model.objects.acreate(owner_id=owner_id, **fields)
+
+    async def aupdate(self, obj, **fields):
+        fields = self._update_fields(fields)
+        if not await self._filter(obj.id).aupdate(**fields):
+            return None
+        return self._apply(obj, fields)
+
+    async def adelete(self, object_id):
+        deleted, _ = await self._filter(object_id).adelete()
+        return deleted > 0
+
+
+# Неизменяемый снимок хранилища: объекты по ID, отсортированные ID всех
+# объектов и отсортированные ID объектов каждого владельца
+_Snapshot = namedtuple('_Snapshot', ['by_id', 'ids', 'by_owner'])
+
+
+class MemoryRepository:
+    """
+    Объекты в памяти процесса.
+
+    Хранилище - снимок с хеш-индексом по ID и индексом по владельцу.
+    Запись (copy-on-write) под блокировкой строит новый снимок и подменяет
+    ссылку на него, чтение берет текущий снимок без блокировок и никогда не
+    видит частично примененных изменений. Получение объекта и его владельца -
+    O(1), страница списка - O(log n + limit). Каждая запись копирует все
+    хранилище (словарь объектов и индексы), то есть стоит O(n) по времени и
+    памяти, поэтому хранилище рассчитано на данные, которые в основном
+    читаются.
+
+    ID выдаются монотонным счетчиком и не переиспользуются после удаления.
+    Объекты - несохраненные экземпляры модели, их нельзя изменять на месте.
+    """
+
+    def __init__(self, model, element_name):
+        self.model = model
+        self.element_name = element_name
+        self._snapshot = _Snapshot({}, (), {})
+        self._ids = itertools.count(1)
+        self._write_lock = threading.Lock()
+
+    def load(self, objects):
+        """Заменяет содержимое хранилища объектами, ID продолжаются после наибольшего"""
+        objects = sorted(objects, key=lambda obj: obj.id)
+        by_owner = {}
+        for obj in objects:
+            by_owner.setdefault(obj.owner_id, []).append(obj.id)
+        with self._write_lock:
+            self._snapshot = _Snapshot(
+                {obj.id: obj for obj in objects},
+                tuple(obj.id for obj in objects),
+                {owner_id: tuple(ids) for owner_id, ids in by_owner.items()},
+            )
+            self._ids = itertools.count(objects[-1].id + 1 if objects else 1)
+
+    def get(self, object_id):
+        return self._snapshot.by_id.get(object_id)
+
+    def get_owner_id(self, object_id):
+        obj = self._snapshot.by_id.get(object_id)
+        return obj.owner_id if obj else None
+
+    def list_for_user(self, user, cursor, limit, matrix=None):
+        snapshot = self._snapshot
+        scope = get_access_scope(user, self.element_name, 'read', matrix)
+        if scope == SCOPE_NONE:
+            return [], None
+        ids = snapshot.ids if scope == SCOPE_ALL else snapshot.by_owner.get(user.id, ())
+
+        start = bisect_right(ids, cursor) if cursor is not None else 0
+        page_ids = ids[start:start + limit + 1]
+        next_cursor = None
+        if len(page_ids) > limit:
+            page_ids = page_ids[:limit]
+            next_cursor = page_ids[-1]
+        return [snapshot.by_id[pk] for pk in page_ids], next_cursor
+
+    def create(self, owner_id, **fields):
+        now = timezone.now()
+        with self._write_lock:
+            obj = self.model(
+                id=next(self._ids), owner_id=owner_id, created_at=now, updated_at=now, **fields
+            )
+            snapshot = self._snapshot
+            by_owner = dict(snapshot.by_owner)
+            # ID растут монотонно, поэтому новый ID всегда добавляется в конец
+            by_owner[owner_id] = by_owner.get(owner_id, ()) + (obj.id,)
+            self._snapshot = _Snapshot(
+                {**snapshot.by_id, obj.id: obj}, snapshot.ids + (obj.id,), by_owner
+            )
+        return obj
+
+    def update(self, obj, **fields):
+        """Обновляет поля объекта, возвращает новую версию или None, если он удален"""
+        with self._write_lock:
+            snapshot = self._snapshot
+            current = snapshot.by_id.get(obj.id)
+            if current is None:
+                return None
+            updated = copy.copy(current)
+            for field, value in fields.items():
+                setattr(updated, field, value)
+            updated.updated_at = timezone.now()
+            # Владелец не меняется, индексы ID остаются прежними
+            self._snapshot = snapshot._replace(by_id={**snapshot.by_id, obj.id: updated})
+        return updated
+
+    def delete(self, object_id):
+        """Удаляет объект, возвращает True, если он существовал"""
+        with self._write_lock:
+            snapshot = self._snapshot
+            obj = snapshot.by_id.get(object_id)
+            if obj is None:
+                return False
+            by_id = dict(snapshot.by_id)
+            del by_id[object_id]
+            by_owner = dict(snapshot.by_owner)
+            owner_ids = tuple(pk for pk in by_owner[obj.owner_id] if pk != object_id)
+            if owner_ids:
+                by_owner[obj.owner_id] = owner_ids
+            else:
+                del by_owner[obj.owner_id]
+            ids = tuple(pk for pk in snapshot.ids if pk != object_id)
+            self._snapshot = _Snapshot(by_id, ids, by_owner)
+        return True
+
+    # Операции в памяти не блокируют event loop, асинхронные версии
+    # вызывают синхронные напрямую
+    async def aget(self, object_id):
+        return self.get(object_id)
+
+    async def aget_owner_id(self, object_id):
+        return self.get_owner_id(object_id)
+
+    async def alist_for_user(self, user, cursor, limit):
+        return self.list_for_user(user, cursor, limit, await aget_matrix())
+
+    async def acreate(self, owner_id, **fields):
+        return self.create(owner_id, **fields)
+
+    async def aupdate(self, obj, **fields):
+        return self.update(obj, **fields)
+
+    async def adelete(self, object_id):
+        return self.delete(object_id)
+
+
+REPOSITORY_CLASSES = {
+    'db': DatabaseRepository,
+    'memory': MemoryRepository,
+}
+
+
+def _create_repository(model, element_name):
+    return REPOSITORY_CLASSES[settings.BUSINESS_STORAGE](model, element_name)
+
+
+products = _create_repository(Product, 'products')
+orders = _create_repository(Order, 'orders')
+shops = _create_repository(Shop, 'shops')
+
+
+def load_fixture(path, repositories=(products, orders, shops)):
+    """Наполняет хранилища в памяти объектами из фикстуры dumpdata (JSON)"""
+    with open(path, encoding='utf-8') as f:
+        objects = [item.object for item in serializers.deserialize('json', f)]
+    for repository in repositories:
+        repository.load([obj for obj in objects if isinstance(obj, repository.model)])
+
+
+if settings.BUSINESS_STORAGE == 'memory' and settings.BUSINESS_MEMORY_FIXTURE:
+    load_fixture(settings.BUSINESS_MEMORY_FIXTURE)
@@ -0,0 +1,23 @@
+from rest_framework import serializers
+from business.models import Product, Order, Shop
+
+
+class ProductSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'price', 'owner_id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'owner_id', 'created_at', 'updated_at']
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Order
+        fields = ['id', 'product_id', 'quantity', 'owner_id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'owner_id', 'created_at', 'updated_at']
+
+
+class ShopSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Shop
+        fields = ['id', 'name', 'address', 'owner_id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'owner_id', 'created_at', 'updated_at']
@@ -1,3 +1,173 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
 
-# Create your tests here.
+from django.db import connection
+from django.http import QueryDict
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from auth_system.pagination import InvalidPageParams, get_page_params
+from business.models import Product, Shop
+from business.repository import DatabaseRepository, MemoryRepository, load_fixture
+from permissions.models import AccessRoleRule, BusinessElement, Role
+from users.models import User
+from users.utils import issue_jwt_token
+
+
+class MemoryRepositoryFixtureTests(SimpleTestCase):
+    """Наполнение хранилища в памяти из фикстуры dumpdata"""
+
+    def setUp(self):
+        self.products = MemoryRepository(Product, 'products')
+        self.shops = MemoryRepository(Shop, 'shops')
+        fixture = [
+            {'model': 'business.product', 'pk': 7, 'fields': {
+                'name': 'Чай', 'price': '10.00', 'owner': 2,
+                'created_at': '2026-01-01T00:00:00Z', 'updated_at': '2026-01-01T00:00:00Z',
+            }},
+            {'model': 'business.product', 'pk': 3, 'fields': {
+                'name': 'Кофе', 'price': '20.00', 'owner': 1,
+                'created_at': '2026-01-01T00:00:00Z', 'updated_at': '2026-01-01T00:00:00Z',
+            }},
+        ]
+        fd, self.path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(fixture, f)
+        self.addCleanup(os.unlink, self.path)
+
+    def test_load_fixture(self):
+        load_fixture(self.path, [self.products, self.shops])
+        self.assertEqual(self.products.get(3).name, 'Кофе')
+        self.assertEqual(self.products.get_owner_id(7), 2)
+        self.assertEqual(self.products._snapshot.ids, (3, 7))
+        self.assertEqual(self.products._snapshot.by_owner, {1: (3,), 2: (7,)})
+        self.assertIsNone(self.shops.get(3))
+        # Новые ID продолжаются после наибольшего из фикстуры
+        self.assertEqual(self.products.create(1, name='Сахар', price='5.00').id, 8)
+
+
+class DatabaseRepositoryUpdateTests(TestCase):
+    """Обновление объекта в базе не создает заново удаленный объект"""
+
+    def setUp(self):
+        self.products = DatabaseRepository(Product, 'products')
+        self.owner = User.objects.create_user(email='repo@example.com', password='password123')
+        self.product = Product.objects.create(name='Чай', price='10.00', owner=self.owner)
+
+    def test_update(self):
+        updated_at = self.product.updated_at
+        product = self.products.update(self.product, name='Кофе')
+        self.assertEqual(product.name, 'Кофе')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.name, 'Кофе')
+        self.assertGreater(self.product.updated_at, updated_at)
+
+    def test_update_deleted(self):
+        Product.objects.filter(pk=self.product.pk).delete()
+        self.assertIsNone(self.products.update(self.product, name='Кофе'))
+        self.assertFalse(Product.objects.exists())
+
+    async def test_aupdate_deleted(self):
+        await Product.objects.filter(pk=self.product.pk).adelete()
+        self.assertIsNone(await self.products.aupdate(self.product, name='Кофе'))
+        self.assertFalse(await Product.objects.aexists())
+
+
+class ProductOwnerCheckTests(TestCase):
+    """Проверка владельца загружает продукт, представление его не перечитывает"""
+
+    def setUp(self):
+        role = Role.objects.create(name='owner-check')
+        element = BusinessElement.objects.create(name='products')
+        # Матрица прав сбрасывается после фиксации транзакции
+        with self.captureOnCommitCallbacks(execute=True):
+            AccessRoleRule.objects.create(
+                role=role, element=element, read_permission=True, update_permission=True
+            )
+        self.user = User.objects.create_user(email='owner@example.com', password='password123', role=role)
+        self.product = Product.objects.create(name='Чай', price='10.00', owner=self.user)
+        self.auth = f'Bearer {issue_jwt_token(self.user)}'
+
+    def _product_selects(self, ctx):
+        return [q for q in ctx.captured_queries if q['sql'].startswith('SELECT') and '"products"' in q['sql']]
+
+    def test_get_reads_product_once(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/business/products/{self.product.id}/', HTTP_AUTHORIZATION=self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['product']['name'], 'Чай')
+        self.assertEqual(len(self._product_selects(ctx)), 1)
+
+    def test_update_reads_product_once(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.patch(
+                f'/api/business/products/{self.product.id}/update/', {'name': 'Кофе'},
+                content_type='application/json', HTTP_AUTHORIZATION=self.auth
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['product']['name'], 'Кофе')
+        self.assertEqual(len(self._product_selects(ctx)), 1)
+
+    def test_other_owner_denied(self):
+        other = User.objects.create_user(email='other@example.com', password='password123')
+        product = Product.objects.create(name='Чужой', price='1.00', owner=other)
+        response = self.client.get(f'/api/business/products/{product.id}/', HTTP_AUTHORIZATION=self.auth)
+        self.assertEqual(response.status_code, 403)
+
+
+class PageParamsTests(SimpleTestCase):
+    """Разбор параметров cursor и limit"""
+
+    @override_settings(PAGE_SIZE=50, MAX_PAGE_SIZE=500)
+    def test_defaults_and_cap(self):
+        self.assertEqual(get_page_params(QueryDict()), (None, 50))
+        self.assertEqual(get_page_params(QueryDict('cursor=10&limit=20')), (10, 20))
+        self.assertEqual(get_page_params(QueryDict('limit=100000')), (None, 500))
+
+    def test_invalid(self):
+        for query in ('cursor=abc', 'limit=x', 'limit=0', 'limit=-5'):
+            with self.subTest(query=query), self.assertRaises(InvalidPageParams):
+                get_page_params(QueryDict(query))
+
+
+class KeysetPaginationTests(TestCase):
+    """Список продуктов по страницам через next_cursor"""
+
+    def setUp(self):
+        role = Role.objects.create(name='pager')
+        element = BusinessElement.objects.create(name='products')
+        with self.captureOnCommitCallbacks(execute=True):
+            AccessRoleRule.objects.create(role=role, element=element, read_permission=True)
+        self.user = User.objects.create_user(email='pager@example.com', password='password123', role=role)
+        other = User.objects.create_user(email='stranger@example.com', password='password123')
+        for index in range(5):
+            Product.objects.create(name=f'Продукт {index}', price='1.00', owner=self.user)
+            Product.objects.create(name=f'Чужой {index}', price='1.00', owner=other)
+        self.auth = f'Bearer {issue_jwt_token(self.user)}'
+
+    def _page(self, query):
+        response = self.client.get(f'/api/business/products/?{query}', HTTP_AUTHORIZATION=self.auth)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_cover_own_products_once(self):
+        names, cursor, pages = [], None, 0
+        while True:
+            page = self._page(f'limit=2&cursor={cursor}' if cursor else 'limit=2')
+            names += [product['name'] for product in page['products']]
+            pages += 1
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(names, [f'Продукт {index}' for index in range(5)])
+        self.assertEqual(pages, 3)
+
+    def test_exact_last_page_has_no_cursor(self):
+        page = self._page('limit=5')
+        self.assertEqual(len(page['products']), 5)
+        self.assertIsNone(page['next_cursor'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/business/products/?cursor=abc', HTTP_AUTHORIZATION=self.auth)
+        self.assertEqual(response.status_code, 400)
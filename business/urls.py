@@ -1,5 +1,10 @@
+from django.conf import settings
 from django.urls import path
-from business import views
+from business import async_views, views
+
+# Под ASGI те же адреса обслуживают асинхронные представления
+if settings.ASYNC_VIEWS:
+    views = async_views
 
 urlpatterns = [
     path('products/', views.list_products, name='list_products'),
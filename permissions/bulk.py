@@ -0,0 +1,165 @@
+"""
+Массовая загрузка правил доступа (upsert по паре роль-элемент).
+
+Строки правил приходят из JSON или CSV, каждая содержит role и element
+(ID или имя) и разрешения: permission_mask или булевы поля *_permission.
+Правило задается целиком: отсутствующие разрешения считаются False.
+"""
+import csv
+import io
+
+from django.conf import settings
+from django.db import transaction
+
+from permissions.flags import PERMISSION_FIELDS, Permission, mask_to_fields
+from permissions.matrix import bump_version
+from permissions.models import Role, BusinessElement, AccessRoleRule
+
+STATUS_CREATED = 'created'
+STATUS_UPDATED = 'updated'
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f', ''}
+
+
+class BulkRulesError(Exception):
+    """Загрузка отклонена целиком: ошибки в отдельных строках"""
+
+    def __init__(self, errors):
+        super().__init__(f'Ошибок в строках: {len(errors)}')
+        self.errors = errors
+
+
+def parse_rules_csv(text):
+    """Читает правила из CSV с заголовком (role, element, permission_mask или *_permission)"""
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f'Некорректное логическое значение: {value}')
+
+
+def _resolve(value, by_id, by_name):
+    """ID объекта по ID или имени, None если не найден"""
+    if isinstance(value, int) or (isinstance(value, str) and value.strip().isdigit()):
+        object_id = int(value)
+        return object_id if object_id in by_id else None
+    if isinstance(value, str):
+        return by_name.get(value.strip())
+    return None
+
+
+def _parse_permissions(row):
+    mask = row.get('permission_mask')
+    if mask not in (None, ''):
+        try:
+            mask = int(mask)
+        except (TypeError, ValueError):
+            raise ValueError('permission_mask должен быть целым числом')
+        if not 0 <= mask <= Permission.ALL:
+            raise ValueError(f'permission_mask должен быть от 0 до {int(Permission.ALL)}')
+        return mask_to_fields(mask)
+    return {field: _parse_bool(row.get(field, False)) for field in PERMISSION_FIELDS}
+
+
+def validate_rules(rows):
+    """
+    Проверяет строки и разрешает имена ролей и элементов в ID
+    (по одному запросу на роли и элементы).
+
+    Returns:
+        list: словари полей AccessRoleRule (role_id, element_id, *_permission)
+
+    Raises:
+        BulkRulesError: если хотя бы одна строка некорректна
+    """
+    if len(rows) > settings.ACCESS_RULES_BULK_MAX:
+        raise BulkRulesError([{
+            'index': None,
+            'error': f'Не больше {settings.ACCESS_RULES_BULK_MAX} правил за раз',
+        }])
+
+    roles = dict(Role.objects.values_list('id', 'name'))
+    elements = dict(BusinessElement.objects.values_list('id', 'name'))
+    role_ids = {name: pk for pk, name in roles.items()}
+    element_ids = {name: pk for pk, name in elements.items()}
+
+    values, errors, seen = [], [], {}
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors.append({'index': index, 'error': 'Ожидается объект'})
+            continue
+
+        role_id = _resolve(row.get('role'), roles, role_ids)
+        element_id = _resolve(row.get('element'), elements, element_ids)
+        if role_id is None:
+            errors.append({'index': index, 'error': f"Роль не найдена: {row.get('role')}"})
+            continue
+        if element_id is None:
+            errors.append({'index': index, 'error': f"Элемент не найден: {row.get('element')}"})
+            continue
+        if (role_id, element_id) in seen:
+            errors.append({
+                'index': index,
+                'error': f'Повтор пары роль-элемент из строки {seen[(role_id, element_id)]}',
+            })
+            continue
+        seen[(role_id, element_id)] = index
+
+        try:
+            permissions = _parse_permissions(row)
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+            continue
+        values.append({'role_id': role_id, 'element_id': element_id, **permissions})
+
+    if errors:
+        raise BulkRulesError(errors)
+    return values
+
+
+def upsert_access_rules(rows):
+    """
+    Создает или обновляет правила доступа одной транзакцией.
+
+    Все правила записываются пачками через bulk_create(update_conflicts=True)
+    по уникальной паре (role, element), матрица прав сбрасывается один раз
+    после фиксации транзакции.
+
+    Returns:
+        list: STATUS_CREATED или STATUS_UPDATED для каждой строки
+
+    Raises:
+        BulkRulesError: если хотя бы одна строка некорректна (ничего не записано)
+    """
+    values = validate_rules(rows)
+    if not values:
+        return []
+
+    with transaction.atomic():
+        existing = set(
+            AccessRoleRule.objects
+            .filter(role_id__in={v['role_id'] for v in values}, element_id__in={v['element_id'] for v in values})
+            .values_list('role_id', 'element_id')
+        )
+        AccessRoleRule.objects.bulk_create(
+            [AccessRoleRule(**v) for v in values],
+            batch_size=settings.ACCESS_RULES_BULK_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['role', 'element'],
+            update_fields=[*PERMISSION_FIELDS, 'updated_at'],
+        )
+        # bulk_create не отправляет post_save, матрицу сбрасываем явно
+        transaction.on_commit(bump_version)
+
+    return [
+        STATUS_UPDATED if (v['role_id'], v['element_id']) in existing else STATUS_CREATED
+        for v in values
+    ]
@@ -0,0 +1,62 @@
+import enum
+
+
+class Permission(enum.IntFlag):
+    """Разрешения правила доступа в виде битовой маски"""
+    READ = 1
+    READ_ALL = 2
+    CREATE = 4
+    UPDATE = 8
+    UPDATE_ALL = 16
+    DELETE = 32
+    DELETE_ALL = 64
+
+    NONE = 0
+    ALL = READ | READ_ALL | CREATE | UPDATE | UPDATE_ALL | DELETE | DELETE_ALL
+
+
+# Соответствие булевых полей AccessRoleRule битам маски
+PERMISSION_FIELDS = {
+    'read_permission': Permission.READ,
+    'read_all_permission': Permission.READ_ALL,
+    'create_permission': Permission.CREATE,
+    'update_permission': Permission.UPDATE,
+    'update_all_permission': Permission.UPDATE_ALL,
+    'delete_permission': Permission.DELETE,
+    'delete_all_permission': Permission.DELETE_ALL,
+}
+
+# Биты, любой из которых разрешает действие (своё разрешение или всеобщее)
+ACTION_FLAGS = {
+    'read': Permission.READ | Permission.READ_ALL,
+    'read_all': Permission.READ_ALL,
+    'create': Permission.CREATE,
+    'update': Permission.UPDATE | Permission.UPDATE_ALL,
+    'update_all': Permission.UPDATE_ALL,
+    'delete': Permission.DELETE | Permission.DELETE_ALL,
+    'delete_all': Permission.DELETE_ALL,
+}
+
+# Биты всеобщего разрешения, нужные для доступа к чужим объектам
+ACTION_ALL_FLAGS = {
+    'read': Permission.READ_ALL,
+    'read_all': Permission.READ_ALL,
+    'update': Permission.UPDATE_ALL,
+    'update_all': Permission.UPDATE_ALL,
+    'delete': Permission.DELETE_ALL,
+    'delete_all': Permission.DELETE_ALL,
+}
+
+
+def fields_to_mask(values):
+    """Собирает маску из словаря булевых полей правила"""
+    mask = 0
+    for field, flag in PERMISSION_FIELDS.items():
+        if values.get(field):
+            mask |= flag
+    return int(mask)
+
+
+def mask_to_fields(mask):
+    """Раскладывает маску в словарь булевых полей правила"""
+    return {field: bool(mask & flag) for field, flag in PERMISSION_FIELDS.items()}
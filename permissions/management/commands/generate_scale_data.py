@@ -0,0 +1,307 @@
+import math
+import random
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from business.models import Product, Order, Shop
+from permissions.flags import PERMISSION_FIELDS, Permission, mask_to_fields
+from permissions.matrix import bump_version
+from permissions.models import Role, BusinessElement, AccessRoleRule
+from users.hashing import get_hasher
+from users.models import User, Session
+from users.utils import SESSION_LIFETIME, hash_session_token
+
+SCALE_EMAIL_DOMAIN = 'scale.example.com'
+SCALE_ROLE_PREFIX = 'scale_role_'
+SCALE_ELEMENT_PREFIX = 'scale_element_'
+
+FIRST_NAMES = ['Иван', 'Петр', 'Анна', 'Мария', 'Алексей', 'Ольга', 'Дмитрий', 'Елена']
+LAST_NAMES = ['Иванов', 'Петров', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов', 'Лебедев']
+MIDDLE_NAMES = ['Иванович', 'Петрович', 'Сергеевич', 'Андреевич', 'Алексеевич']
+
+
+def scale_user_email(index):
+    return f'user{index}@{SCALE_EMAIL_DOMAIN}'
+
+
+def scale_session_token(seed, user_index, session_index):
+    """
+    Идентификатор сессии из cookie для сгенерированной сессии. Он предсказуем
+    по seed и номерам, поэтому такие сессии годятся только для нагрузочных тестов.
+    """
+    return f'scale-{seed}-{user_index}-{session_index}'
+
+
+def _batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует большой набор данных для нагрузочных тестов: роли, бизнес-элементы, '
+        'плотную матрицу правил, пользователей и сессии. Результат детерминирован '
+        'значением --seed. Запускается на пустой базе и только при DEBUG=True: '
+        'пароли и cookie сессий предсказуемы'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000, help='Количество пользователей')
+        parser.add_argument('--roles', type=int, default=1000, help='Количество ролей')
+        parser.add_argument('--elements', type=int, default=500, help='Количество бизнес-элементов')
+        parser.add_argument(
+            '--rule-density', type=float, default=0.5,
+            help='Доля пар (роль, элемент), для которых создается правило'
+        )
+        parser.add_argument(
+            '--sessions-per-user', type=int, default=3,
+            help='Среднее количество сессий на пользователя'
+        )
+        parser.add_argument(
+            '--objects-per-user', type=int, default=0,
+            help='Количество продуктов, заказов и магазинов на пользователя'
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Начальное значение генератора')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Размер пачки INSERT')
+        parser.add_argument('--password', default='scale-password', help='Пароль всех пользователей')
+        parser.add_argument(
+            '--password-hashes', type=int, default=1,
+            help='Сколько разных хешей пароля посчитать заранее (параллельно) и раздать пользователям'
+        )
+
+    def handle(self, *args, **options):
+        # Всем пользователям известен пароль, а cookie сессий выводятся из --seed:
+        # такие данные не должны попасть в рабочую базу
+        if not settings.DEBUG:
+            raise CommandError(
+                'Команда создает пользователей с известным паролем и предсказуемыми cookie сессий '
+                'и запускается только при DEBUG=True, на базе для нагрузочных тестов'
+            )
+        if User.objects.filter(email__endswith=f'@{SCALE_EMAIL_DOMAIN}').exists():
+            raise CommandError(
+                'База уже содержит сгенерированные данные, запустите команду на пустой базе (manage.py flush)'
+            )
+
+        self.seed = options['seed']
+        self.batch_size = options['batch_size']
+        self.rng = random.Random(self.seed)
+        self.now = timezone.now()
+
+        self.stdout.write('Хеширование пароля...')
+        password_hashes = self.hash_passwords(options['password'], options['password_hashes'])
+
+        role_ids = self.generate_roles(options['roles'])
+        element_ids = self.generate_elements(options['elements'])
+        self.generate_rules(role_ids, element_ids, options['rule_density'])
+        user_ids = self.generate_users(options['users'], role_ids, password_hashes)
+        self.generate_sessions(user_ids, options['sessions_per_user'])
+        if options['objects_per_user']:
+            self.generate_business_objects(user_ids, options['objects_per_user'])
+
+        self.finish([Role, BusinessElement, AccessRoleRule, User, Session, Product, Order, Shop])
+        bump_version()
+
+        self.stdout.write(self.style.SUCCESS('\n✓ Данные сгенерированы'))
+        self.stdout.write(f'  Пароль пользователей {scale_user_email(0)} ...: {options["password"]}')
+        self.stdout.write(
+            f'  Cookie сессий: session_id=scale-{self.seed}-<номер пользователя>-<номер сессии>'
+        )
+
+    def hash_passwords(self, password, count):
+        # Один хеш на всех пользователей вместо миллиона вызовов bcrypt
+        hasher = get_hasher()
+        with ThreadPoolExecutor() as executor:
+            return list(executor.map(hasher.encode, [password] * max(count, 1)))
+
+    def next_ids(self, model, count):
+        """Явные ID для новых строк: на них ссылаются следующие таблицы"""
+        start = (model.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+        return range(start, start + count)
+
+    def insert_rows(self, model, field_names, rows, total):
+        """
+        Вставляет строки: COPY в PostgreSQL, пачками INSERT в остальных базах.
+
+        bulk_create не используется: он вызывает pre_save полей auto_now и
+        auto_now_add и заменил бы сгенерированные created_at и last_activity
+        сессий текущим временем. К тому же он создает экземпляр модели на
+        каждую строку, а executemany передает кортежи как есть.
+        """
+        fields = [model._meta.get_field(name) for name in field_names]
+        quote = connection.ops.quote_name
+        table = quote(model._meta.db_table)
+        columns = ', '.join(quote(field.column) for field in fields)
+        self.stdout.write(f'{model.__name__}: {total}')
+
+        done = 0
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                with transaction.atomic(), cursor.copy(f'COPY {table} ({columns}) FROM STDIN') as copy:
+                    for batch in _batched(rows, self.batch_size):
+                        for row in batch:
+                            copy.write_row(row)
+                        done += len(batch)
+                        self.stdout.write(f'  {done}/{total}')
+                return
+
+            placeholders = ', '.join(['%s'] * len(fields))
+            sql = f'INSERT INTO {table} ({columns}) VALUES ({placeholders})'
+            for batch in _batched(rows, self.batch_size):
+                with transaction.atomic():
+                    cursor.executemany(sql, [
+                        [field.get_db_prep_value(value, connection) for field, value in zip(fields, row)]
+                        for row in batch
+                    ])
+                done += len(batch)
+                self.stdout.write(f'  {done}/{total}')
+
+    def generate_roles(self, count):
+        ids = self.next_ids(Role, count)
+        self.insert_rows(
+            Role,
+            ['id', 'name', 'description', 'created_at', 'updated_at'],
+            ((pk, f'{SCALE_ROLE_PREFIX}{i}', '', self.now, self.now) for i, pk in enumerate(ids)),
+            count
+        )
+        return list(ids)
+
+    def generate_elements(self, count):
+        ids = self.next_ids(BusinessElement, count)
+        self.insert_rows(
+            BusinessElement,
+            ['id', 'name', 'description', 'created_at', 'updated_at'],
+            ((pk, f'{SCALE_ELEMENT_PREFIX}{i}', '', self.now, self.now) for i, pk in enumerate(ids)),
+            count
+        )
+        # Правила создаются и для уже существующих элементов (products, orders, ...)
+        return sorted(BusinessElement.objects.values_list('id', flat=True))
+
+    def generate_rules(self, role_ids, element_ids, density):
+        pairs = [
+            (role_id, element_id)
+            for role_id in role_ids
+            for element_id in element_ids
+            if self.rng.random() < density
+        ]
+
+        def rows():
+            for role_id, element_id in pairs:
+                mask = self.rng.randrange(1, Permission.ALL + 1)
+                yield (role_id, element_id, *mask_to_fields(mask).values(), self.now, self.now)
+
+        self.insert_rows(
+            AccessRoleRule,
+            ['role', 'element', *PERMISSION_FIELDS, 'created_at', 'updated_at'],
+            rows(),
+            len(pairs)
+        )
+
+    def generate_users(self, count, role_ids, password_hashes):
+        ids = self.next_ids(User, count)
+        rng = self.rng
+        joined_span = int(timedelta(days=3 * 365).total_seconds())
+
+        def rows():
+            for index, pk in enumerate(ids):
+                yield (
+                    pk,
+                    scale_user_email(index),
+                    rng.choice(FIRST_NAMES),
+                    rng.choice(LAST_NAMES),
+                    rng.choice(MIDDLE_NAMES),
+                    password_hashes[index % len(password_hashes)],
+                    rng.random() >= 0.01,  # 1% деактивированных аккаунтов
+                    False,
+                    False,
+                    self.now - timedelta(seconds=rng.randrange(joined_span)),
+                    self.now,
+                    rng.choice(role_ids),
+                    1,
+                )
+
+        self.insert_rows(
+            User,
+            [
+                'id', 'email', 'first_name', 'last_name', 'middle_name', 'password_hash',
+                'is_active', 'is_staff', 'is_superuser', 'date_joined', 'updated_at',
+                'role', 'token_version',
+            ],
+            rows(),
+            count
+        )
+        return ids
+
+    def generate_sessions(self, user_ids, sessions_per_user):
+        rng = self.rng
+        lifetime = SESSION_LIFETIME.total_seconds()
+        # Возраст сессии распределен экспоненциально: свежих сессий больше,
+        # и ровно половина в среднем уже истекла и ждет очистки
+        mean_age = lifetime / math.log(2)
+        counts = [rng.randint(0, 2 * sessions_per_user) for _ in user_ids]
+
+        def rows():
+            for index, (user_id, count) in enumerate(zip(user_ids, counts)):
+                for session_index in range(count):
+                    created_at = self.now - timedelta(seconds=rng.expovariate(1 / mean_age))
+                    expires_at = created_at + SESSION_LIFETIME
+                    active_until = min(self.now, expires_at)
+                    last_activity = created_at + (active_until - created_at) * rng.random()
+                    token = scale_session_token(self.seed, index, session_index)
+                    yield (user_id, hash_session_token(token), expires_at, created_at, last_activity)
+
+        self.insert_rows(
+            Session,
+            ['user', 'token_digest', 'expires_at', 'created_at', 'last_activity'],
+            rows(),
+            sum(counts)
+        )
+
+    def generate_business_objects(self, user_ids, per_user):
+        count = len(user_ids) * per_user
+        rng = self.rng
+        product_ids = self.next_ids(Product, count)
+        owners = [user_id for user_id in user_ids for _ in range(per_user)]
+
+        self.insert_rows(
+            Product,
+            ['id', 'name', 'price', 'owner', 'created_at', 'updated_at'],
+            (
+                (pk, f'Продукт {pk}', Decimal(rng.randrange(100, 10_000_000)) / 100, owner_id, self.now, self.now)
+                for pk, owner_id in zip(product_ids, owners)
+            ),
+            count
+        )
+        self.insert_rows(
+            Order,
+            ['product', 'quantity', 'owner', 'created_at', 'updated_at'],
+            (
+                (rng.choice(product_ids), rng.randint(1, 10), owner_id, self.now, self.now)
+                for owner_id in owners
+            ),
+            count
+        )
+        self.insert_rows(
+            Shop,
+            ['name', 'address', 'owner', 'created_at', 'updated_at'],
+            ((f'Магазин {i}', '', owner_id, self.now, self.now) for i, owner_id in enumerate(owners)),
+            count
+        )
+
+    def finish(self, models):
+        with connection.cursor() as cursor:
+            # Строки с явными ID не сдвигают последовательности PostgreSQL
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Role, BusinessElement, User, Product]):
+                cursor.execute(sql)
+            # Свежая статистика, чтобы планы запросов были как на реальных объемах
+            for model in models:
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
@@ -0,0 +1,60 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from permissions.bulk import STATUS_CREATED, STATUS_UPDATED, BulkRulesError, parse_rules_csv, upsert_access_rules
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает или обновляет правила доступа из JSON или CSV одной транзакцией. '
+        'Роль и элемент задаются ID или именем, разрешения - permission_mask или полями *_permission'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с правилами, "-" - стандартный ввод')
+        parser.add_argument(
+            '--format', choices=['json', 'csv'],
+            help='Формат файла (по умолчанию определяется по расширению)'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'json')
+
+        try:
+            if path == '-':
+                text = sys.stdin.read()
+            else:
+                with open(path, encoding='utf-8') as f:
+                    text = f.read()
+        except OSError as e:
+            raise CommandError(f'Не удалось прочитать {path}: {e}')
+
+        if file_format == 'csv':
+            rows = parse_rules_csv(text)
+        else:
+            try:
+                data = json.loads(text)
+            except ValueError as e:
+                raise CommandError(f'Некорректный JSON: {e}')
+            # Список правил или объект {"rules": [...]}, как в API
+            rows = data.get('rules') if isinstance(data, dict) else data
+            if not isinstance(rows, list):
+                raise CommandError('Ожидается список правил')
+
+        try:
+            results = upsert_access_rules(rows)
+        except BulkRulesError as e:
+            for error in e.errors:
+                if error['index'] is None:
+                    self.stderr.write(f"  {error['error']}")
+                else:
+                    self.stderr.write(f"  строка {error['index']}: {error['error']}")
+            raise CommandError(f'{e}, ни одно правило не загружено')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Загружено правил: {len(results)} '
+            f'(создано: {results.count(STATUS_CREATED)}, обновлено: {results.count(STATUS_UPDATED)})'
+        ))
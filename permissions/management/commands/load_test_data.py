@@ -1,10 +1,12 @@
 from django.core.management.base import BaseCommand
 from permissions.models import Role, BusinessElement, AccessRoleRule
+from permissions.flags import Permission, mask_to_fields
 from users.models import User
+from business.models import Product, Order, Shop
 
 
 class Command(BaseCommand):
-    help = 'Загружает тестовые данные: роли, бизнес-элементы, правила доступа и пользователей'
+    help = 'Загружает тестовые данные: роли, бизнес-элементы, правила доступа, пользователей и бизнес-объекты'
 
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Начинаю загрузку тестовых данных...'))
@@ -77,90 +79,54 @@ class Command(BaseCommand):
             rule, created = AccessRoleRule.objects.get_or_create(
                 role=admin_role,
                 element=element,
-                defaults={
-                    'read_permission': True,
-                    'read_all_permission': True,
-                    'create_permission': True,
-                    'update_permission': True,
-                    'update_all_permission': True,
-                    'delete_permission': True,
-                    'delete_all_permission': True,
-                }
+                defaults=mask_to_fields(Permission.ALL)
             )
             if created:
                 self.stdout.write(self.style.SUCCESS(f'  ✓ Создано правило: {admin_role.name} -> {element.name}'))
 
         # Менеджер - расширенные права
         manager_rules = {
-            'products': {
-                'read_all_permission': True,
-                'create_permission': True,
-                'update_all_permission': True,
-                'delete_all_permission': True,
-            },
-            'orders': {
-                'read_all_permission': True,
-                'create_permission': True,
-                'update_all_permission': True,
-            },
-            'shops': {
-                'read_all_permission': True,
-                'create_permission': True,
-                'update_permission': True,
-            },
+            'products': Permission.READ_ALL | Permission.CREATE | Permission.UPDATE_ALL | Permission.DELETE_ALL,
+            'orders': Permission.READ_ALL | Permission.CREATE | Permission.UPDATE_ALL,
+            'shops': Permission.READ_ALL | Permission.CREATE | Permission.UPDATE,
         }
 
-        for element_name, permissions in manager_rules.items():
+        for element_name, mask in manager_rules.items():
             rule, created = AccessRoleRule.objects.get_or_create(
                 role=manager_role,
                 element=elements[element_name],
-                defaults=permissions
+                defaults=mask_to_fields(mask)
             )
             if created:
                 self.stdout.write(self.style.SUCCESS(f'  ✓ Создано правило: {manager_role.name} -> {element_name}'))
 
         # Обычный пользователь - базовые права (только свои объекты)
         user_rules = {
-            'products': {
-                'read_permission': True,
-                'create_permission': True,
-                'update_permission': True,
-                'delete_permission': True,
-            },
-            'orders': {
-                'read_permission': True,
-                'create_permission': True,
-                'update_permission': True,
-            },
-            'shops': {
-                'read_permission': True,
-            },
+            'products': Permission.READ | Permission.CREATE | Permission.UPDATE | Permission.DELETE,
+            'orders': Permission.READ | Permission.CREATE | Permission.UPDATE,
+            'shops': Permission.READ,
         }
 
-        for element_name, permissions in user_rules.items():
+        for element_name, mask in user_rules.items():
             rule, created = AccessRoleRule.objects.get_or_create(
                 role=user_role,
                 element=elements[element_name],
-                defaults=permissions
+                defaults=mask_to_fields(mask)
             )
             if created:
                 self.stdout.write(self.style.SUCCESS(f'  ✓ Создано правило: {user_role.name} -> {element_name}'))
 
         # Гость - только чтение
         guest_rules = {
-            'products': {
-                'read_all_permission': True,
-            },
-            'shops': {
-                'read_all_permission': True,
-            },
+            'products': Permission.READ_ALL,
+            'shops': Permission.READ_ALL,
         }
 
-        for element_name, permissions in guest_rules.items():
+        for element_name, mask in guest_rules.items():
             rule, created = AccessRoleRule.objects.get_or_create(
                 role=guest_role,
                 element=elements[element_name],
-                defaults=permissions
+                defaults=mask_to_fields(mask)
             )
             if created:
                 self.stdout.write(self.style.SUCCESS(f'  ✓ Создано правило: {guest_role.name} -> {element_name}'))
@@ -225,6 +191,52 @@ class Command(BaseCommand):
                 user.save()
                 self.stdout.write(f'  - Пользователь уже существует: {user.email} (обновлен)')
 
+        # Создание тестовых бизнес-объектов
+        self.stdout.write('Создание бизнес-объектов...')
+        manager = User.objects.get(email='manager@example.com')
+        user = User.objects.get(email='user@example.com')
+
+        products_data = [
+            {'name': 'Ноутбук', 'price': '75000.00', 'owner': manager},
+            {'name': 'Мышь', 'price': '1500.00', 'owner': user},
+            {'name': 'Клавиатура', 'price': '3500.00', 'owner': user},
+        ]
+
+        products = {}
+        for product_data in products_data:
+            product, created = Product.objects.get_or_create(
+                name=product_data['name'],
+                owner=product_data['owner'],
+                defaults={'price': product_data['price']}
+            )
+            products[product.name] = product
+            if created:
+                self.stdout.write(self.style.SUCCESS(f'  ✓ Создан продукт: {product.name}'))
+
+        orders_data = [
+            {'product': products['Ноутбук'], 'quantity': 1, 'owner': user},
+            {'product': products['Мышь'], 'quantity': 2, 'owner': manager},
+        ]
+
+        for order_data in orders_data:
+            order, created = Order.objects.get_or_create(**order_data)
+            if created:
+                self.stdout.write(self.style.SUCCESS(f'  ✓ Создан заказ: {order.product.name} x {order.quantity}'))
+
+        shops_data = [
+            {'name': 'Магазин на Ленина', 'address': 'ул. Ленина, 1', 'owner': manager},
+            {'name': 'Магазин на Мира', 'address': 'пр. Мира, 10', 'owner': user},
+        ]
+
+        for shop_data in shops_data:
+            shop, created = Shop.objects.get_or_create(
+                name=shop_data['name'],
+                owner=shop_data['owner'],
+                defaults={'address': shop_data['address']}
+            )
+            if created:
+                self.stdout.write(self.style.SUCCESS(f'  ✓ Создан магазин: {shop.name}'))
+
         self.stdout.write(self.style.SUCCESS('\n✓ Тестовые данные успешно загружены!'))
         self.stdout.write(self.style.SUCCESS('\nТестовые пользователи:'))
         self.stdout.write('  - admin@example.com / admin123 (Администратор)')
@@ -0,0 +1,125 @@
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from auth_system.instrumentation import budget_exempt
+from auth_system.metrics import permission_matrix_lookups
+from permissions.flags import PERMISSION_FIELDS, fields_to_mask
+from permissions.models import Role, BusinessElement, AccessRoleRule
+
+VERSION_CACHE_KEY = 'permissions:matrix_version'
+
+_lock = threading.Lock()
+_matrix = None
+
+matrix_hits = permission_matrix_lookups.labels(result='hit')
+matrix_misses = permission_matrix_lookups.labels(result='miss')
+
+
+class PermissionMatrix:
+    """
+    Скомпилированная матрица прав: (role_id, element_name) -> маска Permission.
+    Строится один раз на процесс и пересобирается при смене версии.
+    Версия в кэше сверяется не чаще раза в PERMISSION_MATRIX_CHECK_INTERVAL_MS.
+    """
+
+    def __init__(self, version, roles, elements, rules):
+        self.version = version
+        self.roles = roles
+        self.elements = elements
+        self.rules = rules
+        self.checked_at = time.monotonic()
+
+    def is_fresh(self):
+        """Версия сверялась недавно, обращаться к кэшу не нужно"""
+        return time.monotonic() - self.checked_at < settings.PERMISSION_MATRIX_CHECK_INTERVAL_MS / 1000
+
+    def confirm(self, version):
+        """Сверяет версию матрицы с версией из кэша и запоминает время проверки"""
+        if self.version != version:
+            return False
+        self.checked_at = time.monotonic()
+        return True
+
+    def get_role_name(self, role_id):
+        return self.roles.get(role_id)
+
+    def has_element(self, element_name):
+        return element_name in self.elements
+
+    def get_rule(self, role_id, element_name):
+        """Возвращает маску разрешений или None, если правила нет"""
+        return self.rules.get((role_id, element_name))
+
+
+def get_version():
+    """Возвращает текущую версию правил доступа"""
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_CACHE_KEY)
+    return version
+
+
+def bump_version():
+    """Помечает все скомпилированные матрицы как устаревшие"""
+    global _matrix
+    cache.set(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+    with _lock:
+        _matrix = None
+
+
+def build_matrix(version):
+    """Загружает все роли, элементы и правила доступа"""
+    # Только из основной базы: матрица, собранная с отстающей реплики,
+    # закэшировалась бы под новой версией до следующего изменения правил
+    roles = dict(Role.objects.using(DEFAULT_DB_ALIAS).values_list('id', 'name'))
+    elements = frozenset(BusinessElement.objects.using(DEFAULT_DB_ALIAS).values_list('name', flat=True))
+    rules = {}
+    rows = AccessRoleRule.objects.using(DEFAULT_DB_ALIAS).values('role_id', 'element__name', *PERMISSION_FIELDS)
+    for row in rows:
+        rules[(row['role_id'], row['element__name'])] = fields_to_mask(row)
+    return PermissionMatrix(version, roles, elements, rules)
+
+
+def get_matrix():
+    """Возвращает актуальную матрицу прав, пересобирая её при смене версии"""
+    global _matrix
+    matrix = _matrix
+    if matrix is not None and matrix.is_fresh():
+        matrix_hits.inc()
+        return matrix
+
+    version = get_version()
+    if matrix is not None and matrix.confirm(version):
+        matrix_hits.inc()
+        return matrix
+
+    with _lock:
+        if _matrix is None or _matrix.version != version:
+            matrix_misses.inc()
+            # Пересборка бывает раз на процесс после изменения правил, в бюджет запроса не входит
+            with budget_exempt():
+                _matrix = build_matrix(version)
+        else:
+            # Матрицу уже пересобрал другой поток
+            matrix_hits.inc()
+        return _matrix
+
+
+async def aget_matrix():
+    """
+    Асинхронный get_matrix(). Актуальная матрица возвращается сразу,
+    пересборка с запросами к базе выполняется в потоке.
+    """
+    matrix = _matrix
+    # Версия читается синхронно: это быстрый запрос к кэшу без ORM
+    if matrix is not None and (matrix.is_fresh() or matrix.confirm(cache.get(VERSION_CACHE_KEY))):
+        matrix_hits.inc()
+        return matrix
+    return await sync_to_async(get_matrix)()
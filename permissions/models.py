@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from permissions.flags import PERMISSION_FIELDS, fields_to_mask, mask_to_fields
+
 User = get_user_model()
 
 
@@ -70,5 +72,15 @@ class AccessRoleRule(models.Model):
             models.Index(fields=['role', 'element']),
         ]
     
+    @property
+    def permission_mask(self):
+        """Разрешения правила в виде битовой маски Permission"""
+        return fields_to_mask({field: getattr(self, field) for field in PERMISSION_FIELDS})
+    
+    @permission_mask.setter
+    def permission_mask(self, mask):
+        for field, value in mask_to_fields(mask).items():
+            setattr(self, field, value)
+    
     def __str__(self):
         return f"{self.role.name} -> {self.element.name}"
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from permissions.models import Role, BusinessElement, AccessRoleRule
+from permissions.flags import ACTION_FLAGS, Permission, mask_to_fields
 
 
 class RoleSerializer(serializers.ModelSerializer):
@@ -19,6 +20,7 @@ class BusinessElementSerializer(serializers.ModelSerializer):
 class AccessRoleRuleSerializer(serializers.ModelSerializer):
     role_name = serializers.CharField(source='role.name', read_only=True)
     element_name = serializers.CharField(source='element.name', read_only=True)
+    permission_mask = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = AccessRoleRule
@@ -28,12 +30,17 @@ class AccessRoleRuleSerializer(serializers.ModelSerializer):
             'create_permission',
             'update_permission', 'update_all_permission',
             'delete_permission', 'delete_all_permission',
+            'permission_mask',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['created_at', 'updated_at']
 
 
 class AccessRoleRuleCreateSerializer(serializers.ModelSerializer):
+    permission_mask = serializers.IntegerField(
+        required=False, write_only=True, min_value=0, max_value=int(Permission.ALL)
+    )
+    
     class Meta:
         model = AccessRoleRule
         fields = [
@@ -42,5 +49,22 @@ class AccessRoleRuleCreateSerializer(serializers.ModelSerializer):
             'create_permission',
             'update_permission', 'update_all_permission',
             'delete_permission', 'delete_all_permission',
+            'permission_mask',
         ]
+    
+    def validate(self, attrs):
+        # Маска, если передана, задает все булевы поля разом
+        mask = attrs.pop('permission_mask', None)
+        if mask is not None:
+            attrs.update(mask_to_fields(mask))
+        return attrs
+
+
+class PermissionCheckItemSerializer(serializers.Serializer):
+    element = serializers.CharField(max_length=100)
+    action = serializers.ChoiceField(choices=list(ACTION_FLAGS))
+    owner_id = serializers.IntegerField(required=False, allow_null=True)
+
 
+class PermissionCheckSerializer(serializers.Serializer):
+    checks = PermissionCheckItemSerializer(many=True, allow_empty=False, max_length=100)
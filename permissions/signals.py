@@ -0,0 +1,17 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from permissions.models import Role, BusinessElement, AccessRoleRule
+from permissions.matrix import bump_version
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+@receiver(post_save, sender=BusinessElement)
+@receiver(post_delete, sender=BusinessElement)
+@receiver(post_save, sender=AccessRoleRule)
+@receiver(post_delete, sender=AccessRoleRule)
+def invalidate_permission_matrix(sender, **kwargs):
+    """Сбрасывает матрицу прав после фиксации изменений ролей, элементов и правил"""
+    transaction.on_commit(bump_version)
@@ -1,3 +1,234 @@
-from django.test import TestCase
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework.generics import GenericAPIView
+
+from business.models import Product
+from permissions.bulk import STATUS_CREATED, STATUS_UPDATED, BulkRulesError, parse_rules_csv, upsert_access_rules
+from permissions.flags import PERMISSION_FIELDS, Permission, fields_to_mask, mask_to_fields
+from permissions.management.commands.generate_scale_data import scale_session_token
+from permissions.matrix import VERSION_CACHE_KEY, PermissionMatrix, get_matrix
+from permissions.models import AccessRoleRule, BusinessElement, Role
+from permissions.utils import ScopedQuerysetMixin, evaluate_permissions, has_permission, with_scoped_queryset
+from users.models import Session, User
+from users.utils import hash_session_token
+
+
+class PermissionMaskTests(SimpleTestCase):
+    """Булевы поля правила и битовая маска переводятся друг в друга без потерь"""
+
+    def test_every_mask_round_trips(self):
+        for mask in range(int(Permission.ALL) + 1):
+            with self.subTest(mask=mask):
+                self.assertEqual(fields_to_mask(mask_to_fields(mask)), mask)
+
+                rule = AccessRoleRule()
+                rule.permission_mask = mask
+                self.assertEqual(rule.permission_mask, mask)
+                for field, flag in PERMISSION_FIELDS.items():
+                    self.assertEqual(getattr(rule, field), bool(mask & flag))
+
+    def test_single_field_sets_single_bit(self):
+        rule = AccessRoleRule(update_all_permission=True)
+        self.assertEqual(rule.permission_mask, Permission.UPDATE_ALL)
+
+
+class EvaluatePermissionsTests(SimpleTestCase):
+    """Пакетная проверка тройек совпадает с has_permission"""
+
+    def test_matches_has_permission(self):
+        matrix = PermissionMatrix(
+            'test',
+            roles={1: 'manager', 2: 'viewer', 3: 'empty'},
+            elements=frozenset({'products', 'orders'}),
+            rules={
+                (1, 'products'): int(Permission.READ | Permission.READ_ALL | Permission.UPDATE),
+                (1, 'orders'): int(Permission.CREATE),
+                (2, 'products'): int(Permission.READ),
+                (3, 'products'): int(Permission.NONE),
+            },
+        )
+        triples = [
+            (role_id, element_name, action)
+            for role_id in (1, 2, 3, 4)
+            for element_name in ('products', 'orders', 'missing')
+            for action in ('read', 'read_all', 'create', 'update', 'delete_all', 'unknown')
+        ]
+        expected = [
+            has_permission(User(role_id=role_id), element_name, action, matrix)
+            for role_id, element_name, action in triples
+        ]
+        self.assertIn(True, expected)
+        self.assertIn(False, expected)
+        self.assertEqual(evaluate_permissions(triples, matrix), expected)
+
+
+class MatrixInvalidationTests(TestCase):
+    """Изменение правил пересобирает матрицу прав"""
+
+    def setUp(self):
+        self.role = Role.objects.create(name='matrix-role')
+        self.element = BusinessElement.objects.create(name='matrix-element')
+
+    def test_rule_change_rebuilds_matrix(self):
+        self.assertIsNone(get_matrix().get_rule(self.role.id, 'matrix-element'))
+        # Матрица сбрасывается после фиксации транзакции
+        with self.captureOnCommitCallbacks(execute=True):
+            rule = AccessRoleRule.objects.create(role=self.role, element=self.element, read_permission=True)
+        self.assertEqual(get_matrix().get_rule(self.role.id, 'matrix-element'), Permission.READ)
+        with self.captureOnCommitCallbacks(execute=True):
+            rule.delete()
+        self.assertIsNone(get_matrix().get_rule(self.role.id, 'matrix-element'))
+
+    @override_settings(PERMISSION_MATRIX_CHECK_INTERVAL_MS=60000)
+    def test_version_checked_once_per_interval(self):
+        matrix = get_matrix()
+        with mock.patch('permissions.matrix.cache') as cache:
+            self.assertIs(get_matrix(), matrix)
+            cache.get.assert_not_called()
+
+    def test_other_process_change_seen_after_interval(self):
+        matrix = get_matrix()
+        # Другой процесс изменил правила: в кэше новая версия, локальная матрица не сброшена
+        cache.set(VERSION_CACHE_KEY, 'other-process', None)
+        with override_settings(PERMISSION_MATRIX_CHECK_INTERVAL_MS=60000):
+            self.assertIs(get_matrix(), matrix)
+        with override_settings(PERMISSION_MATRIX_CHECK_INTERVAL_MS=0), self.assertNumQueries(3):
+            self.assertEqual(get_matrix().version, 'other-process')
+
+
+class ScopedProductsView(ScopedQuerysetMixin, GenericAPIView):
+    queryset = Product.objects.all()
+    permission_element = 'products'
+
+
+class ScopedQuerysetTests(TestCase):
+    """Декоратор и mixin ограничивают список объектами, доступными пользователю"""
+
+    def setUp(self):
+        role = Role.objects.create(name='scoped')
+        element = BusinessElement.objects.create(name='products')
+        with self.captureOnCommitCallbacks(execute=True):
+            AccessRoleRule.objects.create(role=role, element=element, read_permission=True)
+        self.user = User.objects.create_user(email='scoped@example.com', password='password123', role=role)
+        other = User.objects.create_user(email='scoped-other@example.com', password='password123')
+        self.own = Product.objects.create(name='Свой', price='1.00', owner=self.user)
+        Product.objects.create(name='Чужой', price='1.00', owner=other)
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+
+    def test_decorator(self):
+        @with_scoped_queryset('products', 'read', Product.objects.all())
+        def view(request, queryset):
+            return list(queryset)
+
+        self.assertEqual(view(self.request), [self.own])
+
+    def test_decorator_without_action_permission(self):
+        @with_scoped_queryset('products', 'delete', Product.objects.all())
+        def view(request, queryset):
+            return list(queryset)
+
+        self.assertEqual(view(self.request), [])
+
+    async def test_async_decorator(self):
+        @with_scoped_queryset('products', 'read', Product.objects.all())
+        async def view(request, queryset):
+            return [obj async for obj in queryset]
+
+        self.assertEqual(await view(self.request), [self.own])
+
+    def test_mixin(self):
+        view = ScopedProductsView()
+        view.request = self.request
+        self.assertEqual(list(view.get_queryset()), [self.own])
+
+        self.user.is_superuser = True
+        self.assertEqual(view.get_queryset().count(), 2)
+
+
+class GenerateScaleDataTests(TestCase):
+    """Генерация данных для нагрузочных тестов"""
+
+    def test_refuses_without_debug(self):
+        with self.assertRaises(CommandError):
+            call_command('generate_scale_data', users=1, stdout=StringIO())
+        self.assertFalse(User.objects.exists())
+
+    @override_settings(DEBUG=True, PASSWORD_HASHER='fast')
+    def test_session_cookie_resolves_to_user(self):
+        call_command(
+            'generate_scale_data', users=5, roles=2, elements=2, sessions_per_user=2,
+            objects_per_user=1, seed=7, stdout=StringIO()
+        )
+        self.assertEqual(User.objects.filter(email__endswith='@scale.example.com').count(), 5)
+        session = Session.objects.order_by('id').first()
+        user_index = User.objects.filter(id__lt=session.user_id).count()
+        for session_index in range(4):
+            token = scale_session_token(7, user_index, session_index)
+            if hash_session_token(token) == bytes(session.token_digest):
+                break
+        else:
+            self.fail('cookie сессии не восстанавливается по seed')
+
+
+class BulkUpsertTests(TestCase):
+    """Массовое создание и обновление правил доступа"""
+
+    def setUp(self):
+        self.role = Role.objects.create(name='bulk-role')
+        self.products = BusinessElement.objects.create(name='bulk-products')
+        self.orders = BusinessElement.objects.create(name='bulk-orders')
+
+    def test_creates_then_updates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            results = upsert_access_rules([
+                {'role': 'bulk-role', 'element': 'bulk-products', 'read_permission': True},
+                {'role': self.role.id, 'element': str(self.orders.id), 'permission_mask': int(Permission.ALL)},
+            ])
+        self.assertEqual(results, [STATUS_CREATED, STATUS_CREATED])
+        self.assertEqual(get_matrix().get_rule(self.role.id, 'bulk-products'), Permission.READ)
+
+        # Правило задается целиком: read_permission сбрасывается
+        with self.captureOnCommitCallbacks(execute=True):
+            results = upsert_access_rules([
+                {'role': 'bulk-role', 'element': 'bulk-products', 'update_permission': 'yes'},
+            ])
+        self.assertEqual(results, [STATUS_UPDATED])
+        self.assertEqual(AccessRoleRule.objects.count(), 2)
+        rule = AccessRoleRule.objects.get(role=self.role, element=self.products)
+        self.assertEqual(rule.permission_mask, Permission.UPDATE)
+        self.assertEqual(get_matrix().get_rule(self.role.id, 'bulk-products'), Permission.UPDATE)
+
+    def test_invalid_row_rejects_batch(self):
+        with self.assertRaises(BulkRulesError) as ctx:
+            upsert_access_rules([
+                {'role': 'bulk-role', 'element': 'bulk-products', 'read_permission': True},
+                {'role': 'missing', 'element': 'bulk-orders'},
+                {'role': 'bulk-role', 'element': 'bulk-products'},
+                {'role': 'bulk-role', 'element': 'bulk-orders', 'permission_mask': 1000},
+                {'role': 'bulk-role', 'element': 'bulk-orders', 'read_permission': 'maybe'},
+            ])
+        self.assertEqual([error['index'] for error in ctx.exception.errors], [1, 2, 3, 4])
+        self.assertFalse(AccessRoleRule.objects.exists())
+
+    @override_settings(ACCESS_RULES_BULK_MAX=1)
+    def test_batch_size_limit(self):
+        with self.assertRaises(BulkRulesError):
+            upsert_access_rules([
+                {'role': 'bulk-role', 'element': 'bulk-products'},
+                {'role': 'bulk-role', 'element': 'bulk-orders'},
+            ])
+
+    def test_csv_rows(self):
+        rows = parse_rules_csv(
+            'role,element,read_permission,create_permission\n'
+            'bulk-role,bulk-orders,1,true\n'
+        )
+        self.assertEqual(upsert_access_rules(rows), [STATUS_CREATED])
+        rule = AccessRoleRule.objects.get(role=self.role, element=self.orders)
+        self.assertEqual(rule.permission_mask, Permission.READ | Permission.CREATE)
@@ -1,12 +1,67 @@
 from functools import wraps
+from inspect import isawaitable
+from asgiref.sync import iscoroutinefunction
+from django.http import JsonResponse
 from rest_framework.response import Response
 from rest_framework import status
-from permissions.models import BusinessElement, AccessRoleRule
+from auth_system.instrumentation import phase
+from auth_system.metrics import permission_checks
+from permissions.flags import ACTION_FLAGS, ACTION_ALL_FLAGS
+from permissions.matrix import get_matrix, aget_matrix
+
+
+AUTHENTICATION_REQUIRED = ('Необходима аутентификация', status.HTTP_401_UNAUTHORIZED)
+ACCESS_DENIED = ('Доступ запрещен', status.HTTP_403_FORBIDDEN)
+NOT_OWNER = ('Доступ запрещен. Вы не являетесь владельцем объекта', status.HTTP_403_FORBIDDEN)
+
+
+def check_rule(user, element_name, action, matrix):
+    """
+    Проверяет право роли пользователя на действие по матрице прав.
+    
+    Returns:
+        tuple: (отказ, маска правила). Отказ - кортеж (сообщение, статус) или None.
+        Для суперпользователя маска None, владельца проверять не нужно.
+    """
+    if not user or not hasattr(user, 'id'):
+        return AUTHENTICATION_REQUIRED, None
+    
+    # Если пользователь - суперпользователь, пропускаем проверку
+    if hasattr(user, 'is_superuser') and user.is_superuser:
+        return None, None
+    
+    # Проверяем роль пользователя
+    if not user.role_id:
+        return ('У пользователя нет роли', status.HTTP_403_FORBIDDEN), None
+    
+    # Проверяем наличие бизнес-элемента
+    if not matrix.has_element(element_name):
+        return (f'Бизнес-элемент "{element_name}" не найден', status.HTTP_404_NOT_FOUND), None
+    
+    # Получаем правило доступа для роли и элемента
+    rule = matrix.get_rule(user.role_id, element_name)
+    if rule is None:
+        return ACCESS_DENIED, None
+    
+    # Проверяем разрешение на действие
+    if not rule & ACTION_FLAGS.get(action, 0):
+        return ACCESS_DENIED, None
+    
+    return None, rule
+
+
+def check_owner_rule(user, action, rule, owner_id):
+    """Чужой объект доступен только с разрешением на все объекты (*_all)"""
+    if owner_id and owner_id != user.id and not rule & ACTION_ALL_FLAGS.get(action, 0):
+        return NOT_OWNER
+    return None
 
 
 def check_permission(element_name, action, check_owner=False, owner_getter=None):
     """
     Декоратор для проверки прав доступа к ресурсу.
+    Подходит и для асинхронных представлений: пользователь определяется
+    через request.auser(), ответ об отказе - JsonResponse.
     
     Args:
         element_name: имя бизнес-элемента (например, 'users', 'products')
@@ -14,85 +69,59 @@ def check_permission(element_name, action, check_owner=False, owner_getter=None)
         check_owner: нужно ли проверять, является ли пользователь владельцем объекта
         owner_getter: функция для получения владельца объекта (принимает request, возвращает owner_id)
     """
+    checks_allowed = permission_checks.labels(element_name, action, 'allow')
+    checks_denied = permission_checks.labels(element_name, action, 'deny')
+    
     def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapped_view(request, *args, **kwargs):
+                auser = getattr(request, 'auser', None)
+                user = await auser() if auser else request.user
+                # Дальше представление работает с уже определенным пользователем
+                request.user = user
+                
+                with phase('authz'):
+                    denial, rule = check_rule(user, element_name, action, await aget_matrix())
+                    if denial is None and rule is not None and check_owner and owner_getter:
+                        owner_id = owner_getter(request, *args, **kwargs)
+                        if isawaitable(owner_id):
+                            owner_id = await owner_id
+                        denial = check_owner_rule(user, action, rule, owner_id)
+                if denial is not None:
+                    checks_denied.inc()
+                    message, status_code = denial
+                    return JsonResponse({'error': message}, status=status_code, json_dumps_params={'ensure_ascii': False})
+                checks_allowed.inc()
+                return await view_func(request, *args, **kwargs)
+            
+            return async_wrapped_view
+        
         @wraps(view_func)
         def wrapped_view(request, *args, **kwargs):
-            # Проверка аутентификации
-            if not request.user or not hasattr(request.user, 'id'):
-                return Response(
-                    {'error': 'Необходима аутентификация'},
-                    status=status.HTTP_401_UNAUTHORIZED
-                )
-            
             user = request.user
-            
-            # Если пользователь - суперпользователь, пропускаем проверку
-            if hasattr(user, 'is_superuser') and user.is_superuser:
-                return view_func(request, *args, **kwargs)
-            
-            # Проверяем роль пользователя
-            if not user.role:
-                return Response(
-                    {'error': 'У пользователя нет роли'},
-                    status=status.HTTP_403_FORBIDDEN
-                )
-            
-            # Получаем бизнес-элемент
-            try:
-                element = BusinessElement.objects.get(name=element_name)
-            except BusinessElement.DoesNotExist:
-                return Response(
-                    {'error': f'Бизнес-элемент "{element_name}" не найден'},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-            
-            # Получаем правило доступа для роли и элемента
-            try:
-                rule = AccessRoleRule.objects.get(role=user.role, element=element)
-            except AccessRoleRule.DoesNotExist:
-                return Response(
-                    {'error': 'Доступ запрещен'},
-                    status=status.HTTP_403_FORBIDDEN
-                )
-            
-            # Проверяем разрешение на действие
-            permission_attr = f'{action}_permission'
-            has_permission = getattr(rule, permission_attr, False)
-            
-            if not has_permission:
-                # Если нет прямого разрешения, проверяем всеобщее разрешение для некоторых действий
-                if action in ['read', 'update', 'delete']:
-                    all_permission_attr = f'{action}_all_permission'
-                    has_all_permission = getattr(rule, all_permission_attr, False)
-                    if has_all_permission:
-                        has_permission = True
+            # Ленивый request.user определяется до замера authz, в своей фазе auth
+            bool(user)
+            with phase('authz'):
+                denial, rule = check_rule(user, element_name, action, get_matrix())
                 
-                if not has_permission:
-                    return Response(
-                        {'error': 'Доступ запрещен'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-            
-            # Если нужно проверить владельца
-            if check_owner and owner_getter:
-                owner_id = owner_getter(request, *args, **kwargs)
-                if owner_id and owner_id != user.id:
-                    # Проверяем, есть ли разрешение на все объекты
-                    all_permission_attr = f'{action}_all_permission'
-                    has_all_permission = getattr(rule, all_permission_attr, False)
-                    if not has_all_permission:
-                        return Response(
-                            {'error': 'Доступ запрещен. Вы не являетесь владельцем объекта'},
-                            status=status.HTTP_403_FORBIDDEN
-                        )
+                # Если нужно проверить владельца
+                if denial is None and rule is not None and check_owner and owner_getter:
+                    owner_id = owner_getter(request, *args, **kwargs)
+                    denial = check_owner_rule(user, action, rule, owner_id)
             
+            if denial is not None:
+                checks_denied.inc()
+                message, status_code = denial
+                return Response({'error': message}, status=status_code)
+            checks_allowed.inc()
             return view_func(request, *args, **kwargs)
         
         return wrapped_view
     return decorator
 
 
-def has_permission(user, element_name, action):
+def has_permission(user, element_name, action, matrix=None):
     """
     Проверяет, есть ли у пользователя право на действие с элементом.
     Используется в коде для дополнительных проверок.
@@ -101,6 +130,7 @@ def has_permission(user, element_name, action):
         user: объект пользователя
         element_name: имя бизнес-элемента
         action: действие
+        matrix: матрица прав (в асинхронном коде - полученная через aget_matrix)
         
     Returns:
         bool: True если есть право, False если нет
@@ -108,21 +138,163 @@ def has_permission(user, element_name, action):
     if hasattr(user, 'is_superuser') and user.is_superuser:
         return True
     
-    if not user.role:
+    if not user.role_id:
         return False
     
-    try:
-        element = BusinessElement.objects.get(name=element_name)
-        rule = AccessRoleRule.objects.get(role=user.role, element=element)
-        permission_attr = f'{action}_permission'
-        has_perm = getattr(rule, permission_attr, False)
+    rule = (matrix or get_matrix()).get_rule(user.role_id, element_name)
+    if rule is None:
+        return False
+    return bool(rule & ACTION_FLAGS.get(action, 0))
+
+
+def check_permissions(user, checks, matrix=None):
+    """
+    Проверяет набор прав пользователя по одной загрузке матрицы прав.
+    
+    Args:
+        user: объект пользователя
+        checks: итерируемый набор кортежей (element_name, action, owner_id),
+            owner_id может быть None
+        matrix: матрица прав (по умолчанию - текущая)
         
-        # Проверяем всеобщее разрешение для некоторых действий
-        if not has_perm and action in ['read', 'update', 'delete']:
-            all_permission_attr = f'{action}_all_permission'
-            has_perm = getattr(rule, all_permission_attr, False)
+    Returns:
+        list[tuple]: (разрешено, причина отказа или None) в порядке входных кортежей
+    """
+    matrix = matrix or get_matrix()
+    results = []
+    for element_name, action, owner_id in checks:
+        denial, rule = check_rule(user, element_name, action, matrix)
+        if denial is None and rule is not None and owner_id is not None:
+            denial = check_owner_rule(user, action, rule, owner_id)
+        results.append((denial is None, denial[0] if denial else None))
+    return results
+
+
+
+def evaluate_permissions(triples, matrix=None):
+    """
+    Проверяет набор прав за один проход по скомпилированной матрице.
+    Предназначено для пакетной оценки политик, суперпользователи не учитываются.
+    
+    Args:
+        triples: итерируемый набор кортежей (role_id, element_name, action)
+        matrix: матрица прав (по умолчанию - текущая)
         
-        return has_perm
-    except (BusinessElement.DoesNotExist, AccessRoleRule.DoesNotExist):
-        return False
+    Returns:
+        list[bool]: решения в порядке входных кортежей
+    """
+    # Операции над IntFlag заметно медленнее, чем над обычными int
+    action_flags = {action: int(flags) for action, flags in ACTION_FLAGS.items()}
+    get_rule = (matrix or get_matrix()).rules.get
+    get_flags = action_flags.get
+    return [
+        bool(get_rule((role_id, element_name), 0) & get_flags(action, 0))
+        for role_id, element_name, action in triples
+    ]
+
+# Область доступа пользователя к объектам бизнес-элемента
+SCOPE_ALL = 'all'
+SCOPE_OWN = 'own'
+SCOPE_NONE = 'none'
 
+
+def get_access_scope(user, element_name, action, matrix=None):
+    """
+    Определяет, к каким объектам элемента у пользователя есть доступ на действие.
+    
+    Returns:
+        str: SCOPE_ALL - ко всем, SCOPE_OWN - только к своим, SCOPE_NONE - ни к каким
+    """
+    if not user or not hasattr(user, 'id'):
+        return SCOPE_NONE
+    if hasattr(user, 'is_superuser') and user.is_superuser:
+        return SCOPE_ALL
+    if not user.role_id:
+        return SCOPE_NONE
+    
+    rule = (matrix or get_matrix()).get_rule(user.role_id, element_name)
+    if not rule or not rule & ACTION_FLAGS.get(action, 0):
+        return SCOPE_NONE
+    if rule & ACTION_ALL_FLAGS.get(action, 0):
+        return SCOPE_ALL
+    return SCOPE_OWN
+
+
+def scoped_queryset(user, element_name, action, qs, owner_field='owner_id', matrix=None):
+    """
+    Ограничивает queryset объектами, доступными пользователю.
+    Решение "свои или все" попадает в запрос как WHERE owner_field = user.id.
+    
+    Args:
+        user: объект пользователя
+        element_name: имя бизнес-элемента
+        action: действие ('read', 'update', 'delete')
+        qs: исходный queryset
+        owner_field: поле с владельцем объекта
+        matrix: матрица прав (в асинхронном коде - полученная через aget_matrix)
+        
+    Returns:
+        QuerySet: qs, qs.filter(owner_field=user.id) или qs.none()
+    """
+    scope = get_access_scope(user, element_name, action, matrix)
+    if scope == SCOPE_ALL:
+        return qs
+    if scope == SCOPE_OWN:
+        return qs.filter(**{owner_field: user.id})
+    return qs.none()
+
+
+def with_scoped_queryset(element_name, action, queryset, owner_field='owner_id'):
+    """
+    Декоратор для представлений-списков: передает в представление аргумент
+    queryset, уже ограниченный scoped_queryset. Ставится под check_permission.
+    
+    Args:
+        queryset: исходный queryset, для каждого запроса берется его копия
+    """
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapped_view(request, *args, **kwargs):
+                auser = getattr(request, 'auser', None)
+                user = await auser() if auser else request.user
+                kwargs['queryset'] = scoped_queryset(
+                    user, element_name, action, queryset.all(), owner_field, await aget_matrix()
+                )
+                return await view_func(request, *args, **kwargs)
+            
+            return async_wrapped_view
+        
+        @wraps(view_func)
+        def wrapped_view(request, *args, **kwargs):
+            kwargs['queryset'] = scoped_queryset(
+                request.user, element_name, action, queryset.all(), owner_field
+            )
+            return view_func(request, *args, **kwargs)
+        
+        return wrapped_view
+    return decorator
+
+
+class ScopedQuerysetMixin:
+    """
+    Mixin для generic-представлений DRF: get_queryset() возвращает только
+    объекты, доступные текущему пользователю.
+    
+    Атрибуты:
+        permission_element: имя бизнес-элемента
+        permission_action: действие (по умолчанию 'read')
+        owner_field: поле с владельцем объекта
+    """
+    permission_element = None
+    permission_action = 'read'
+    owner_field = 'owner_id'
+    
+    def get_queryset(self):
+        return scoped_queryset(
+            self.request.user,
+            self.permission_element,
+            self.permission_action,
+            super().get_queryset(),
+            self.owner_field,
+        )
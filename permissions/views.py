@@ -3,13 +3,24 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from django.views.decorators.csrf import csrf_exempt
 
+from auth_system.pagination import InvalidPageParams, get_page_params, paginate, stream_ndjson
+from permissions.bulk import (
+    STATUS_CREATED,
+    STATUS_UPDATED,
+    BulkRulesError,
+    parse_rules_csv,
+    upsert_access_rules
+)
 from permissions.models import Role, BusinessElement, AccessRoleRule
+from permissions.matrix import get_matrix
 from permissions.serializers import (
     RoleSerializer,
     BusinessElementSerializer,
     AccessRoleRuleSerializer,
-    AccessRoleRuleCreateSerializer
+    AccessRoleRuleCreateSerializer,
+    PermissionCheckSerializer
 )
+from permissions.utils import check_permissions
 
 
 def check_admin(user):
@@ -19,11 +30,39 @@ def check_admin(user):
     if hasattr(user, 'is_superuser') and user.is_superuser:
         return True
     # Можно также проверить роль администратора
-    if user.role and user.role.name.lower() == 'admin':
+    role_name = get_matrix().get_role_name(user.role_id) if user.role_id else None
+    if role_name and role_name.lower() == 'admin':
         return True
     return False
 
 
+def list_response(request, queryset, serializer_class, name):
+    """
+    Список объектов постранично ({name: [...], 'next_cursor': ...})
+    или целиком потоком NDJSON при ?stream=ndjson
+    """
+    stream = request.query_params.get('stream')
+    if stream and stream != 'ndjson':
+        return Response(
+            {'error': 'Поддерживается только stream=ndjson'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        cursor, limit = get_page_params(request.query_params)
+    except InvalidPageParams as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if stream:
+        return stream_ndjson(queryset, serializer_class, cursor)
+    
+    items, next_cursor = paginate(queryset, cursor, limit)
+    return Response({
+        name: serializer_class(items, many=True).data,
+        'next_cursor': next_cursor,
+    }, status=status.HTTP_200_OK)
+
+
 @api_view(['GET'])
 def list_roles(request):
     """Список всех ролей (только для администратора)"""
@@ -33,9 +72,7 @@ def list_roles(request):
             status=status.HTTP_403_FORBIDDEN
         )
     
-    roles = Role.objects.all()
-    serializer = RoleSerializer(roles, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return list_response(request, Role.objects.all(), RoleSerializer, 'roles')
 
 
 @api_view(['GET'])
@@ -47,9 +84,7 @@ def list_business_elements(request):
             status=status.HTTP_403_FORBIDDEN
         )
     
-    elements = BusinessElement.objects.all()
-    serializer = BusinessElementSerializer(elements, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return list_response(request, BusinessElement.objects.all(), BusinessElementSerializer, 'business_elements')
 
 
 @api_view(['GET'])
@@ -61,9 +96,8 @@ def list_access_rules(request):
             status=status.HTTP_403_FORBIDDEN
         )
     
-    rules = AccessRoleRule.objects.select_related('role', 'element').all()
-    serializer = AccessRoleRuleSerializer(rules, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    rules = AccessRoleRule.objects.select_related('role', 'element')
+    return list_response(request, rules, AccessRoleRuleSerializer, 'access_rules')
 
 
 @api_view(['POST'])
@@ -86,6 +120,42 @@ def create_access_rule(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@csrf_exempt
+def bulk_upsert_access_rules(request):
+    """
+    Массовое создание и обновление правил доступа (только для администратора).
+    Принимает JSON {"rules": [...]} или CSV (Content-Type: text/csv).
+    Все правила применяются одной транзакцией или не применяется ни одно.
+    """
+    if not check_admin(request.user):
+        return Response(
+            {'error': 'Доступ запрещен. Требуются права администратора'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    if request.content_type.startswith('text/csv'):
+        try:
+            rows = parse_rules_csv(request.body.decode('utf-8'))
+        except UnicodeDecodeError:
+            return Response({'error': 'CSV должен быть в кодировке UTF-8'}, status=status.HTTP_400_BAD_REQUEST)
+    else:
+        rows = request.data.get('rules') if isinstance(request.data, dict) else None
+        if not isinstance(rows, list):
+            return Response({'error': 'Ожидается список rules'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        results = upsert_access_rules(rows)
+    except BulkRulesError as e:
+        return Response({'errors': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'created': results.count(STATUS_CREATED),
+        'updated': results.count(STATUS_UPDATED),
+        'results': results,
+    }, status=status.HTTP_200_OK)
+
+
 @api_view(['GET'])
 def get_access_rule(request, rule_id):
     """Получение правила доступа по ID (только для администратора)"""
@@ -155,3 +225,39 @@ def delete_access_rule(request, rule_id):
             {'error': 'Правило доступа не найдено'},
             status=status.HTTP_404_NOT_FOUND
         )
+
+
+@api_view(['POST'])
+@csrf_exempt
+def check_permissions_batch(request):
+    """
+    Пакетная проверка прав текущего пользователя (для фронтенда и шлюзов).
+    Все проверки выполняются по одной загрузке матрицы прав.
+    """
+    if not request.user or not hasattr(request.user, 'id'):
+        return Response(
+            {'error': 'Необходима аутентификация'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+    
+    serializer = PermissionCheckSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    checks = serializer.validated_data['checks']
+    decisions = check_permissions(
+        request.user,
+        [(check['element'], check['action'], check.get('owner_id')) for check in checks]
+    )
+    results = []
+    for check, (allowed, reason) in zip(checks, decisions):
+        result = {
+            'element': check['element'],
+            'action': check['action'],
+            'owner_id': check.get('owner_id'),
+            'allowed': allowed,
+        }
+        if reason:
+            result['reason'] = reason
+        results.append(result)
+    return Response({'results': results}, status=status.HTTP_200_OK)
@@ -0,0 +1,187 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+from users.models import User, Session
+
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityBuffer:
+    """
+    Буфер отложенной записи активности сессий и времени входа пользователей.
+
+    Повторные записи по одной сессии схлопываются в памяти, а в базу
+    изменения попадают пачкой одним UPDATE ... FROM (VALUES ...) раз в
+    flush_interval секунд или при накоплении flush_size записей.
+    Буфер ограничен max_pending записями: записи для новых сессий сверх
+    лимита отбрасываются до следующего сброса. Если запись в базу не
+    удалась, изменения возвращаются в буфер в пределах того же лимита и
+    записываются при следующем сбросе.
+    """
+
+    def __init__(self, flush_interval, flush_size, max_pending):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._sessions = {}
+        self._logins = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record_session_activity(self, session_id, last_activity, expires_at):
+        """Запоминает активность сессии и её продленный срок действия"""
+        with self._lock:
+            if session_id not in self._sessions and self._pending() >= self.max_pending:
+                self.dropped += 1
+                return
+            self._sessions[session_id] = (last_activity, expires_at)
+            pending = self._pending()
+        self._after_record(pending)
+
+    def record_login(self, user_id, logged_in_at):
+        """Запоминает время последнего входа пользователя"""
+        with self._lock:
+            if user_id not in self._logins and self._pending() >= self.max_pending:
+                self.dropped += 1
+                return
+            self._logins[user_id] = logged_in_at
+            pending = self._pending()
+        self._after_record(pending)
+
+    def get_expires_at(self, session_id):
+        """Возвращает продленный в памяти срок действия сессии, если он есть"""
+        entry = self._sessions.get(session_id)
+        return entry[1] if entry else None
+
+    def _pending(self):
+        return len(self._sessions) + len(self._logins)
+
+    def _after_record(self, pending):
+        self._ensure_thread()
+        if pending >= self.flush_size:
+            self._wake.set()
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='session-activity-flusher', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Не удалось записать активность сессий')
+            finally:
+                # Поток живет долго, соединение не должно висеть между сбросами
+                connection.close()
+
+    def stop(self):
+        """
+        Останавливает поток сброса и записывает накопленные изменения
+        в текущем потоке. Новая запись снова запустит поток.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            self._wake.set()
+            thread.join()
+            self._stop.clear()
+        self.flush()
+
+    def flush(self):
+        """Записывает накопленные изменения в базу данных"""
+        with self._flush_lock:
+            with self._lock:
+                sessions, self._sessions = self._sessions, {}
+                logins, self._logins = self._logins, {}
+
+            try:
+                if sessions:
+                    _update_sessions(sessions)
+                    sessions = {}
+                if logins:
+                    _update_logins(logins)
+            except Exception:
+                self._requeue(sessions, logins)
+                raise
+
+    def _requeue(self, sessions, logins):
+        """Возвращает незаписанные изменения в буфер, не затирая более новые"""
+        with self._lock:
+            for pending, entries in ((self._sessions, sessions), (self._logins, logins)):
+                for key, value in entries.items():
+                    if key in pending:
+                        continue
+                    if self._pending() >= self.max_pending:
+                        self.dropped += 1
+                        continue
+                    pending[key] = value
+
+
+def _update_sessions(sessions):
+    if connection.vendor == 'postgresql':
+        rows = [(pk, last_activity, expires_at) for pk, (last_activity, expires_at) in sessions.items()]
+        values = ', '.join(['(%s, %s, %s)'] * len(rows))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {Session._meta.db_table} AS s '
+                f'SET last_activity = v.last_activity, '
+                f'expires_at = GREATEST(s.expires_at, v.expires_at) '
+                f'FROM (VALUES {values}) AS v(id, last_activity, expires_at) '
+                f'WHERE s.id = v.id',
+                [param for row in rows for param in row]
+            )
+    else:
+        Session.objects.bulk_update(
+            [
+                Session(id=pk, last_activity=last_activity, expires_at=expires_at)
+                for pk, (last_activity, expires_at) in sessions.items()
+            ],
+            ['last_activity', 'expires_at']
+        )
+
+
+def _update_logins(logins):
+    if connection.vendor == 'postgresql':
+        values = ', '.join(['(%s, %s)'] * len(logins))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {User._meta.db_table} AS u '
+                f'SET last_login = v.last_login '
+                f'FROM (VALUES {values}) AS v(id, last_login) '
+                f'WHERE u.id = v.id',
+                [param for row in logins.items() for param in row]
+            )
+    else:
+        User.objects.bulk_update(
+            [User(id=pk, last_login=logged_in_at) for pk, logged_in_at in logins.items()],
+            ['last_login']
+        )
+
+
+activity_buffer = ActivityBuffer(
+    flush_interval=settings.SESSION_ACTIVITY_FLUSH_INTERVAL,
+    flush_size=settings.SESSION_ACTIVITY_FLUSH_SIZE,
+    max_pending=settings.SESSION_ACTIVITY_MAX_PENDING,
+)
+
+# Сбрасываем буфер при остановке воркера
+atexit.register(activity_buffer.flush)
@@ -12,7 +12,7 @@ class UserAdmin(admin.ModelAdmin):
 
 @admin.register(Session)
 class SessionAdmin(admin.ModelAdmin):
-    list_display = ['user', 'session_token', 'expires_at', 'created_at', 'last_activity']
+    list_display = ['user', 'expires_at', 'created_at', 'last_activity']
     list_filter = ['expires_at', 'created_at']
-    search_fields = ['user__email', 'session_token']
+    search_fields = ['user__email']
     readonly_fields = ['created_at', 'last_activity']
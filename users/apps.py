@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class UsersConfig(AppConfig):
     name = 'users'
+
+    def ready(self):
+        import users.signals  # noqa: F401
+        from users.utils import check_claims_cache
+
+        if settings.JWT_CLAIMS_MODE:
+            check_claims_cache()
@@ -0,0 +1,187 @@
+"""
+Асинхронные версии представлений users.views для запуска под ASGI.
+
+Подключаются вместо синхронных при ASYNC_VIEWS=True. Запросы к базе
+выполняются через async ORM, хеширование паролей - в пуле хеширования,
+а подпись JWT ключами RSA/EdDSA - в отдельном потоке.
+"""
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from rest_framework import status
+
+from auth_system.instrumentation import query_budget
+from permissions.matrix import aget_matrix
+from users.auth_flow import (
+    auth_response,
+    check_login_throttle,
+    hashing_busy_response,
+    login_failure,
+    record_login,
+    registration_fields,
+)
+from users.hashing import HashPoolBusy
+from users.keyring import get_keyring, is_asymmetric
+from users.models import User, Session
+from users.serializers import (
+    EMAIL_EXISTS_ERROR,
+    UserRegistrationSerializer,
+    UserLoginSerializer,
+    UserProfileSerializer,
+    UserUpdateSerializer
+)
+from users.utils import (
+    aissue_jwt_token,
+    acreate_session,
+    adelete_session,
+    aget_full_user,
+    async_api_view,
+    json_response,
+    skip_user_identification,
+)
+
+
+async def profile_data(user):
+    return UserProfileSerializer(user, context={'matrix': await aget_matrix()}).data
+
+
+@skip_user_identification
+@async_api_view(['POST'])
+async def register(request):
+    """Регистрация нового пользователя"""
+    serializer = UserRegistrationSerializer(data=request.data, context={'check_email_exists': False})
+    if not serializer.is_valid():
+        return json_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    data = serializer.validated_data
+    if await User.objects.filter(email=data['email']).aexists():
+        return json_response({'email': [EMAIL_EXISTS_ERROR]}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        user = await User.objects.acreate_user(**registration_fields(data))
+    except HashPoolBusy:
+        return hashing_busy_response(json_response)
+
+    return auth_response(
+        json_response,
+        'Пользователь успешно зарегистрирован',
+        await profile_data(user),
+        await aissue_jwt_token(user),
+        await acreate_session(user),
+        status.HTTP_201_CREATED,
+    )
+
+
+@query_budget(2)
+@skip_user_identification
+@async_api_view(['POST'])
+async def login(request):
+    """Вход пользователя в систему"""
+    serializer = UserLoginSerializer(data=request.data)
+    if not serializer.is_valid():
+        return json_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    email = serializer.validated_data['email']
+    password = serializer.validated_data['password']
+
+    # Лимит попыток проверяется до запроса к базе и хеширования пароля
+    throttled = check_login_throttle(request, email, json_response)
+    if throttled:
+        return throttled
+
+    try:
+        user = await User.objects.aget(email=email)
+    except User.DoesNotExist:
+        return login_failure(json_response)
+
+    try:
+        password_valid = await user.acheck_password(password)
+    except HashPoolBusy:
+        return hashing_busy_response(json_response)
+
+    if not password_valid:
+        return login_failure(json_response)
+    if not user.is_active:
+        return login_failure(json_response, account_disabled=True)
+
+    record_login(user, email)
+    return auth_response(
+        json_response,
+        'Успешный вход',
+        await profile_data(user),
+        await aissue_jwt_token(user),
+        await acreate_session(user),
+        status.HTTP_200_OK,
+    )
+
+
+@skip_user_identification
+@async_api_view(['POST'])
+async def logout(request):
+    """Выход пользователя из системы"""
+    session_token = request.COOKIES.get('session_id')
+    if session_token:
+        await adelete_session(session_token)
+
+    response = json_response({'message': 'Успешный выход'}, status=status.HTTP_200_OK)
+    response.delete_cookie('session_id')
+    return response
+
+
+@query_budget(1)
+@async_api_view(['GET'])
+async def profile(request):
+    """Получение профиля текущего пользователя"""
+    user = await request.auser()
+    if not user:
+        return json_response({'error': 'Необходима аутентификация'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    user = await aget_full_user(user)
+    return json_response(await profile_data(user), status=status.HTTP_200_OK)
+
+
+@async_api_view(['PUT', 'PATCH'])
+async def update_profile(request):
+    """Обновление профиля пользователя"""
+    user = await request.auser()
+    if not user:
+        return json_response({'error': 'Необходима аутентификация'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    user = await aget_full_user(user)
+    serializer = UserUpdateSerializer(user, data=request.data, partial=True)
+    if not serializer.is_valid():
+        return json_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    for field, value in serializer.validated_data.items():
+        setattr(user, field, value)
+    await user.asave()
+    return json_response({
+        'message': 'Профиль успешно обновлен',
+        'user': await profile_data(user)
+    }, status=status.HTTP_200_OK)
+
+
+@async_api_view(['DELETE'])
+async def delete_account(request):
+    """Мягкое удаление аккаунта пользователя"""
+    user = await request.auser()
+    if not user:
+        return json_response({'error': 'Необходима аутентификация'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    user = await aget_full_user(user)
+    user.is_active = False
+    await user.asave()
+    await Session.objects.filter(user=user).adelete()
+
+    response = json_response({'message': 'Аккаунт успешно удален'}, status=status.HTTP_200_OK)
+    response.delete_cookie('session_id')
+    return response
+
+
+@skip_user_identification
+@async_api_view(['GET'])
+async def jwks(request):
+    """Открытые ключи для проверки подписи JWT другими сервисами"""
+    keys = get_keyring().jwks() if is_asymmetric() else {'keys': []}
+    response = json_response(keys, status=status.HTTP_200_OK)
+    patch_cache_control(response, public=True, max_age=settings.JWKS_CACHE_MAX_AGE)
+    return response
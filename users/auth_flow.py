@@ -0,0 +1,95 @@
+"""
+Общие шаги регистрации и входа для users.views и users.async_views.
+
+Представления отличаются только доступом к базе (ORM или async ORM) и
+классом ответа: DRF Response у синхронных, json_response у асинхронных.
+Класс ответа передается в помощники аргументом response_class, у обоих
+одинаковая сигнатура (data, status=...).
+"""
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import status
+
+from auth_system.metrics import login_attempts
+from users.activity import activity_buffer
+from users.throttling import login_throttle, get_client_ip
+from users.utils import SESSION_LIFETIME
+
+INVALID_CREDENTIALS = {'error': 'Неверный email или пароль'}
+ACCOUNT_DISABLED = {'error': 'Аккаунт деактивирован'}
+
+# Поля модели User, которые заполняются при регистрации
+REGISTRATION_FIELDS = ('email', 'password', 'first_name', 'last_name', 'middle_name')
+
+
+def registration_fields(validated_data):
+    """Аргументы create_user() из проверенных данных регистрации"""
+    return {field: validated_data[field] for field in REGISTRATION_FIELDS}
+
+
+def hashing_busy_response(response_class):
+    """Быстрый отказ, когда очередь хеширования паролей переполнена"""
+    response = response_class(
+        {'error': 'Сервис перегружен, повторите попытку позже'},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+    response['Retry-After'] = str(settings.PASSWORD_HASH_RETRY_AFTER)
+    return response
+
+
+def check_login_throttle(request, email, response_class):
+    """
+    Списывает попытку входа из лимитов по email и адресу клиента.
+    Возвращает ответ 429, если лимит исчерпан, иначе None.
+    """
+    if not settings.LOGIN_THROTTLE_ENABLED:
+        return None
+    retry_after = login_throttle.check(email, get_client_ip(request))
+    if not retry_after:
+        return None
+    login_attempts.labels(result='locked').inc()
+    response = response_class(
+        {'error': 'Слишком много попыток входа, повторите позже'},
+        status=status.HTTP_429_TOO_MANY_REQUESTS
+    )
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def login_failure(response_class, account_disabled=False):
+    """Отказ во входе: неверные email или пароль (401) или деактивированный аккаунт (403)"""
+    login_attempts.labels(result='failure').inc()
+    if account_disabled:
+        return response_class(ACCOUNT_DISABLED, status=status.HTTP_403_FORBIDDEN)
+    return response_class(INVALID_CREDENTIALS, status=status.HTTP_401_UNAUTHORIZED)
+
+
+def record_login(user, email):
+    """Учитывает успешный вход: метрика, сброс лимита по email, время входа"""
+    login_attempts.labels(result='success').inc()
+    if settings.LOGIN_THROTTLE_ENABLED:
+        login_throttle.reset_email(email)
+    if settings.SESSION_ACTIVITY_TRACKING:
+        activity_buffer.record_login(user.id, timezone.now())
+
+
+def set_session_cookie(response, session_id):
+    """Устанавливает cookie с session_id на срок действия сессии"""
+    response.set_cookie(
+        'session_id',
+        session_id,
+        max_age=int(SESSION_LIFETIME.total_seconds()),
+        httponly=True,
+        samesite='Lax'
+    )
+
+
+def auth_response(response_class, message, user_data, token, session_id, status_code):
+    """Ответ на регистрацию или вход: профиль, JWT и cookie сессии"""
+    response = response_class({
+        'message': message,
+        'user': user_data,
+        'token': token
+    }, status=status_code)
+    set_session_cookie(response, session_id)
+    return response
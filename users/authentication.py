@@ -0,0 +1,14 @@
+from rest_framework.authentication import BaseAuthentication
+
+
+class UserIdentificationAuthentication(BaseAuthentication):
+    """
+    Передает в DRF пользователя, определенного UserIdentificationMiddleware.
+    Без этого Request.user в DRF-представлениях не видит нашего пользователя.
+    """
+
+    def authenticate(self, request):
+        user = getattr(request._request, 'user', None)
+        if user is None:
+            return None
+        return (user, None)
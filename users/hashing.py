@@ -0,0 +1,349 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.db import connection
+from django.dispatch import receiver
+
+from auth_system.metrics import (
+    password_hash_queue_depth,
+    password_hash_rejected,
+    password_hash_running,
+    password_hash_seconds,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class HashPoolBusy(Exception):
+    """Очередь хеширования паролей переполнена, запрос нужно повторить позже"""
+
+
+class PasswordHashPool:
+    """
+    Ограниченный пул потоков для хеширования паролей.
+
+    Одновременно хешируется не более workers паролей, еще queue_size задач
+    могут ждать в очереди. Если очередь заполнена, run() сразу выбрасывает
+    HashPoolBusy вместо того, чтобы задерживать поток запроса.
+    bcrypt отпускает GIL, поэтому потоков достаточно.
+    Глубина очереди, занятые потоки и время ожидания и хеширования
+    публикуются в /metrics.
+    """
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self._executor = None
+
+        # Счетчики
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def _get_executor(self):
+        # Создается лениво, чтобы пул появлялся уже после fork воркера
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix='password-hash'
+                    )
+        return self._executor
+
+    def run(self, func, *args):
+        """Выполняет func(*args) в пуле и возвращает результат"""
+        if not self._acquire():
+            raise HashPoolBusy()
+        try:
+            return self._get_executor().submit(self._timed, func, args, time.perf_counter()).result()
+        finally:
+            self._release()
+
+    def run_in_background(self, func, *args):
+        """
+        Ставит func(*args) в пул без ожидания результата.
+        Возвращает Future задачи или None, если очередь заполнена и задача не принята.
+        """
+        if not self._acquire():
+            return None
+        future = self._get_executor().submit(self._timed, func, args, time.perf_counter())
+        future.add_done_callback(self._release_background)
+        return future
+
+    async def arun(self, func, *args):
+        """Асинхронный run(): ожидает результат, не занимая поток event loop"""
+        if not self._acquire():
+            raise HashPoolBusy()
+        future = self._get_executor().submit(self._timed, func, args, time.perf_counter())
+        # Слот освобождается по завершении задачи, даже если запрос отменен
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _acquire(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            password_hash_rejected.inc()
+            return False
+        with self._lock:
+            self.pending += 1
+            self._publish()
+        return True
+
+    def _release(self, future=None):
+        with self._lock:
+            self.pending -= 1
+            self._publish()
+        self._slots.release()
+
+    def _publish(self):
+        # Вызывается под self._lock, чтобы значения не перемешивались
+        password_hash_queue_depth.set(self.pending - self.running)
+        password_hash_running.set(self.running)
+
+    def _release_background(self, future):
+        self._release(future)
+        if future.exception() is not None:
+            logger.error('Фоновая задача хеширования завершилась ошибкой', exc_info=future.exception())
+
+    def _timed(self, func, args, submitted):
+        started = time.perf_counter()
+        password_hash_seconds.labels(stage='wait').observe(started - submitted)
+        with self._lock:
+            self.running += 1
+            self._publish()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            password_hash_seconds.labels(stage='run').observe(elapsed)
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.total_seconds += elapsed
+                self.max_seconds = max(self.max_seconds, elapsed)
+                self._publish()
+
+    def stats(self):
+        """Текущее состояние пула: глубина очереди и задержка хеширования"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'queue_depth': self.pending - self.running,
+                'running': self.running,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'avg_seconds': self.total_seconds / self.completed if self.completed else 0.0,
+                'max_seconds': self.max_seconds,
+            }
+
+
+password_hash_pool = PasswordHashPool(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    queue_size=settings.PASSWORD_HASH_QUEUE_SIZE,
+)
+
+
+class BCryptHasher:
+    """bcrypt с настраиваемым числом раундов (cost)"""
+    prefix = '$2'
+
+    def __init__(self, rounds=12):
+        self.rounds = rounds
+
+    def encode(self, raw_password):
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return bcrypt.hashpw(raw_password.encode('utf-8'), salt).decode('utf-8')
+
+    def verify(self, raw_password, encoded):
+        return bcrypt.checkpw(raw_password.encode('utf-8'), encoded.encode('utf-8'))
+
+    def must_update(self, encoded):
+        # Формат: $2b$<rounds>$<salt+hash>
+        return int(encoded.split('$')[2]) != self.rounds
+
+
+class Argon2idHasher:
+    """argon2id с настраиваемыми затратами памяти и времени (нужен пакет argon2-cffi)"""
+    prefix = '$argon2id$'
+
+    def __init__(self, time_cost=3, memory_cost=65536, parallelism=4):
+        try:
+            import argon2
+        except ImportError:
+            raise ImproperlyConfigured('Для хешера argon2id установите пакет argon2-cffi')
+        self._exceptions = argon2.exceptions
+        self._hasher = argon2.PasswordHasher(
+            time_cost=time_cost,
+            memory_cost=memory_cost,
+            parallelism=parallelism,
+            type=argon2.Type.ID,
+        )
+
+    def encode(self, raw_password):
+        return self._hasher.hash(raw_password)
+
+    def verify(self, raw_password, encoded):
+        try:
+            return self._hasher.verify(encoded, raw_password)
+        except (self._exceptions.VerificationError, self._exceptions.InvalidHashError):
+            return False
+
+    def must_update(self, encoded):
+        return self._hasher.check_needs_rehash(encoded)
+
+
+class FastTestHasher:
+    """Быстрый соленый SHA-256. Только для тестов, не использовать в production"""
+    prefix = 'fast$'
+
+    def encode(self, raw_password, salt=None):
+        salt = salt or secrets.token_hex(8)
+        digest = hashlib.sha256(f'{salt}{raw_password}'.encode('utf-8')).hexdigest()
+        return f'fast${salt}${digest}'
+
+    def verify(self, raw_password, encoded):
+        _, salt, _ = encoded.split('$', 2)
+        return hmac.compare_digest(self.encode(raw_password, salt), encoded)
+
+    def must_update(self, encoded):
+        return False
+
+
+HASHERS = {
+    'bcrypt': BCryptHasher,
+    'argon2id': Argon2idHasher,
+    'fast': FastTestHasher,
+}
+
+_hasher_instances = {}
+
+
+def _get_hasher_options(algorithm):
+    if algorithm == 'bcrypt':
+        return {'rounds': settings.BCRYPT_ROUNDS}
+    if algorithm == 'argon2id':
+        return {
+            'time_cost': settings.ARGON2_TIME_COST,
+            'memory_cost': settings.ARGON2_MEMORY_COST,
+            'parallelism': settings.ARGON2_PARALLELISM,
+        }
+    return {}
+
+
+def get_hasher(algorithm=None):
+    """Возвращает хешер по имени алгоритма (по умолчанию - из PASSWORD_HASHER)"""
+    algorithm = algorithm or settings.PASSWORD_HASHER
+    hasher = _hasher_instances.get(algorithm)
+    if hasher is None:
+        if algorithm not in HASHERS:
+            raise ImproperlyConfigured(f'Неизвестный алгоритм хеширования паролей: {algorithm}')
+        hasher = HASHERS[algorithm](**_get_hasher_options(algorithm))
+        _hasher_instances[algorithm] = hasher
+    return hasher
+
+
+@receiver(setting_changed)
+def reset_hashers(setting, **kwargs):
+    if setting in ('PASSWORD_HASHER', 'BCRYPT_ROUNDS', 'ARGON2_TIME_COST',
+                   'ARGON2_MEMORY_COST', 'ARGON2_PARALLELISM'):
+        _hasher_instances.clear()
+
+
+def identify_hasher(encoded):
+    """Определяет хешер по формату сохраненного хеша, None - если формат неизвестен"""
+    for algorithm, hasher_class in HASHERS.items():
+        if encoded.startswith(hasher_class.prefix):
+            return get_hasher(algorithm)
+    return None
+
+
+def hash_password(raw_password):
+    """Хеширует пароль алгоритмом из настроек в пуле хеширования"""
+    return password_hash_pool.run(get_hasher().encode, raw_password)
+
+
+def verify_password(raw_password, password_hash):
+    """Проверяет пароль по хешу в пуле хеширования"""
+    hasher = identify_hasher(password_hash)
+    if hasher is None:
+        return False
+    return password_hash_pool.run(hasher.verify, raw_password, password_hash)
+
+
+async def ahash_password(raw_password):
+    """Асинхронный hash_password()"""
+    return await password_hash_pool.arun(get_hasher().encode, raw_password)
+
+
+async def averify_password(raw_password, password_hash):
+    """Асинхронный verify_password()"""
+    hasher = identify_hasher(password_hash)
+    if hasher is None:
+        return False
+    return await password_hash_pool.arun(hasher.verify, raw_password, password_hash)
+
+
+def password_needs_rehash(password_hash):
+    """Проверяет, устарели ли алгоритм или параметры хеша"""
+    hasher = get_hasher()
+    return identify_hasher(password_hash) is not hasher or hasher.must_update(password_hash)
+
+
+_rehash_writer = None
+_rehash_writer_lock = threading.Lock()
+
+
+def _get_rehash_writer():
+    # Отдельный поток для записи пересчитанных хешей: запрос к базе
+    # не должен занимать поток пула хеширования
+    global _rehash_writer
+    if _rehash_writer is None:
+        with _rehash_writer_lock:
+            if _rehash_writer is None:
+                _rehash_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='password-rehash-write')
+    return _rehash_writer
+
+
+def _store_rehashed(on_rehashed, new_hash):
+    try:
+        on_rehashed(new_hash)
+    except Exception:
+        logger.exception('Не удалось сохранить пересчитанный хеш пароля')
+    finally:
+        connection.close()
+
+
+def rehash_in_background(raw_password, on_rehashed):
+    """
+    Пересчитывает хеш текущим алгоритмом в пуле, не задерживая запрос,
+    и передает новый хеш в on_rehashed в отдельном потоке записи.
+    Если пул занят, пересчет откладывается до следующего входа.
+    Возвращает True, если задача принята.
+    """
+    def store(future):
+        if not future.cancelled() and future.exception() is None:
+            _get_rehash_writer().submit(_store_rehashed, on_rehashed, future.result())
+
+    future = password_hash_pool.run_in_background(get_hasher().encode, raw_password)
+    if future is None:
+        return False
+    future.add_done_callback(store)
+    return True
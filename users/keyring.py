@@ -0,0 +1,209 @@
+"""
+Набор ключей для асимметричной подписи JWT (EdDSA, RS256).
+
+Ключи хранятся в JSON-файле JWT_KEYRING_FILE и обновляются командой
+rotate_jwt_keys. Каждый ключ имеет kid, который записывается в заголовок
+токена, и окно действия:
+- activates_at: с этого момента ключ подписывает новые токены
+- retires_at: ключ больше не подписывает, но еще проверяет токены
+- expires_at: ключ удаляется из JWKS и больше ничего не проверяет
+"""
+import json
+import logging
+import os
+import secrets
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from jwt.algorithms import get_default_algorithms
+
+
+ASYMMETRIC_ALGORITHMS = ('EdDSA', 'RS256')
+
+# Как часто проверять, не изменился ли файл ключей (секунды)
+RELOAD_CHECK_INTERVAL = 5
+
+logger = logging.getLogger(__name__)
+
+
+def is_asymmetric():
+    return settings.JWT_ALGORITHM in ASYMMETRIC_ALGORITHMS
+
+
+def generate_private_key(alg):
+    """Создает закрытый ключ для алгоритма и возвращает его в PEM"""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+    if alg == 'EdDSA':
+        key = ed25519.Ed25519PrivateKey.generate()
+    elif alg == 'RS256':
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        raise ValueError(f'Алгоритм {alg} не поддерживается')
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode('ascii')
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+class SigningKey:
+    def __init__(self, kid, alg, private_key, activates_at, retires_at=None, expires_at=None, created_at=None):
+        self.kid = kid
+        self.alg = alg
+        self.private_key_pem = private_key
+        self.activates_at = activates_at
+        self.retires_at = retires_at
+        self.expires_at = expires_at
+        self.created_at = created_at or activates_at
+
+        algorithm = get_default_algorithms()[alg]
+        self.private_key = algorithm.prepare_key(private_key)
+        self.public_key = self.private_key.public_key()
+        self._algorithm = algorithm
+
+    @classmethod
+    def new(cls, alg, activates_at):
+        return cls(secrets.token_urlsafe(12), alg, generate_private_key(alg), activates_at)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            kid=data['kid'],
+            alg=data['alg'],
+            private_key=data['private_key'],
+            activates_at=_parse_time(data['activates_at']),
+            retires_at=_parse_time(data.get('retires_at')),
+            expires_at=_parse_time(data.get('expires_at')),
+            created_at=_parse_time(data.get('created_at')),
+        )
+
+    def to_dict(self):
+        return {
+            'kid': self.kid,
+            'alg': self.alg,
+            'private_key': self.private_key_pem,
+            'created_at': self.created_at.isoformat(),
+            'activates_at': self.activates_at.isoformat(),
+            'retires_at': self.retires_at.isoformat() if self.retires_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+        }
+
+    def can_sign(self, now):
+        return self.activates_at <= now and (self.retires_at is None or self.retires_at > now)
+
+    def can_verify(self, now):
+        return self.expires_at is None or self.expires_at > now
+
+    def to_jwk(self):
+        jwk = json.loads(self._algorithm.to_jwk(self.public_key))
+        jwk.update({'kid': self.kid, 'alg': self.alg, 'use': 'sig'})
+        return jwk
+
+
+class JWTKeyring:
+    def __init__(self, keys):
+        self.keys = keys
+        self._by_kid = {key.kid: key for key in keys}
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls([])
+        with open(path) as f:
+            data = json.load(f)
+        return cls([SigningKey.from_dict(item) for item in data.get('keys', [])])
+
+    def save(self, path):
+        """
+        Записывает ключи во временный файл рядом и заменяет им path:
+        процессы, перечитывающие файл, не увидят его недописанным
+        """
+        data = json.dumps({'keys': [key.to_dict() for key in self.keys]}, indent=2)
+        # Файл содержит закрытые ключи: mkstemp создает его с правами 0o600
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.jwt_keyring.')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def get_signing_key(self, now=None):
+        """Самый новый ключ, которому разрешено подписывать"""
+        now = now or timezone.now()
+        candidates = [key for key in self.keys if key.can_sign(now)]
+        if not candidates:
+            raise ImproperlyConfigured(
+                'Нет действующего ключа подписи JWT, выполните manage.py rotate_jwt_keys'
+            )
+        return max(candidates, key=lambda key: key.activates_at)
+
+    def get_verification_key(self, kid, now=None):
+        key = self._by_kid.get(kid)
+        if key is None or not key.can_verify(now or timezone.now()):
+            return None
+        return key
+
+    def rotate(self, alg, activates_at, overlap, now=None):
+        """
+        Добавляет новый ключ, который начнет подписывать с activates_at.
+        Текущие ключи перестают подписывать в этот момент и еще overlap
+        проверяют выпущенные ими токены. Истекшие ключи удаляются.
+        """
+        now = now or timezone.now()
+        new_key = SigningKey.new(alg, activates_at)
+        for key in self.keys:
+            if key.retires_at is None or key.retires_at > activates_at:
+                key.retires_at = activates_at
+                key.expires_at = activates_at + overlap
+        self.keys = [key for key in self.keys if key.can_verify(now)] + [new_key]
+        self._by_kid = {key.kid: key for key in self.keys}
+        return new_key
+
+    def jwks(self, now=None):
+        """Открытые ключи в формате JWKS, включая еще не активированные"""
+        now = now or timezone.now()
+        return {'keys': [key.to_jwk() for key in self.keys if key.can_verify(now)]}
+
+
+_lock = threading.Lock()
+_keyring = None
+_keyring_mtime = None
+_checked_at = 0.0
+
+
+def get_keyring():
+    """Возвращает набор ключей, перечитывая файл после ротации"""
+    global _keyring, _keyring_mtime, _checked_at
+    now = time.monotonic()
+    if _keyring is not None and now - _checked_at < RELOAD_CHECK_INTERVAL:
+        return _keyring
+
+    with _lock:
+        path = settings.JWT_KEYRING_FILE
+        mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        if _keyring is None or mtime != _keyring_mtime:
+            try:
+                _keyring = JWTKeyring.load(path)
+                _keyring_mtime = mtime
+            except (ValueError, KeyError):
+                # Испорченный файл не должен ломать проверку токенов: работаем со старыми ключами
+                if _keyring is None:
+                    raise
+                logger.exception('Не удалось перечитать файл ключей JWT %s', path)
+        _checked_at = now
+        return _keyring
@@ -0,0 +1,45 @@
+import hashlib
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет token_digest для существующих сессий пачками и очищает session_token. '
+        'Запускается после миграции users.0003 и до users.0004'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # Модель уже не содержит session_token, поэтому работаем с таблицей напрямую
+        with connection.cursor() as cursor:
+            columns = [col.name for col in connection.introspection.get_table_description(cursor, 'user_sessions')]
+        if 'session_token' not in columns:
+            self.stdout.write('Колонка session_token уже удалена, заполнять нечего')
+            return
+
+        total = 0
+        while True:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT id, session_token FROM user_sessions '
+                    'WHERE token_digest IS NULL AND session_token IS NOT NULL '
+                    'ORDER BY id LIMIT %s',
+                    [batch_size]
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                cursor.executemany(
+                    'UPDATE user_sessions SET token_digest = %s, session_token = NULL WHERE id = %s',
+                    [(hashlib.sha256(token.encode('utf-8')).digest(), session_id) for session_id, token in rows]
+                )
+            total += len(rows)
+            self.stdout.write(f'  обработано сессий: {total}')
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Готово, обработано сессий: {total}'))
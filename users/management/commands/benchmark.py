@@ -0,0 +1,116 @@
+import io
+import json
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from auth_system.benchmarks import (
+    BENCHMARK_USER_EMAIL,
+    BENCHMARK_USER_PASSWORD,
+    build_benchmarks,
+    find_regressions,
+)
+from users.activity import activity_buffer
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Бенчмарки горячих путей: декодирование JWT, поиск пользователя и сессии, '
+        'проверка прав и пароля, а также profile, products и login через весь стек. '
+        'По умолчанию выполняется на отдельной тестовой базе'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000, help='Операций на бенчмарк')
+        parser.add_argument('--concurrency', type=int, default=4, help='Потоков в макробенчмарках')
+        parser.add_argument('--only', action='append', default=[], help='Запустить только бенчмарки с этой подстрокой')
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+        parser.add_argument('--baseline', help='JSON с результатами для сравнения')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Допустимое ухудшение p50/p95 относительно baseline (0.25 = 25%%)'
+        )
+        parser.add_argument(
+            '--use-existing-db', action='store_true',
+            help=(
+                'Работать с текущей базой (например, после generate_scale_data) вместо тестовой. '
+                'Тестовые данные не загружаются, нужны --user-email и --user-password'
+            )
+        )
+        parser.add_argument('--user-email', help='Email существующего пользователя для бенчмарков')
+        parser.add_argument('--user-password', help='Пароль этого пользователя (для входа и check_password)')
+
+    def handle(self, *args, **options):
+        # В рабочую базу не добавляем тестовых пользователей с известными паролями
+        if options['use_existing_db'] and not (options['user_email'] and options['user_password']):
+            raise CommandError('С --use-existing-db укажите --user-email и --user-password существующего пользователя')
+
+        baseline = {}
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as f:
+                    baseline = json.load(f)['results']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f'Не удалось прочитать baseline: {e}')
+
+        setup_test_environment()
+        old_name = None
+        if not options['use_existing_db']:
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            # Повторные входы одного пользователя не должны упираться в лимит попыток
+            with override_settings(LOGIN_THROTTLE_ENABLED=False):
+                results = self.run_benchmarks(options)
+            # Активность сессий бенчмарка записывается в ту же базу, пока она существует
+            activity_buffer.stop()
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {'vendor': connection.vendor, 'results': results}
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            self.stdout.write(f'Результаты сохранены в {options["output"]}')
+
+        problems = find_regressions(results, baseline, options['tolerance'])
+        if problems:
+            for problem in problems:
+                self.stderr.write(f'  ✗ {problem}')
+            raise CommandError(f'Обнаружено регрессий: {len(problems)}')
+        self.stdout.write(self.style.SUCCESS('✓ Регрессий не обнаружено'))
+
+    def run_benchmarks(self, options):
+        if options['use_existing_db']:
+            email, password = options['user_email'], options['user_password']
+            user = User.objects.filter(email=email).first()
+            if user is None or not user.check_password(password):
+                raise CommandError(f'Пользователь {email} не найден или пароль неверен')
+        else:
+            call_command('load_test_data', stdout=io.StringIO())
+            email = options['user_email'] or BENCHMARK_USER_EMAIL
+            password = options['user_password'] or BENCHMARK_USER_PASSWORD
+        benchmarks = build_benchmarks(options['iterations'], options['concurrency'], email, password)
+        if options['only']:
+            benchmarks = [
+                (name, run) for name, run in benchmarks
+                if any(pattern in name for pattern in options['only'])
+            ]
+
+        self.stdout.write(
+            f'{"Бенчмарк":<32} {"оп/с":>10} {"p50 мс":>9} {"p95 мс":>9} {"p99 мс":>9} {"запросов":>9}'
+        )
+        results = {}
+        for name, run in benchmarks:
+            result = run()
+            results[name] = result.to_dict()
+            self.stdout.write(
+                f'{name:<32} {result.ops_per_sec:>10.1f} {result.p50:>9.3f} '
+                f'{result.p95:>9.3f} {result.p99:>9.3f} {result.queries:>9}'
+            )
+        return results
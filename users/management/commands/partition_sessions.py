@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from users import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        'Секционирует user_sessions по expires_at (PostgreSQL) и создает секции '
+        'на будущие периоды. Повторный запуск только добавляет недостающие секции'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval-days', type=int, default=settings.SESSION_PARTITION_INTERVAL_DAYS,
+            help='Длина периода одной секции в днях'
+        )
+        parser.add_argument(
+            '--periods-ahead', type=int, default=settings.SESSION_PARTITION_PERIODS_AHEAD,
+            help='Сколько секций создавать вперед'
+        )
+
+    def handle(self, *args, **options):
+        if not partitions.is_supported():
+            raise CommandError('Секционирование поддерживается только для PostgreSQL')
+
+        interval_days = options['interval_days']
+        periods_ahead = options['periods_ahead']
+
+        if not partitions.is_partitioned():
+            self.stdout.write('Преобразование user_sessions в секционированную таблицу...')
+            partitions.convert_to_partitioned(interval_days, periods_ahead)
+            self.stdout.write(self.style.SUCCESS('  ✓ Таблица секционирована'))
+
+        names = partitions.ensure_partitions(interval_days, periods_ahead)
+        self.stdout.write(self.style.SUCCESS(f'✓ Секции на ближайшие периоды: {", ".join(names)}'))
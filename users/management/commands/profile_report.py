@@ -0,0 +1,95 @@
+import os
+import pstats
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from auth_system.profiling import parse_profile_filename, short_filename
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводный отчет по профилям из PROFILING_DIR: самые затратные функции '
+        'по файлам cProfile (.prof) и по снимкам стека (.collapsed)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help='Каталог профилей (по умолчанию PROFILING_DIR)')
+        parser.add_argument('--top', type=int, default=20, help='Сколько функций показать')
+        parser.add_argument('--view', action='append', default=[], help='Только профили представления (имя URL)')
+        parser.add_argument(
+            '--sort', choices=['tottime', 'cumtime'], default='tottime',
+            help='Сортировка для cProfile: собственное или полное время функции'
+        )
+        parser.add_argument('--collapsed-output', help='Сохранить объединенные стеки для flame graph')
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or settings.PROFILING_DIR
+        try:
+            filenames = sorted(os.listdir(directory))
+        except OSError as e:
+            raise CommandError(f'Не удалось прочитать {directory}: {e}')
+
+        prof_files, collapsed_files = [], []
+        for filename in filenames:
+            view = parse_profile_filename(filename)
+            if view is None or (options['view'] and view not in options['view']):
+                continue
+            path = os.path.join(directory, filename)
+            (prof_files if filename.endswith('.prof') else collapsed_files).append(path)
+
+        if not prof_files and not collapsed_files:
+            raise CommandError(f'В {directory} нет подходящих профилей')
+        if prof_files:
+            self.report_cprofile(prof_files, options['top'], options['sort'])
+        if collapsed_files:
+            self.report_collapsed(collapsed_files, options['top'], options['collapsed_output'])
+
+    def report_cprofile(self, paths, top, sort):
+        stats = pstats.Stats(*paths)
+        total = stats.total_tt or 1.0
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'cProfile: профилей {len(paths)}, время {stats.total_tt:.3f} с, сортировка {sort}'
+        ))
+        self.stdout.write(f'{"вызовов":>10} {"tottime с":>10} {"cumtime с":>10} {"% tottime":>9}  функция')
+
+        index = 2 if sort == 'tottime' else 3
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][index], reverse=True)
+        for (filename, line, name), (_, ncalls, tottime, cumtime, _) in rows[:top]:
+            # Встроенные функции pstats записывает с файлом '~'
+            function = name if filename == '~' else f'{name} ({short_filename(filename)}:{line})'
+            self.stdout.write(f'{ncalls:>10} {tottime:>10.4f} {cumtime:>10.4f} {tottime / total:>9.1%}  {function}')
+
+    def report_collapsed(self, paths, top, output):
+        stacks = Counter()
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    if stack and count.isdigit():
+                        stacks[stack] += int(count)
+
+        own = Counter()
+        inclusive = Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            # Рекурсивная функция считается в стеке один раз
+            for frame in set(frames):
+                inclusive[frame] += count
+        total = sum(stacks.values()) or 1
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'Снимки стека: профилей {len(paths)}, снимков {sum(stacks.values())}'
+        ))
+        for title, counter in (('собственные', own), ('включая вызванные', inclusive)):
+            self.stdout.write(f'{"снимков":>10} {"%":>6}  функция ({title})')
+            for frame, count in counter.most_common(top):
+                self.stdout.write(f'{count:>10} {count / total:>6.1%}  {frame}')
+
+        if output:
+            with open(output, 'w', encoding='utf-8') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f'{stack} {count}\n')
+            self.stdout.write(f'Объединенные стеки сохранены в {output}')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from users.reaper import purge_expired_sessions
+
+
+class Command(BaseCommand):
+    help = 'Удаляет истекшие сессии пачками (для секционированной таблицы - целыми секциями)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки')
+        parser.add_argument('--max-batches', type=int, default=None, help='Максимум пачек за запуск')
+        parser.add_argument('--pause', type=float, default=0, help='Пауза между пачками (секунды)')
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_sessions(
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+            pause=options['pause'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'✓ Удалено истекших сессий: {deleted}'))
@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from users.keyring import ASYMMETRIC_ALGORITHMS, JWTKeyring
+from users.utils import JWT_LIFETIME
+
+
+class Command(BaseCommand):
+    help = 'Создает новый ключ подписи JWT, старые ключи проверяют токены до их истечения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--algorithm',
+            choices=ASYMMETRIC_ALGORITHMS,
+            default=None,
+            help='Алгоритм ключа (по умолчанию JWT_ALGORITHM)'
+        )
+        parser.add_argument(
+            '--activate-in',
+            type=int,
+            default=0,
+            help='Через сколько секунд ключ начнет подписывать. Пока он только '
+                 'опубликован в JWKS, клиенты успевают обновить кэш'
+        )
+        parser.add_argument(
+            '--if-older-than',
+            type=int,
+            default=None,
+            help='Ротировать, только если текущий ключ старше указанного числа дней (для cron)'
+        )
+
+    def handle(self, *args, **options):
+        alg = options['algorithm'] or settings.JWT_ALGORITHM
+        if alg not in ASYMMETRIC_ALGORITHMS:
+            raise CommandError(f'JWT_ALGORITHM={alg} не использует ключи, укажите --algorithm')
+
+        path = settings.JWT_KEYRING_FILE
+        keyring = JWTKeyring.load(path)
+        now = timezone.now()
+
+        if options['if_older_than'] is not None:
+            newest = max(keyring.keys, key=lambda key: key.activates_at, default=None)
+            if newest is not None and newest.created_at > now - timedelta(days=options['if_older_than']):
+                self.stdout.write(f'Ключ {newest.kid} создан {newest.created_at:%Y-%m-%d}, ротация не нужна')
+                return
+
+        activates_at = now + timedelta(seconds=options['activate_in'])
+        key = keyring.rotate(alg, activates_at, overlap=JWT_LIFETIME, now=now)
+        keyring.save(path)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Создан ключ {key.kid} ({alg}), подписывает с {activates_at:%Y-%m-%d %H:%M:%S}'
+        ))
+        self.stdout.write(f'  Ключей в наборе: {len(keyring.keys)}')
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from auth_system.profiling import PROFILE_HEADER, sign_profile_request
+
+
+class Command(BaseCommand):
+    help = (
+        'Подписывает заголовок X-Profile: запросы к пути с этим заголовком '
+        'профилируются в течение PROFILING_HEADER_MAX_AGE секунд'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь запроса, например /api/auth/login/')
+
+    def handle(self, *args, **options):
+        if not settings.PROFILING_SIGNING_KEY:
+            raise CommandError('Не задан PROFILING_SIGNING_KEY')
+        self.stdout.write(f'{PROFILE_HEADER}: {sign_profile_request(options["path"])}')
@@ -1,32 +1,165 @@
-from django.utils.deprecation import MiddlewareMixin
-from users.utils import get_user_from_token, get_user_from_session_token
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+from auth_system.instrumentation import phase
+from auth_system.routers import set_current_user
+from users.auth_flow import set_session_cookie
+from users.utils import (
+    get_user_from_token,
+    aget_user_from_token,
+    get_principal_from_token,
+    aget_principal_from_token,
+    get_user_from_session_token,
+    aget_user_from_session_token,
+)
+from users.reaper import start_session_reaper
 
 
-class UserIdentificationMiddleware(MiddlewareMixin):
+def _get_bearer_token(request):
+    auth_header = request.META.get('HTTP_AUTHORIZATION', '')
+    if auth_header.startswith('Bearer '):
+        return auth_header.split('Bearer ')[1].strip()
+    return None
+
+
+def identify_user(request):
+    """Определяет пользователя по Bearer токену или cookie session_id"""
+    with phase('auth'):
+        user = _identify_user(request)
+    if user:
+        set_current_user(user.id)
+    return user
+
+
+async def aidentify_user(request):
+    """Асинхронный identify_user() на async ORM"""
+    with phase('auth'):
+        user = await _aidentify_user(request)
+    if user:
+        set_current_user(user.id)
+    return user
+
+
+def _identify_user(request):
+    # Проверяем Authorization header (JWT токен)
+    token = _get_bearer_token(request)
+    if token:
+        if settings.JWT_CLAIMS_MODE:
+            user = get_principal_from_token(token)
+        else:
+            user = get_user_from_token(token)
+        if user:
+            return user
+
+    # Проверяем cookie с session_id
+    session_token = request.COOKIES.get('session_id')
+    if session_token:
+        user = get_user_from_session_token(session_token)
+        if user:
+            _mark_session_refresh(request, session_token)
+            return user
+
+    return None
+
+
+async def _aidentify_user(request):
+    token = _get_bearer_token(request)
+    if token:
+        if settings.JWT_CLAIMS_MODE:
+            user = await aget_principal_from_token(token)
+        else:
+            user = await aget_user_from_token(token)
+        if user:
+            return user
+
+    session_token = request.COOKIES.get('session_id')
+    if session_token:
+        user = await aget_user_from_session_token(session_token)
+        if user:
+            _mark_session_refresh(request, session_token)
+            return user
+
+    return None
+
+
+def _mark_session_refresh(request, session_token):
+    # Сессия продлена, cookie в ответе продлевается вместе с ней
+    if settings.SESSION_ACTIVITY_TRACKING:
+        request.refresh_session_cookie = session_token
+
+
+def _refresh_session_cookie(request, response):
+    session_token = getattr(request, 'refresh_session_cookie', None)
+    # login и logout сами устанавливают или удаляют cookie
+    if session_token and 'session_id' not in response.cookies:
+        set_session_cookie(response, session_token)
+    return response
+
+
+async def _anonymous_user():
+    return None
+
+
+def _skip_identification(request, view_func):
+    if getattr(view_func, 'skip_user_identification', False):
+        request.user = None
+        request.auser = _anonymous_user
+
+
+class UserIdentificationMiddleware:
     """
     Middleware для идентификации пользователя из токена или сессии.
-    Проверяет Authorization header (Bearer token) или cookie session_id
+    Проверяет Authorization header (Bearer token) или cookie session_id.
+    При JWT_CLAIMS_MODE пользователь из Bearer токена строится по его claims.
+
+    Пользователь определяется лениво, при первом обращении к request.user,
+    и запоминается до конца запроса. Асинхронные представления получают
+    его через await request.auser() без блокирующих запросов к базе.
+    Для представлений, помеченных skip_user_identification, пользователь
+    всегда None.
+
+    Если пользователь определен по cookie и сессия продлена, ответ
+    продлевает и саму cookie: иначе браузер удалил бы ее через 7 дней
+    после входа, хотя сессия на сервере еще действует.
+
+    Работает в синхронном (WSGI) и асинхронном (ASGI) режиме без
+    переключения потоков.
     """
-    
-    def process_request(self, request):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Синхронный process_view Django выполнял бы в отдельном потоке
+            self.process_view = self.aprocess_view
+        # Middleware создается только в процессе сервера, не в management-командах
+        start_session_reaper()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
         # Сбрасываем request.user, чтобы использовать нашу систему
-        request.user = None
-        
-        # Проверяем Authorization header (JWT токен)
-        auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-        if auth_header.startswith('Bearer '):
-            token = auth_header.split('Bearer ')[1].strip()
-            user = get_user_from_token(token)
-            if user:
-                request.user = user
-                return None
-        
-        # Проверяем cookie с session_id
-        session_token = request.COOKIES.get('session_id')
-        if session_token:
-            user = get_user_from_session_token(session_token)
-            if user:
-                request.user = user
-        
+        request.user = SimpleLazyObject(lambda: identify_user(request))
+        return _refresh_session_cookie(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        request.user = SimpleLazyObject(lambda: identify_user(request))
+
+        async def auser():
+            if not hasattr(request, '_acached_user'):
+                request._acached_user = await aidentify_user(request)
+            return request._acached_user
+
+        request.auser = auser
+        return _refresh_session_cookie(request, await self.get_response(request))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _skip_identification(request, view_func)
         return None
 
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        _skip_identification(request, view_func)
+        return None
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_token_version'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='session',
+            name='user_sessio_session_baddb8_idx',
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='token_digest',
+            field=models.BinaryField(max_length=32, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='session',
+            name='session_token',
+            field=models.CharField(max_length=255, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,48 @@
+import hashlib
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_token_digests(apps, schema_editor):
+    """Досчитывает digest для сессий, не обработанных командой backfill_session_digests"""
+    Session = apps.get_model('users', 'Session')
+    db_alias = schema_editor.connection.alias
+    while True:
+        batch = list(
+            Session.objects.using(db_alias)
+            .filter(token_digest__isnull=True)
+            .exclude(session_token__isnull=True)
+            .order_by('id')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for session in batch:
+            session.token_digest = hashlib.sha256(session.session_token.encode('utf-8')).digest()
+            session.session_token = None
+        Session.objects.using(db_alias).bulk_update(batch, ['token_digest', 'session_token'])
+
+
+class Migration(migrations.Migration):
+
+    # Каждая пачка backfill фиксируется отдельно
+    atomic = False
+
+    dependencies = [
+        ('users', '0003_session_token_digest'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_token_digests, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='session',
+            name='session_token',
+        ),
+        migrations.AlterField(
+            model_name='session',
+            name='token_digest',
+            field=models.BinaryField(max_length=32, unique=True),
+        ),
+    ]
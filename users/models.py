@@ -1,7 +1,19 @@
+import time
+from functools import partial
+
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 from django.utils import timezone
-import bcrypt
+
+from auth_system.metrics import password_check_seconds
+from users.hashing import (
+    hash_password,
+    ahash_password,
+    verify_password,
+    averify_password,
+    password_needs_rehash,
+    rehash_in_background,
+)
 
 
 class UserManager(BaseUserManager):
@@ -15,6 +27,17 @@ class UserManager(BaseUserManager):
         user.save(using=self._db)
         return user
 
+    async def acreate_user(self, email, password=None, **extra_fields):
+        """Асинхронный create_user(): хеширование не блокирует event loop"""
+        if not email:
+            raise ValueError('The Email field must be set')
+        email = self.normalize_email(email)
+        user = self.model(email=email, **extra_fields)
+        if password:
+            await user.aset_password(password)
+        await user.asave(using=self._db)
+        return user
+
     def create_superuser(self, email, password=None, **extra_fields):
         extra_fields.setdefault('is_staff', True)
         extra_fields.setdefault('is_superuser', True)
@@ -51,27 +74,80 @@ class User(AbstractBaseUser):
         related_name='users'
     )
     
+    # Версия данных авторизации, сверяется с claims в JWT
+    token_version = models.PositiveIntegerField(default=1)
+    
     objects = UserManager()
     
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
     
+    # Поля, изменение которых делает устаревшими claims в выданных токенах
+    AUTH_STATE_FIELDS = ('role_id', 'is_superuser', 'is_staff', 'is_active')
+    
     class Meta:
         db_table = 'users'
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._auth_state = instance._get_auth_state()
+        return instance
+    
+    def _get_auth_state(self):
+        return tuple(self.__dict__.get(field) for field in self.AUTH_STATE_FIELDS)
+    
+    def save(self, *args, **kwargs):
+        """Увеличивает token_version, если изменились данные авторизации"""
+        loaded_state = getattr(self, '_auth_state', None)
+        if loaded_state is not None and loaded_state != self._get_auth_state():
+            self.token_version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'token_version'}
+        super().save(*args, **kwargs)
+        self._auth_state = self._get_auth_state()
+    
     def set_password(self, raw_password):
-        """Хеширует пароль с помощью bcrypt"""
-        salt = bcrypt.gensalt()
-        self.password_hash = bcrypt.hashpw(raw_password.encode('utf-8'), salt).decode('utf-8')
+        """Хеширует пароль алгоритмом из PASSWORD_HASHER (в пуле хеширования)"""
+        self.password_hash = hash_password(raw_password)
+    
+    async def aset_password(self, raw_password):
+        self.password_hash = await ahash_password(raw_password)
     
     def check_password(self, raw_password):
-        """Проверяет пароль"""
+        """
+        Проверяет пароль (в пуле хеширования).
+        Если хеш создан устаревшим алгоритмом или с другими параметрами,
+        после успешной проверки он пересчитывается в фоне.
+        """
+        if not self.password_hash:
+            return False
+        started = time.perf_counter()
+        valid = verify_password(raw_password, self.password_hash)
+        password_check_seconds.observe(time.perf_counter() - started)
+        if not valid:
+            return False
+        if self.pk and password_needs_rehash(self.password_hash):
+            rehash_in_background(raw_password, partial(self._store_rehashed_password, self.password_hash))
+        return True
+    
+    async def acheck_password(self, raw_password):
+        """Асинхронный check_password()"""
         if not self.password_hash:
             return False
-        return bcrypt.checkpw(
-            raw_password.encode('utf-8'),
-            self.password_hash.encode('utf-8')
-        )
+        started = time.perf_counter()
+        valid = await averify_password(raw_password, self.password_hash)
+        password_check_seconds.observe(time.perf_counter() - started)
+        if not valid:
+            return False
+        if self.pk and password_needs_rehash(self.password_hash):
+            rehash_in_background(raw_password, partial(self._store_rehashed_password, self.password_hash))
+        return True
+    
+    def _store_rehashed_password(self, old_hash, new_hash):
+        # Обновляем, только если пароль не сменили, пока считался новый хеш
+        User.objects.filter(pk=self.pk, password_hash=old_hash).update(password_hash=new_hash)
     
     @property
     def password(self):
@@ -105,7 +181,8 @@ class Session(models.Model):
         on_delete=models.CASCADE,
         related_name='sessions'
     )
-    session_token = models.CharField(max_length=255, unique=True)
+    # SHA-256 от идентификатора сессии из cookie, сам идентификатор не хранится
+    token_digest = models.BinaryField(max_length=32, unique=True)
     expires_at = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
     last_activity = models.DateTimeField(auto_now=True)
@@ -113,8 +190,9 @@ class Session(models.Model):
     class Meta:
         db_table = 'user_sessions'
         indexes = [
-            models.Index(fields=['session_token']),
             models.Index(fields=['user', 'expires_at']),
+            # Для пакетного удаления истекших сессий
+            models.Index(fields=['expires_at']),
         ]
     
     def __str__(self):
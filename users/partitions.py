@@ -0,0 +1,156 @@
+"""
+Секционирование таблицы user_sessions по expires_at (только PostgreSQL).
+
+Таблица преобразуется командой partition_sessions. После этого истекшие
+сессии удаляются целыми секциями (DROP TABLE), а не построчно.
+
+Уникальный ключ секционированной таблицы обязан включать expires_at,
+поэтому база проверяет только уникальность пары (token_digest, expires_at).
+token_digest - SHA-256 случайного идентификатора, совпадение двух дайджестов
+практически невозможно, и поиск сессии по нему остается однозначным.
+"""
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from users.models import Session
+
+
+TABLE = Session._meta.db_table
+SEQUENCE = f'{TABLE}_part_id_seq'
+DEFAULT_PARTITION = f'{TABLE}_default'
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+_UPPER_BOUND_RE = re.compile(r"TO \('([^']+)'\)")
+
+
+def is_supported():
+    return connection.vendor == 'postgresql'
+
+
+def is_partitioned():
+    """Проверяет, секционирована ли таблица сессий"""
+    if not is_supported():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table p '
+            'JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s',
+            [TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def period_start(moment, interval_days):
+    """Начало периода секции, в который попадает moment"""
+    interval = timedelta(days=interval_days)
+    return EPOCH + ((moment - EPOCH) // interval) * interval
+
+
+def ensure_partitions(interval_days, periods_ahead, now=None):
+    """
+    Создает секции от текущего периода на periods_ahead периодов вперед.
+    Сессии, попавшие в секцию DEFAULT, пока секции их периода не было,
+    переносятся в новую секцию: иначе PostgreSQL не даст ее создать.
+    """
+    now = now or timezone.now()
+    start = period_start(now, interval_days)
+    created = []
+    with connection.cursor() as cursor:
+        for _ in range(periods_ahead + 1):
+            end = start + timedelta(days=interval_days)
+            name = f'{TABLE}_p{start:%Y%m%d}'
+            cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [name])
+            if not cursor.fetchone()[0]:
+                _create_partition(cursor, name, start, end)
+            created.append(name)
+            start = end
+    return created
+
+
+def _create_partition(cursor, name, start, end):
+    with transaction.atomic():
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE expires_at >= %s AND expires_at < %s)',
+            [start, end]
+        )
+        has_default_rows = cursor.fetchone()[0]
+        if has_default_rows:
+            cursor.execute(f'CREATE TEMP TABLE {TABLE}_moved (LIKE {TABLE}) ON COMMIT DROP')
+            cursor.execute(
+                f'WITH moved AS ('
+                f'  DELETE FROM {DEFAULT_PARTITION} WHERE expires_at >= %s AND expires_at < %s RETURNING *'
+                f') INSERT INTO {TABLE}_moved SELECT * FROM moved',
+                [start, end]
+            )
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)',
+            [start, end]
+        )
+        if has_default_rows:
+            cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_moved')
+
+
+def drop_expired_partitions(now=None):
+    """Удаляет секции, все строки которых уже истекли. Возвращает их имена"""
+    now = now or timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) '
+            'FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid '
+            'JOIN pg_class p ON p.oid = i.inhparent '
+            'WHERE p.relname = %s',
+            [TABLE]
+        )
+        partitions = cursor.fetchall()
+
+        dropped = []
+        for name, bound in partitions:
+            match = _UPPER_BOUND_RE.search(bound or '')
+            if not match:
+                continue  # секция DEFAULT
+            upper = parse_datetime(match.group(1))
+            if upper is not None and upper <= now:
+                cursor.execute(f'DROP TABLE {name}')
+                dropped.append(name)
+    return dropped
+
+
+def convert_to_partitioned(interval_days, periods_ahead):
+    """
+    Преобразует user_sessions в таблицу, секционированную по expires_at.
+    Действующие сессии переносятся, истекшие отбрасываются.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_legacy')
+        cursor.execute(f'CREATE SEQUENCE {SEQUENCE}')
+        # Ключи секционированной таблицы обязаны включать expires_at
+        cursor.execute(
+            f'CREATE TABLE {TABLE} ('
+            f"  id bigint NOT NULL DEFAULT nextval('{SEQUENCE}'),"
+            f'  user_id bigint NOT NULL REFERENCES users (id) DEFERRABLE INITIALLY DEFERRED,'
+            f'  token_digest bytea NOT NULL,'
+            f'  expires_at timestamp with time zone NOT NULL,'
+            f'  created_at timestamp with time zone NOT NULL,'
+            f'  last_activity timestamp with time zone NOT NULL,'
+            f'  PRIMARY KEY (id, expires_at),'
+            f'  UNIQUE (token_digest, expires_at)'
+            f') PARTITION BY RANGE (expires_at)'
+        )
+        cursor.execute(f'ALTER SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id')
+        cursor.execute(f'CREATE INDEX {TABLE}_user_expires_idx ON {TABLE} (user_id, expires_at)')
+        cursor.execute(f'CREATE INDEX {TABLE}_expires_idx ON {TABLE} (expires_at)')
+        cursor.execute(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT')
+        ensure_partitions(interval_days, periods_ahead)
+
+        cursor.execute(
+            f'INSERT INTO {TABLE} (id, user_id, token_digest, expires_at, created_at, last_activity) '
+            f'SELECT id, user_id, token_digest, expires_at, created_at, last_activity '
+            f'FROM {TABLE}_legacy WHERE expires_at > now()'
+        )
+        cursor.execute(f"SELECT setval('{SEQUENCE}', (SELECT COALESCE(MAX(id), 0) + 1 FROM {TABLE}_legacy), false)")
+        cursor.execute(f'DROP TABLE {TABLE}_legacy')
@@ -0,0 +1,40 @@
+from users.models import User
+
+
+class TokenPrincipal:
+    """
+    Пользователь, восстановленный из claims JWT без обращения к базе данных.
+    Полная запись User загружается только при обращении к остальным атрибутам.
+    """
+    is_authenticated = True
+    is_anonymous = False
+    # Деактивация увеличивает token_version, а удаление убирает версию из кэша,
+    # поэтому claims неактивного пользователя сюда не попадают
+    is_active = True
+
+    def __init__(self, user_id, role_id, is_superuser):
+        self._user = None
+        self.id = user_id
+        self.pk = user_id
+        self.role_id = role_id
+        self.is_superuser = is_superuser
+
+    def get_user(self):
+        """Загружает полную запись пользователя"""
+        if self._user is None:
+            self._user = User.objects.get(id=self.id)
+        return self._user
+
+    async def aget_user(self):
+        if self._user is None:
+            self._user = await User.objects.aget(id=self.id)
+        return self._user
+
+    def __getattr__(self, name):
+        # Вызывается только для атрибутов, которых нет у principal
+        if name == '_user':
+            raise AttributeError(name)
+        return getattr(self.get_user(), name)
+
+    def __str__(self):
+        return f'TokenPrincipal({self.id})'
@@ -0,0 +1,100 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from users import partitions
+from users.models import Session
+
+
+logger = logging.getLogger(__name__)
+
+
+def purge_expired_sessions(batch_size=1000, max_batches=None, pause=0):
+    """
+    Удаляет истекшие сессии пачками по batch_size строк.
+    Для секционированной таблицы сначала создаются секции на будущие
+    периоды и удаляются целиком истекшие секции.
+
+    Returns:
+        int: количество удаленных сессий (без учета удаленных секций)
+    """
+    now = timezone.now()
+    if partitions.is_partitioned():
+        # Без секций на будущее новые сессии копились бы в секции DEFAULT
+        partitions.ensure_partitions(
+            settings.SESSION_PARTITION_INTERVAL_DAYS,
+            settings.SESSION_PARTITION_PERIODS_AHEAD,
+            now
+        )
+        dropped = partitions.drop_expired_partitions(now)
+        if dropped:
+            logger.info('Удалены секции сессий: %s', ', '.join(dropped))
+
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            # SKIP LOCKED позволяет нескольким процессам чистить таблицу одновременно
+            ids = list(
+                Session.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=now)
+                .order_by('expires_at')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            deleted, _ = Session.objects.filter(id__in=ids).delete()
+        total += deleted
+        batches += 1
+        if pause:
+            time.sleep(pause)
+    return total
+
+
+class SessionReaper:
+    """
+    Периодически удаляет истекшие сессии в фоновом потоке.
+    Для секционированной таблицы также создает секции на будущие периоды.
+    """
+
+    def __init__(self, interval, batch_size, max_batches):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='session-reaper', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                deleted = purge_expired_sessions(self.batch_size, self.max_batches)
+                if deleted:
+                    logger.info('Удалено истекших сессий: %s', deleted)
+            except Exception:
+                logger.exception('Не удалось удалить истекшие сессии')
+            finally:
+                connection.close()
+
+
+session_reaper = SessionReaper(
+    interval=settings.SESSION_REAPER_INTERVAL,
+    batch_size=settings.SESSION_REAPER_BATCH_SIZE,
+    max_batches=settings.SESSION_REAPER_MAX_BATCHES,
+)
+
+
+def start_session_reaper():
+    """Запускает фоновую очистку, если она включена настройкой SESSION_REAPER_INTERVAL"""
+    if settings.SESSION_REAPER_INTERVAL > 0:
+        session_reaper.start()
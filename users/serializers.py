@@ -1,6 +1,10 @@
 from rest_framework import serializers
 from users.models import User
 from permissions.models import Role
+from permissions.matrix import get_matrix
+
+
+EMAIL_EXISTS_ERROR = "Пользователь с таким email уже существует"
 
 
 class UserRegistrationSerializer(serializers.Serializer):
@@ -17,8 +21,9 @@ class UserRegistrationSerializer(serializers.Serializer):
         return attrs
     
     def validate_email(self, value):
-        if User.objects.filter(email=value).exists():
-            raise serializers.ValidationError("Пользователь с таким email уже существует")
+        # Асинхронная регистрация проверяет email сама, через async ORM
+        if self.context.get('check_email_exists', True) and User.objects.filter(email=value).exists():
+            raise serializers.ValidationError(EMAIL_EXISTS_ERROR)
         return value
 
 
@@ -28,13 +33,21 @@ class UserLoginSerializer(serializers.Serializer):
 
 
 class UserProfileSerializer(serializers.ModelSerializer):
-    role_name = serializers.CharField(source='role.name', read_only=True)
+    role_name = serializers.SerializerMethodField()
     
     class Meta:
         model = User
         fields = ['id', 'email', 'first_name', 'last_name', 'middle_name', 
                   'role', 'role_name', 'date_joined', 'is_active']
         read_only_fields = ['id', 'email', 'date_joined', 'is_active']
+    
+    def get_role_name(self, obj):
+        # Имя роли берется из матрицы прав, без отдельного запроса к roles.
+        # Асинхронные представления передают матрицу в context
+        if not obj.role_id:
+            return None
+        matrix = self.context.get('matrix') or get_matrix()
+        return matrix.get_role_name(obj.role_id)
 
 
 class UserUpdateSerializer(serializers.ModelSerializer):
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.models import User
+from users.utils import cache_token_version, forget_token_version
+
+
+@receiver(post_save, sender=User)
+def refresh_token_version(sender, instance, **kwargs):
+    """Обновляет закэшированную версию, чтобы устаревшие claims не принимались"""
+    cache_token_version(instance)
+
+
+@receiver(post_delete, sender=User)
+def drop_token_version(sender, instance, **kwargs):
+    """Токены удаленного пользователя не должны приниматься по claims"""
+    forget_token_version(instance.id)
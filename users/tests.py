@@ -1,3 +1,467 @@
-from django.test import TestCase
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from auth_system import metrics, profiling, routers
+from auth_system.benchmarks import QUERY_BUDGETS, find_regressions, get_query_budget, run_micro
+from auth_system.db import base as db_base
+from auth_system.instrumentation import QueryBudgetExceeded
+from permissions.matrix import bump_version
+from permissions.models import Role
+from users import partitions
+from users import keyring as users_keyring
+from users import views as users_views
+from users.activity import ActivityBuffer
+from users.hashing import HashPoolBusy, password_hash_pool, rehash_in_background
+from users.keyring import JWTKeyring
+from users.models import User, Session
+from users.principal import TokenPrincipal
+from users.throttling import get_client_ip
+from users.utils import (
+    SESSION_LIFETIME,
+    check_claims_cache,
+    create_session,
+    get_principal_from_token,
+    hash_session_token,
+    issue_jwt_token,
+)
+
+
+class ClientIpTests(SimpleTestCase):
+    """Ключ лимита попыток входа по адресу клиента"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def request(self, forwarded=None):
+        extra = {'REMOTE_ADDR': '10.0.0.1'}
+        if forwarded is not None:
+            extra['HTTP_X_FORWARDED_FOR'] = forwarded
+        return self.factory.post('/api/auth/login/', **extra)
+
+    def test_forwarded_for_ignored_without_trusted_proxy(self):
+        with override_settings(LOGIN_THROTTLE_TRUST_X_FORWARDED_FOR=False):
+            self.assertEqual(get_client_ip(self.request('1.1.1.1')), '10.0.0.1')
+
+    @override_settings(LOGIN_THROTTLE_TRUST_X_FORWARDED_FOR=True, LOGIN_THROTTLE_TRUSTED_PROXY_COUNT=1)
+    def test_client_cannot_spoof_leftmost_entry(self):
+        self.assertEqual(get_client_ip(self.request('6.6.6.6, 203.0.113.7')), '203.0.113.7')
+        self.assertEqual(get_client_ip(self.request('7.7.7.7, 203.0.113.7')), '203.0.113.7')
+
+    @override_settings(LOGIN_THROTTLE_TRUST_X_FORWARDED_FOR=True, LOGIN_THROTTLE_TRUSTED_PROXY_COUNT=2)
+    def test_entry_counted_from_the_right(self):
+        self.assertEqual(get_client_ip(self.request('6.6.6.6, 203.0.113.7, 10.0.0.2')), '203.0.113.7')
+
+    @override_settings(LOGIN_THROTTLE_TRUST_X_FORWARDED_FOR=True, LOGIN_THROTTLE_TRUSTED_PROXY_COUNT=2)
+    def test_short_header_falls_back_to_remote_addr(self):
+        self.assertEqual(get_client_ip(self.request('203.0.113.7')), '10.0.0.1')
+        self.assertEqual(get_client_ip(self.request()), '10.0.0.1')
+
+
+@override_settings(REPLICA_DATABASES=['replica1'], DB_REPLICA_PIN_SECONDS=5)
+class ReplicaRoutingTests(SimpleTestCase):
+    """Чтение с реплики и закрепление за основной базой после записи"""
+
+    def setUp(self):
+        self.router = routers.PrimaryReplicaRouter()
+        routers.start_request(pinned=False)
+        self.addCleanup(routers.start_request, pinned=False)
+        cache.delete(routers._user_pin_key(42))
+
+    def test_read_goes_to_replica_until_write(self):
+        self.assertEqual(self.router.db_for_read(User), 'replica1')
+        self.assertEqual(self.router.db_for_write(User), 'default')
+        self.assertEqual(self.router.db_for_read(User), 'default')
+        self.assertTrue(routers.finish_request())
+
+    def test_pin_cookie_reads_primary(self):
+        routers.start_request(pinned=True)
+        self.assertEqual(self.router.db_for_read(User), 'default')
+        self.assertFalse(routers.finish_request())
+
+    def test_user_write_pins_next_request(self):
+        routers.set_current_user(42)
+        self.router.db_for_write(User)
+        routers.finish_request()
+
+        # Следующий запрос того же пользователя без cookie db_pin
+        routers.start_request(pinned=False)
+        routers.pin_if_user_wrote(7)
+        self.assertEqual(self.router.db_for_read(User), 'replica1')
+        routers.pin_if_user_wrote(42)
+        self.assertEqual(self.router.db_for_read(User), 'default')
+
+    def test_read_without_write_does_not_pin_user(self):
+        routers.set_current_user(42)
+        self.router.db_for_read(User)
+        self.assertFalse(routers.finish_request())
+        self.assertIsNone(cache.get(routers._user_pin_key(42)))
+
+    def test_user_pin_expires(self):
+        routers.set_current_user(42)
+        self.router.db_for_write(User)
+        with mock.patch('auth_system.routers.cache') as pin_cache:
+            routers.finish_request()
+        pin_cache.set.assert_called_once_with(routers._user_pin_key(42), True, 5)
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_no_replicas(self):
+        self.assertIsNone(self.router.db_for_read(User))
+        self.assertEqual(self.router.db_for_write(User), 'default')
+        self.assertFalse(routers.finish_request())
+
+
+class PurgeSessionsTests(TestCase):
+    """Очистка истекших сессий"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='purge@example.com', password='password123')
+
+    def test_purge_deletes_only_expired_sessions(self):
+        now = timezone.now()
+        Session.objects.create(user=self.user, token_digest=hash_session_token('old'), expires_at=now - timedelta(seconds=1))
+        Session.objects.create(user=self.user, token_digest=hash_session_token('new'), expires_at=now + timedelta(days=1))
+        call_command('purge_sessions', stdout=StringIO())
+        self.assertEqual(
+            list(Session.objects.values_list('token_digest', flat=True)),
+            [hash_session_token('new')]
+        )
+
+    def test_purge_creates_future_partitions(self):
+        # Cron с purge_sessions без фоновой очистки тоже должен создавать секции
+        with mock.patch.object(partitions, 'is_partitioned', return_value=True), \
+                mock.patch.object(partitions, 'ensure_partitions') as ensure, \
+                mock.patch.object(partitions, 'drop_expired_partitions', return_value=[]):
+            call_command('purge_sessions', stdout=StringIO())
+        ensure.assert_called_once()
+
+
+class BenchmarkTests(TestCase):
+    """Набор бенчмарков и проверка регрессий"""
+
+    def test_find_regressions(self):
+        result = {'queries': 1, 'errors': 0, 'p50_ms': 1.0, 'p95_ms': 2.0}
+        baseline = {'GET /api/auth/profile/': {'queries': 1, 'p50_ms': 1.0, 'p95_ms': 1.0}}
+        self.assertEqual(find_regressions({'GET /api/auth/profile/': result}, {}, 0.25), [])
+
+        problems = find_regressions({'GET /api/auth/profile/': result}, baseline, 0.25)
+        self.assertEqual(len(problems), 1)
+        self.assertIn('p95_ms', problems[0])
+
+        over_budget = {**result, 'queries': QUERY_BUDGETS['has_permission'] + 1}
+        self.assertIn('бюджет', find_regressions({'has_permission': over_budget}, {}, 0.25)[0])
+
+    def test_run_micro_counts_queries(self):
+        user = User.objects.create_user(email='bench@example.com', password='password123')
+        result = run_micro('get_user', lambda: User.objects.get(pk=user.pk), iterations=20, warmup=1)
+        self.assertEqual(result.iterations, 20)
+        self.assertEqual(result.queries, 1)
+        self.assertGreater(result.ops_per_sec, 0)
+
+    def test_existing_db_requires_benchmark_user(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark', use_existing_db=True, stdout=StringIO())
+        self.assertFalse(User.objects.filter(email='admin@example.com').exists())
+
+
+@override_settings(REQUEST_INSTRUMENTATION=True, QUERY_BUDGET_RAISE=True)
+class QueryBudgetTests(TestCase):
+    """Бюджеты запросов представлений"""
+
+    def setUp(self):
+        role = Role.objects.create(name='budget_role')
+        self.user = User.objects.create_user(email='budget@example.com', password='password123', role=role)
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {issue_jwt_token(self.user)}'}
+
+    def test_matrix_rebuild_is_not_counted(self):
+        # Первый запрос после изменения правил пересобирает матрицу прав
+        bump_version()
+        response = self.client.get('/api/auth/profile/', **self.auth)
+        self.assertEqual(response.status_code, 200)
+
+    def test_over_budget_raises(self):
+        with mock.patch.object(users_views.profile, 'query_budget', 0):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/api/auth/profile/', **self.auth)
+
+    def test_benchmark_budget_comes_from_view(self):
+        self.assertEqual(get_query_budget('GET /api/auth/profile/'), users_views.profile.query_budget)
+        self.assertEqual(get_query_budget('POST /api/auth/login/'), 2)
+
+
+class KeyringTests(SimpleTestCase):
+    """Ротация и хранение ключей подписи JWT"""
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = os.path.join(tmp_dir.name, 'keyring.json')
+
+    def test_rotation_keeps_old_key_for_verification(self):
+        now = timezone.now()
+        keyring = JWTKeyring([])
+        old = keyring.rotate('EdDSA', now - timedelta(days=1), overlap=timedelta(days=7), now=now)
+        new = keyring.rotate('EdDSA', now, overlap=timedelta(days=7), now=now)
+
+        self.assertEqual(keyring.get_signing_key(now + timedelta(seconds=1)).kid, new.kid)
+        self.assertIsNotNone(keyring.get_verification_key(old.kid, now + timedelta(days=6)))
+        self.assertIsNone(keyring.get_verification_key(old.kid, now + timedelta(days=8)))
+
+    def test_save_is_atomic_and_private(self):
+        keyring = JWTKeyring([])
+        key = keyring.rotate('EdDSA', timezone.now(), overlap=timedelta(days=7))
+        keyring.save(self.path)
+
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+        self.assertEqual([k.kid for k in JWTKeyring.load(self.path).keys], [key.kid])
+        # Временные файлы не остаются рядом с файлом ключей
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['keyring.json'])
+
+    def test_broken_file_keeps_previous_keys(self):
+        keyring = JWTKeyring([])
+        keyring.rotate('EdDSA', timezone.now(), overlap=timedelta(days=7))
+        keyring.save(self.path)
+        with override_settings(JWT_KEYRING_FILE=self.path), \
+                mock.patch.object(users_keyring, '_keyring', None), \
+                mock.patch.object(users_keyring, '_checked_at', 0.0):
+            loaded = users_keyring.get_keyring()
+            with open(self.path, 'w') as f:
+                f.write('{"keys": [')
+            os.utime(self.path, (time.time() + 10, time.time() + 10))
+            users_keyring._checked_at = 0.0
+            with self.assertLogs('users.keyring', 'ERROR'):
+                self.assertIs(users_keyring.get_keyring(), loaded)
+
+
+class LogoutTests(TestCase):
+    """Выход удаляет только сессию из cookie"""
+
+    def test_logout_deletes_cookie_session_only(self):
+        user = User.objects.create_user(email='logout@example.com', password='password123')
+        session_id = create_session(user)
+        self.client.cookies['session_id'] = session_id
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                '/api/auth/logout/', HTTP_AUTHORIZATION=f'Bearer {issue_jwt_token(user)}'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Session.objects.filter(token_digest=hash_session_token(session_id)).exists())
+        # Один DELETE по дайджесту cookie, без попытки удалить сессию по JWT
+        deletes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 1)
+
+
+@override_settings(JWT_CLAIMS_MODE=True)
+class TokenClaimsTests(TestCase):
+    """Claims принимаются только пока версия в кэше совпадает с версией в токене"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='claims@example.com', password='password123')
+        self.token = issue_jwt_token(self.user)
+
+    def test_current_claims_skip_database(self):
+        with self.assertNumQueries(0):
+            principal = get_principal_from_token(self.token)
+        self.assertIsInstance(principal, TokenPrincipal)
+        self.assertEqual(principal.id, self.user.id)
+
+    def test_deactivation_invalidates_claims(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(get_principal_from_token(self.token))
+
+    def test_role_change_reloads_user(self):
+        self.user.role = Role.objects.create(name='claims-role')
+        self.user.save()
+        principal = get_principal_from_token(self.token)
+        self.assertIsInstance(principal, User)
+        self.assertEqual(principal.role_id, self.user.role_id)
+
+    def test_deleted_user_claims_rejected(self):
+        self.user.delete()
+        self.assertIsNone(get_principal_from_token(self.token))
+
+    def test_local_memory_cache_rejected(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=locmem):
+            with self.assertRaises(ImproperlyConfigured):
+                check_claims_cache()
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://'}}
+        with override_settings(CACHES=shared):
+            check_claims_cache()
+
+
+class PasswordHashPoolTests(SimpleTestCase):
+    """Пул хеширования публикует метрики и не пишет в базу своими потоками"""
+
+    def test_stats_exported_as_metrics(self):
+        password_hash_pool.run(len, 'password')
+        output = metrics.generate_latest()
+        self.assertIn('auth_password_hash_queue_depth 0', output)
+        self.assertIn('auth_password_hash_running 0', output)
+        self.assertIn('auth_password_hash_seconds_count{stage="run"}', output)
+        self.assertIn('auth_password_hash_seconds_count{stage="wait"}', output)
+
+    @override_settings(PASSWORD_HASHER='fast')
+    def test_rehash_stored_outside_hash_pool(self):
+        stored = threading.Event()
+        threads = []
+
+        def on_rehashed(new_hash):
+            threads.append(threading.current_thread().name)
+            stored.set()
+
+        self.assertTrue(rehash_in_background('password123', on_rehashed))
+        self.assertTrue(stored.wait(5))
+        self.assertTrue(threads[0].startswith('password-rehash-write'))
+
+
+class PoolMetricsTests(SimpleTestCase):
+    """Состояние пула соединений попадает в /metrics"""
+
+    def test_pool_state_exported(self):
+        pool = mock.Mock()
+        pool.get_stats.return_value = {'pool_size': 4, 'pool_available': 3, 'requests_waiting': 0}
+        db_base.PoolWaitStats(slow_threshold=1).record('metrics-test', 0.002)
+        db_base._publish_pool_state('metrics-test', pool)
+        output = metrics.generate_latest()
+        self.assertIn('db_pool_connections{alias="metrics-test",state="size"} 4', output)
+        self.assertIn('db_pool_connections{alias="metrics-test",state="available"} 3', output)
+        self.assertIn('db_pool_requests_waiting{alias="metrics-test"} 0', output)
+        self.assertIn('db_pool_wait_seconds_count{alias="metrics-test"} 1', output)
+
+
+@override_settings(PASSWORD_HASHER='fast', LOGIN_THROTTLE_ENABLED=False)
+class LoginTests(TestCase):
+    """Ответы входа из общих помощников users.auth_flow"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='login@example.com', password='password123')
+
+    def _login(self, password):
+        return self.client.post(
+            '/api/auth/login/', {'email': 'login@example.com', 'password': password},
+            content_type='application/json'
+        )
+
+    def test_success_sets_session_cookie(self):
+        response = self._login('password123')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('token', response.json())
+        self.assertTrue(response.cookies['session_id'].value)
+
+    def test_wrong_password(self):
+        self.assertEqual(self._login('wrong').status_code, 401)
+
+    def test_disabled_account(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self._login('password123')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json(), {'error': 'Аккаунт деактивирован'})
+
+    def test_hash_pool_busy(self):
+        with mock.patch.object(User, 'check_password', side_effect=HashPoolBusy), \
+                mock.patch.object(User, 'acheck_password', side_effect=HashPoolBusy):
+            response = self._login('password123')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+
+
+class SessionActivityTests(TestCase):
+    """Продление сессии по cookie и отложенная запись активности"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='activity@example.com', password='password123')
+
+    def test_digest_lookup_refreshes_cookie(self):
+        session_id = create_session(self.user)
+        self.client.cookies['session_id'] = session_id
+        response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['email'], 'activity@example.com')
+        cookie = response.cookies['session_id']
+        self.assertEqual(cookie.value, session_id)
+        self.assertEqual(cookie['max-age'], int(SESSION_LIFETIME.total_seconds()))
+
+    def test_unknown_cookie_not_refreshed(self):
+        self.client.cookies['session_id'] = 'unknown'
+        response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response.status_code, 401)
+        self.assertNotIn('session_id', response.cookies)
+
+    def test_failed_flush_requeues_entries(self):
+        buffer = ActivityBuffer(flush_interval=60, flush_size=100, max_pending=2)
+        now = timezone.now()
+        buffer._sessions = {1: (now, now), 2: (now, now)}
+        buffer._logins = {self.user.id: now}
+        with mock.patch('users.activity._update_sessions', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                buffer.flush()
+        # Сессии вернулись в буфер, вход сверх max_pending отброшен
+        self.assertEqual(set(buffer._sessions), {1, 2})
+        self.assertEqual(buffer._logins, {})
+        self.assertEqual(buffer.dropped, 1)
+
+    def test_requeue_keeps_newer_entry(self):
+        buffer = ActivityBuffer(flush_interval=60, flush_size=100, max_pending=10)
+        old, new = timezone.now() - timedelta(minutes=1), timezone.now()
+        buffer._sessions = {1: (old, old)}
+
+        def update_sessions(sessions):
+            # Пока шла запись, пришла новая активность той же сессии
+            buffer._sessions[1] = (new, new)
+            raise RuntimeError
+
+        with mock.patch('users.activity._update_sessions', side_effect=update_sessions):
+            with self.assertRaises(RuntimeError):
+                buffer.flush()
+        self.assertEqual(buffer._sessions, {1: (new, new)})
+
+
+class ProfileSpoolTests(SimpleTestCase):
+    """Лимит файлов профилей считается без os.listdir при каждом сохранении"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def _save(self):
+        profiler = profiling.RequestProfiler('cprofile')
+        profiler.start()
+        profiler.stop()
+        return profiler.save('spool-test')
+
+    def test_limit_without_listing_directory(self):
+        with override_settings(PROFILING_DIR=self.directory, PROFILING_MAX_FILES=2), \
+                mock.patch.object(profiling, '_spool', profiling.SpoolCounter()), \
+                mock.patch('auth_system.profiling.os.listdir', wraps=os.listdir) as listdir:
+            self.assertIsNotNone(self._save())
+            self.assertIsNotNone(self._save())
+            self.assertIsNone(self._save())
+        self.assertEqual(listdir.call_count, 1)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+    def test_rescan_sees_removed_files(self):
+        counter = profiling.SpoolCounter()
+        self.assertTrue(counter.reserve(self.directory, 1))
+        open(os.path.join(self.directory, 'a.prof'), 'w').close()
+        self.assertFalse(counter.reserve(self.directory, 1))
+        os.unlink(os.path.join(self.directory, 'a.prof'))
+        with mock.patch('auth_system.profiling.time.monotonic', return_value=time.monotonic() + profiling.SPOOL_RESCAN_INTERVAL):
+            self.assertTrue(counter.reserve(self.directory, 1))
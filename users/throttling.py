@@ -0,0 +1,131 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class LocalTokenBucket:
+    """
+    Token bucket в памяти процесса: limit попыток за period секунд.
+    Хранит не более max_keys ключей, давно не использованные вытесняются.
+    """
+
+    def __init__(self, limit, period, max_keys=100000):
+        self.capacity = float(limit)
+        self.rate = limit / period
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        """Списывает попытку. Возвращает (разрешено, секунд до следующей попытки)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        if allowed:
+            return True, 0
+        return False, math.ceil((1 - tokens) / self.rate)
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+
+class CacheSlidingWindow:
+    """
+    Скользящее окно на общем кэше Django (Redis, Memcached), чтобы лимит
+    действовал сразу для всех процессов. Число попыток в окне оценивается
+    по счетчикам текущего и предыдущего окна.
+    """
+
+    def __init__(self, limit, period, cache_alias):
+        self.limit = limit
+        self.period = period
+        self.cache = caches[cache_alias]
+
+    def _key(self, key, window):
+        return f'login_throttle:{key}:{window}'
+
+    def hit(self, key):
+        now = time.time()
+        window = int(now // self.period)
+        current_key = self._key(key, window)
+        self.cache.add(current_key, 0, self.period * 2)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            # Ключ успели вытеснить между add и incr
+            self.cache.set(current_key, 1, self.period * 2)
+            current = 1
+        previous = self.cache.get(self._key(key, window - 1), 0)
+        elapsed = now - window * self.period
+        estimated = previous * (1 - elapsed / self.period) + current
+        if estimated <= self.limit:
+            return True, 0
+        return False, math.ceil(self.period - elapsed)
+
+    def reset(self, key):
+        window = int(time.time() // self.period)
+        self.cache.delete_many([self._key(key, window), self._key(key, window - 1)])
+
+
+def _build_limiter(limit):
+    period = settings.LOGIN_THROTTLE_PERIOD
+    if settings.LOGIN_THROTTLE_CACHE:
+        return CacheSlidingWindow(limit, period, settings.LOGIN_THROTTLE_CACHE)
+    return LocalTokenBucket(limit, period, settings.LOGIN_THROTTLE_MAX_KEYS)
+
+
+class LoginThrottle:
+    """Ограничивает число попыток входа по email и по адресу клиента"""
+
+    def __init__(self):
+        self.email_limiter = _build_limiter(settings.LOGIN_THROTTLE_EMAIL_LIMIT)
+        self.ip_limiter = _build_limiter(settings.LOGIN_THROTTLE_IP_LIMIT)
+
+    def check(self, email, client_ip):
+        """
+        Списывает попытку входа.
+
+        Returns:
+            int: 0, если попытка разрешена, иначе секунды до следующей попытки
+        """
+        allowed, retry_after = self.ip_limiter.hit(f'ip:{client_ip}')
+        if not allowed:
+            return retry_after
+        allowed, retry_after = self.email_limiter.hit(f'email:{email.strip().lower()}')
+        if not allowed:
+            return retry_after
+        return 0
+
+    def reset_email(self, email):
+        """Сбрасывает счетчик после успешного входа"""
+        self.email_limiter.reset(f'email:{email.strip().lower()}')
+
+
+def get_client_ip(request):
+    """
+    Адрес клиента. X-Forwarded-For учитывается только при доверенных прокси:
+    берется адрес, добавленный ближайшим к клиенту доверенным прокси
+    (LOGIN_THROTTLE_TRUSTED_PROXY_COUNT-й справа). Левые записи задает
+    сам клиент, по ним лимит можно обойти.
+    """
+    if settings.LOGIN_THROTTLE_TRUST_X_FORWARDED_FOR:
+        hops = settings.LOGIN_THROTTLE_TRUSTED_PROXY_COUNT
+        forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+        if hops > 0 and len(forwarded) >= hops:
+            return forwarded[-hops]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+login_throttle = LoginThrottle()
@@ -1,5 +1,10 @@
+from django.conf import settings
 from django.urls import path
-from users import views
+from users import async_views, views
+
+# Под ASGI те же адреса обслуживают асинхронные представления
+if settings.ASYNC_VIEWS:
+    views = async_views
 
 urlpatterns = [
     path('register/', views.register, name='register'),
@@ -8,5 +13,6 @@ urlpatterns = [
     path('profile/', views.profile, name='profile'),
     path('profile/update/', views.update_profile, name='update_profile'),
     path('profile/delete/', views.delete_account, name='delete_account'),
+    path('.well-known/jwks.json', views.jwks, name='jwks'),
 ]
 
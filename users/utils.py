@@ -1,29 +1,101 @@
+import hashlib
+import json
+import secrets
 import jwt
 from datetime import datetime, timedelta
+from functools import wraps
+from asgiref.sync import iscoroutinefunction, sync_to_async
 from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponseNotAllowed, JsonResponse
+from django.utils import timezone
 from users.models import User, Session
+from users.principal import TokenPrincipal
+from users.activity import activity_buffer
+from users.keyring import get_keyring, is_asymmetric
+from auth_system.metrics import session_lookups, token_decode_failures
+from auth_system.routers import pin_if_user_wrote, set_current_user
 
 
-def generate_jwt_token(user_id):
+# Срок действия сессии, при активности он продлевается
+SESSION_LIFETIME = timedelta(days=7)
+# Срок действия JWT токена
+JWT_LIFETIME = timedelta(days=7)
+
+
+def generate_jwt_token(user_id, claims=None):
     """Генерирует JWT токен для пользователя"""
     payload = {
         'user_id': user_id,
-        'exp': datetime.utcnow() + timedelta(days=7),  # Токен действует 7 дней
+        'exp': datetime.utcnow() + JWT_LIFETIME,
         'iat': datetime.utcnow(),
     }
+    if claims:
+        payload.update(claims)
+    if is_asymmetric():
+        key = get_keyring().get_signing_key()
+        return jwt.encode(payload, key.private_key, algorithm=key.alg, headers={'kid': key.kid})
     token = jwt.encode(payload, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
     return token
 
 
+def get_token_claims(user):
+    """Возвращает claims авторизации для токена пользователя"""
+    return {
+        'role_id': user.role_id,
+        'is_superuser': user.is_superuser,
+        'ver': user.token_version,
+    }
+
+
+def issue_jwt_token(user):
+    """Выпускает токен в формате, заданном настройкой JWT_CLAIMS_MODE"""
+    claims = get_token_claims(user) if settings.JWT_CLAIMS_MODE else None
+    return generate_jwt_token(user.id, claims)
+
+
+async def aissue_jwt_token(user):
+    """
+    Асинхронный issue_jwt_token(). Подпись RSA/EdDSA выполняется в потоке,
+    HS256 достаточно быстр, чтобы считать его в event loop.
+    """
+    if is_asymmetric():
+        return await sync_to_async(issue_jwt_token, thread_sensitive=False)(user)
+    return issue_jwt_token(user)
+
+
 def decode_jwt_token(token):
     """Декодирует JWT токен и возвращает payload"""
     try:
-        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-        return payload
+        if is_asymmetric():
+            payload = _decode_asymmetric(token)
+        else:
+            payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
     except jwt.ExpiredSignatureError:
+        token_decode_failures.labels(reason='expired').inc()
         return None
     except jwt.InvalidTokenError:
+        token_decode_failures.labels(reason='invalid').inc()
+        return None
+    if payload is None:
+        # Неизвестный kid или отключенная поддержка старых HS256 токенов
+        token_decode_failures.labels(reason='invalid').inc()
+    return payload
+
+
+def _decode_asymmetric(token):
+    """Проверяет подпись ключом, выбранным по kid из заголовка токена"""
+    kid = jwt.get_unverified_header(token).get('kid')
+    if kid is None:
+        # Токен выпущен до перехода на асимметричную подпись
+        if not settings.JWT_ACCEPT_LEGACY_HS256:
+            return None
+        return jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=['HS256'])
+    key = get_keyring().get_verification_key(kid)
+    if key is None:
         return None
+    return jwt.decode(token, key.public_key, algorithms=[key.alg])
 
 
 def get_user_from_token(token):
@@ -36,6 +108,7 @@ def get_user_from_token(token):
     if not user_id:
         return None
     
+    pin_if_user_wrote(user_id)
     try:
         user = User.objects.get(id=user_id, is_active=True)
         return user
@@ -43,35 +116,252 @@ def get_user_from_token(token):
         return None
 
 
-def create_session(user, token):
-    """Создает сессию для пользователя"""
-    expires_at = datetime.utcnow() + timedelta(days=7)
-    session, created = Session.objects.get_or_create(
+async def aget_user_from_token(token):
+    """Асинхронный get_user_from_token()"""
+    payload = decode_jwt_token(token)
+    if not payload:
+        return None
+    
+    user_id = payload.get('user_id')
+    if not user_id:
+        return None
+    
+    pin_if_user_wrote(user_id)
+    try:
+        return await User.objects.aget(id=user_id, is_active=True)
+    except User.DoesNotExist:
+        return None
+
+
+# Кэш, не видимый другим процессам: версия, увеличенная в одном воркере,
+# не дошла бы до остальных, и они доверяли бы старым claims до истечения TTL
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+
+def check_claims_cache():
+    """Для JWT_CLAIMS_MODE нужен общий для всех процессов кэш"""
+    backend = settings.CACHES['default']['BACKEND']
+    if backend in LOCAL_CACHE_BACKENDS:
+        raise ImproperlyConfigured(
+            f'JWT_CLAIMS_MODE требует общий кэш (Redis, Memcached, база данных), '
+            f'а CACHES["default"] использует {backend}'
+        )
+
+
+def _token_version_key(user_id):
+    return f'users:token_version:{user_id}'
+
+
+def cache_token_version(user):
+    """Запоминает текущую версию данных авторизации пользователя"""
+    cache.set(_token_version_key(user.id), user.token_version, settings.JWT_CLAIMS_VERSION_TTL)
+
+
+def forget_token_version(user_id):
+    """Удаляет версию из кэша: claims пользователя снова проверяются по базе"""
+    cache.delete(_token_version_key(user_id))
+
+
+def remember_token_version(user):
+    """
+    Кэширует версию пользователя, прочитанного из базы (возможно, с реплики).
+    Не перезаписывает версию из сигнала: устаревшая реплика не должна
+    вернуть в кэш старую версию.
+    """
+    cache.add(_token_version_key(user.id), user.token_version, settings.JWT_CLAIMS_VERSION_TTL)
+
+
+def get_principal_from_token(token):
+    """
+    Получает пользователя по JWT токену с claims.
+    Если версия в токене совпадает с закэшированной, пользователь строится
+    из claims без запроса к базе, иначе загружается как в get_user_from_token.
+    """
+    payload = decode_jwt_token(token)
+    if not payload:
+        return None
+    
+    user_id = payload.get('user_id')
+    if not user_id:
+        return None
+    
+    version = payload.get('ver')
+    if version is not None and cache.get(_token_version_key(user_id)) == version:
+        return TokenPrincipal(user_id, payload.get('role_id'), payload.get('is_superuser', False))
+    
+    pin_if_user_wrote(user_id)
+    try:
+        user = User.objects.get(id=user_id, is_active=True)
+    except User.DoesNotExist:
+        return None
+    remember_token_version(user)
+    return user
+
+
+async def aget_principal_from_token(token):
+    """Асинхронный get_principal_from_token()"""
+    payload = decode_jwt_token(token)
+    if not payload:
+        return None
+    
+    user_id = payload.get('user_id')
+    if not user_id:
+        return None
+    
+    # Кэш читается синхронно: в Django 4.2 его async-методы выполняются в потоке
+    version = payload.get('ver')
+    if version is not None and cache.get(_token_version_key(user_id)) == version:
+        return TokenPrincipal(user_id, payload.get('role_id'), payload.get('is_superuser', False))
+    
+    pin_if_user_wrote(user_id)
+    try:
+        user = await User.objects.aget(id=user_id, is_active=True)
+    except User.DoesNotExist:
+        return None
+    remember_token_version(user)
+    return user
+
+
+def get_full_user(user):
+    """Возвращает модель User, загружая её для пользователя из claims"""
+    if isinstance(user, TokenPrincipal):
+        return user.get_user()
+    return user
+
+
+async def aget_full_user(user):
+    """Асинхронный get_full_user()"""
+    if isinstance(user, TokenPrincipal):
+        return await user.aget_user()
+    return user
+
+
+def hash_session_token(token):
+    """Возвращает SHA-256 от идентификатора сессии (32 байта)"""
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+
+def create_session(user):
+    """Создает сессию для пользователя и возвращает её идентификатор для cookie"""
+    session_id = secrets.token_urlsafe(32)  # 256 бит случайных данных
+    Session.objects.create(
+        user=user,
+        token_digest=hash_session_token(session_id),
+        expires_at=timezone.now() + SESSION_LIFETIME
+    )
+    # Следующие запросы пользователя увидят сессию в основной базе
+    set_current_user(user.id)
+    return session_id
+
+
+async def acreate_session(user):
+    """Асинхронный create_session()"""
+    session_id = secrets.token_urlsafe(32)
+    await Session.objects.acreate(
         user=user,
-        session_token=token,
-        defaults={'expires_at': expires_at}
+        token_digest=hash_session_token(session_id),
+        expires_at=timezone.now() + SESSION_LIFETIME
     )
-    if not created:
-        session.expires_at = expires_at
-        session.save()
-    return session
+    # Следующие запросы пользователя увидят сессию в основной базе
+    set_current_user(user.id)
+    return session_id
 
 
 def get_user_from_session_token(token):
-    """Получает пользователя по токену сессии"""
+    """Получает пользователя по токену сессии и продлевает сессию"""
     try:
         session = Session.objects.select_related('user').get(
-            session_token=token,
-            expires_at__gt=datetime.utcnow()
+            token_digest=hash_session_token(token)
+        )
+    except Session.DoesNotExist:
+        session_lookups.labels(result='miss').inc()
+        return None
+    return _get_session_user(session)
+
+
+async def aget_user_from_session_token(token):
+    """Асинхронный get_user_from_session_token()"""
+    try:
+        session = await Session.objects.select_related('user').aget(
+            token_digest=hash_session_token(token)
         )
-        if session.user.is_active:
-            return session.user
     except Session.DoesNotExist:
-        pass
-    return None
+        session_lookups.labels(result='miss').inc()
+        return None
+    return _get_session_user(session)
+
+
+def _get_session_user(session):
+    """Проверяет срок и активность сессии, записывает активность в буфер"""
+    # Срок мог быть продлен в памяти и еще не записан в базу
+    now = timezone.now()
+    expires_at = max(session.expires_at, activity_buffer.get_expires_at(session.id) or session.expires_at)
+    if expires_at <= now or not session.user.is_active:
+        session_lookups.labels(result='miss').inc()
+        return None
+    
+    session_lookups.labels(result='hit').inc()
+    if settings.SESSION_ACTIVITY_TRACKING:
+        activity_buffer.record_session_activity(session.id, now, now + SESSION_LIFETIME)
+    return session.user
 
 
 def delete_session(token):
     """Удаляет сессию"""
-    Session.objects.filter(session_token=token).delete()
+    Session.objects.filter(token_digest=hash_session_token(token)).delete()
+
+
+async def adelete_session(token):
+    """Асинхронный delete_session()"""
+    await Session.objects.filter(token_digest=hash_session_token(token)).adelete()
 
+
+def skip_user_identification(view_func):
+    """
+    Декоратор для публичных представлений: middleware не определяет
+    пользователя, и запрос не тратит время на проверку токена и сессии.
+    Должен быть внешним декоратором (над @api_view).
+    """
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def wrapped_view(*args, **kwargs):
+            return await view_func(*args, **kwargs)
+    else:
+        @wraps(view_func)
+        def wrapped_view(*args, **kwargs):
+            return view_func(*args, **kwargs)
+    wrapped_view.skip_user_identification = True
+    return wrapped_view
+
+
+def json_response(data, status=200):
+    """JSON-ответ для асинхронных представлений (кириллица без экранирования, как в DRF)"""
+    return JsonResponse(data, status=status, json_dumps_params={'ensure_ascii': False})
+
+
+def async_api_view(http_method_names):
+    """
+    Аналог @api_view для асинхронных представлений (DRF 3.14 их не поддерживает).
+    Проверяет метод, разбирает JSON или форму в request.data и, как DRF,
+    освобождает представление от проверки CSRF.
+    """
+    allowed_methods = [method.upper() for method in http_method_names]
+    
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapped_view(request, *args, **kwargs):
+            if request.method not in allowed_methods:
+                return HttpResponseNotAllowed(allowed_methods)
+            if request.content_type == 'application/json':
+                try:
+                    request.data = json.loads(request.body) if request.body else {}
+                except ValueError:
+                    return json_response({'error': 'Некорректный JSON'}, status=400)
+            else:
+                request.data = request.POST.dict()
+            return await view_func(request, *args, **kwargs)
+        wrapped_view.csrf_exempt = True
+        return wrapped_view
+    return decorator
@@ -1,59 +1,63 @@
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
+from django.conf import settings
+from django.utils.cache import patch_cache_control
 from django.views.decorators.csrf import csrf_exempt
-from datetime import datetime, timedelta
 
+from auth_system.instrumentation import query_budget
+from users.auth_flow import (
+    auth_response,
+    check_login_throttle,
+    hashing_busy_response,
+    login_failure,
+    record_login,
+    registration_fields,
+)
 from users.models import User
+from users.hashing import HashPoolBusy
+from users.keyring import get_keyring, is_asymmetric
 from users.serializers import (
     UserRegistrationSerializer,
     UserLoginSerializer,
     UserProfileSerializer,
     UserUpdateSerializer
 )
-from users.utils import generate_jwt_token, create_session, delete_session
+from users.utils import (
+    issue_jwt_token,
+    create_session,
+    delete_session,
+    get_full_user,
+    skip_user_identification,
+)
 
 
+@skip_user_identification
 @api_view(['POST'])
 @csrf_exempt
 def register(request):
     """Регистрация нового пользователя"""
     serializer = UserRegistrationSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    if serializer.is_valid():
-        user = User.objects.create_user(
-            email=serializer.validated_data['email'],
-            password=serializer.validated_data['password'],
-            first_name=serializer.validated_data['first_name'],
-            last_name=serializer.validated_data['last_name'],
-            middle_name=serializer.validated_data['middle_name'],
-        )
-        
-        # Генерируем токен
-        token = generate_jwt_token(user.id)
-        create_session(user, token)
-        
-        response = Response({
-            'message': 'Пользователь успешно зарегистрирован',
-            'user': UserProfileSerializer(user).data,
-            'token': token
-        }, status=status.HTTP_201_CREATED)
-        
-        # Устанавливаем cookie с session_id
-        expires = datetime.utcnow() + timedelta(days=7)
-        response.set_cookie(
-            'session_id',
-            token,
-            expires=expires,
-            httponly=True,
-            samesite='Lax'
-        )
-        
-        return response
-    
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        user = User.objects.create_user(**registration_fields(serializer.validated_data))
+    except HashPoolBusy:
+        return hashing_busy_response(Response)
+    
+    return auth_response(
+        Response,
+        'Пользователь успешно зарегистрирован',
+        UserProfileSerializer(user).data,
+        issue_jwt_token(user),
+        create_session(user),
+        status.HTTP_201_CREATED,
+    )
 
 
+@query_budget(2)
+@skip_user_identification
 @api_view(['POST'])
 @csrf_exempt
 def login(request):
@@ -66,60 +70,43 @@ def login(request):
     email = serializer.validated_data['email']
     password = serializer.validated_data['password']
     
+    # Лимит попыток проверяется до запроса к базе и хеширования пароля
+    throttled = check_login_throttle(request, email, Response)
+    if throttled:
+        return throttled
+    
     try:
         user = User.objects.get(email=email)
     except User.DoesNotExist:
-        return Response(
-            {'error': 'Неверный email или пароль'},
-            status=status.HTTP_401_UNAUTHORIZED
-        )
+        return login_failure(Response)
     
-    if not user.check_password(password):
-        return Response(
-            {'error': 'Неверный email или пароль'},
-            status=status.HTTP_401_UNAUTHORIZED
-        )
+    try:
+        password_valid = user.check_password(password)
+    except HashPoolBusy:
+        return hashing_busy_response(Response)
     
+    if not password_valid:
+        return login_failure(Response)
     if not user.is_active:
-        return Response(
-            {'error': 'Аккаунт деактивирован'},
-            status=status.HTTP_403_FORBIDDEN
-        )
-    
-    # Генерируем токен
-    token = generate_jwt_token(user.id)
-    create_session(user, token)
-    
-    response = Response({
-        'message': 'Успешный вход',
-        'user': UserProfileSerializer(user).data,
-        'token': token
-    }, status=status.HTTP_200_OK)
-    
-    # Устанавливаем cookie с session_id
-    expires = datetime.utcnow() + timedelta(days=7)
-    response.set_cookie(
-        'session_id',
-        token,
-        expires=expires,
-        httponly=True,
-        samesite='Lax'
+        return login_failure(Response, account_disabled=True)
+    
+    record_login(user, email)
+    return auth_response(
+        Response,
+        'Успешный вход',
+        UserProfileSerializer(user).data,
+        issue_jwt_token(user),
+        create_session(user),
+        status.HTTP_200_OK,
     )
-    
-    return response
 
 
+@skip_user_identification
 @api_view(['POST'])
 @csrf_exempt
 def logout(request):
     """Выход пользователя из системы"""
-    # Удаляем сессию по токену из header
-    auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-    if auth_header.startswith('Bearer '):
-        token = auth_header.split('Bearer ')[1].strip()
-        delete_session(token)
-    
-    # Удаляем сессию по cookie
+    # Удаляем сессию по cookie (JWT не хранится в базе, удалять по нему нечего)
     session_token = request.COOKIES.get('session_id')
     if session_token:
         delete_session(session_token)
@@ -130,6 +117,7 @@ def logout(request):
     return response
 
 
+@query_budget(1)
 @api_view(['GET'])
 def profile(request):
     """Получение профиля текущего пользователя"""
@@ -153,13 +141,14 @@ def update_profile(request):
             status=status.HTTP_401_UNAUTHORIZED
         )
     
-    serializer = UserUpdateSerializer(request.user, data=request.data, partial=True)
+    user = get_full_user(request.user)
+    serializer = UserUpdateSerializer(user, data=request.data, partial=True)
     
     if serializer.is_valid():
         serializer.save()
         return Response({
             'message': 'Профиль успешно обновлен',
-            'user': UserProfileSerializer(request.user).data
+            'user': UserProfileSerializer(user).data
         }, status=status.HTTP_200_OK)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -175,7 +164,7 @@ def delete_account(request):
             status=status.HTTP_401_UNAUTHORIZED
         )
     
-    user = request.user
+    user = get_full_user(request.user)
     user.soft_delete()
     
     # Удаляем все сессии пользователя
@@ -186,3 +175,13 @@ def delete_account(request):
     response.delete_cookie('session_id')
     
     return response
+
+
+@skip_user_identification
+@api_view(['GET'])
+def jwks(request):
+    """Открытые ключи для проверки подписи JWT другими сервисами"""
+    keys = get_keyring().jwks() if is_asymmetric() else {'keys': []}
+    response = Response(keys, status=status.HTTP_200_OK)
+    patch_cache_control(response, public=True, max_age=settings.JWKS_CACHE_MAX_AGE)
+    return response